@@ -1,39 +1,25 @@
 #!/usr/bin/env python3
 import sys
-import subprocess
-import importlib
-import platform
-import shutil
 import json
-import serial
-import serial.tools.list_ports
+import codecs
 import datetime
+import re
 import time
-import threading
-
-# Function to install packages if missing
-def install_and_import(package, import_name=None):
-    if import_name is None:
-        import_name = package
-    try:
-        module = importlib.import_module(import_name)
-    except ImportError:
-        print(f"⚠ {package} not found. Installing...")
-        if shutil.which("apt") and "raspberrypi" in platform.uname().release:
-            try:
-                subprocess.check_call(["sudo", "apt", "install", "-y", f"python3-{package.lower()}"])
-                module = importlib.import_module(import_name)
-            except subprocess.CalledProcessError:
-                print(f"⚠ Failed to install {package} via apt. Trying pip instead...")
-                subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-        else:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-        module = importlib.import_module(import_name)
-    globals()[import_name] = module
 
-# Ensure required packages are installed
-install_and_import("pyserial", "serial")
-install_and_import("prompt_toolkit")
+from serial_autobaud import DEFAULT_PROBE, detect, line_options
+from serial_cache import ResponseCache
+from serial_capture import CaptureWriter
+from serial_engine import SerialEngine
+from serial_framing import Framing, FramingRules
+from serial_history import SessionHistory
+from serial_log_sink import JsonlLogSink
+from serial_logquery import format_entry
+from serial_payload import format_bytes, parse_commands, parse_payload
+from serial_ports import shared_registry
+from serial_scheduler import Pacer
+from serial_script import ScriptRunner, compile_script, load_script
+from serial_sessions import run_on_ports, summarize
+from serial_stats import LatencyStats
 
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import WordCompleter
@@ -41,86 +27,167 @@ from prompt_toolkit.completion import WordCompleter
 class SerialCommandSenderCLI:
     def __init__(self):
         self.echo_enabled = False  # Echo mode off by default
-        self.serial_connection = None
+        self.hex_view = False  # Show received bytes as hex instead of text
+        self.engine = None
         self.commands = []
-        self.log_data = []
+        self.script = None  # Compiled script when the loaded file has expect/wait/loop/retry steps
+        self.framing_rules = FramingRules()
+        self.response_cache = None  # A ResponseCache, kept across reconnects while it is on
+        self.pacer = None  # A Pacer holding commands to the device's rate limit and minimum gap
+        self.history = SessionHistory(JsonlLogSink(prefix="cli"))  # Kept in memory for find, and streamed to logs/
         self.port = None
         self.baud_rate = 9600  # default baud rate
-        self.serial_thread = None
+        self.line_format = "8N1"
+        self.window = 1  # commands in flight during sendall; 1 waits for each reply
+        self.tag_pattern = None
+        self.stats = LatencyStats()  # Per-command latency histograms for the 'stats' command
+        self.port_registry = shared_registry()  # Cached port list, kept current in the background
+        self.port_registry.subscribe(self.on_port_event)
+        self.capture = None  # CaptureWriter recording raw bytes while 'capture <file>' is on
 
     def timestamp(self):
         return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     def list_com_ports(self):
-        ports = list(serial.tools.list_ports.comports())
+        ports = self.port_registry.ports()
         if not ports:
             print("No COM ports found.")
             return []
         print("Available COM Ports:")
         for idx, port in enumerate(ports):
-            print(f"  {idx}: {port.device} - {port.description}")
+            print(f"  {idx}: {port}")
         return ports
 
+    def on_port_event(self, event, port):
+        # Runs on the port registry's thread
+        print(f"[{self.timestamp()}] Port {event}: {port}")
+        self.history.record_event(f"Port {event}: {port.device}", vid=port.vid, pid=port.pid,
+                                  serial_number=port.serial_number)
+
     def open_serial_connection(self):
         if not self.port:
             print("No valid COM port set. Use 'setport' command.")
             return
         try:
-            self.serial_connection = serial.Serial(self.port, self.baud_rate, timeout=1)
-            print(f"[{self.timestamp()}] Connected to {self.port} at {self.baud_rate} baud.")
-            self.log_data.append({"timestamp": self.timestamp(), "event": f"Connected to {self.port}"})
-            # Start background thread to poll for incoming serial data
-            self.serial_thread = threading.Thread(target=self.serial_read_loop, daemon=True)
-            self.serial_thread.start()
+            self.engine = SerialEngine(self.port, self.baud_rate, line_format=self.line_format)
+            # Responses to our own commands are printed by send_command, so only take unsolicited data
+            self.engine.subscribe(self.on_serial_data, self.on_serial_error, include_responses=False)
+            self.engine.echo = self.echo_enabled
+            self.engine.capture = self.capture
+            self.engine.response_cache = self.response_cache
+            self.engine.pacer = self.pacer
+            self.engine.open()
+            print(f"[{self.timestamp()}] Connected to {self.port} at {self.baud_rate} baud {self.line_format}.")
+            self.history.record_event(f"Connected to {self.port}")
         except Exception as e:
+            self.engine = None
             print(f"[{self.timestamp()}] Error opening serial connection: {e}")
 
+    def autobaud(self, args):
+        """Probe the port for its baud rate and format and use what answers cleanly."""
+        if not self.port:
+            print("No valid COM port set. Use 'setport' command.")
+            return
+        if self.engine and self.engine.is_open:
+            print("Disconnect first; autobaud needs the port to itself.")
+            return
+        fresh = bool(args) and args[0].lower() == "fresh"
+        probe = parse_payload(" ".join(args[1:] if fresh else args)) if args[1 if fresh else 0:] else DEFAULT_PROBE
+        print(f"[{self.timestamp()}] Probing {self.port} with {probe!r}...")
+        try:
+            result = detect(self.port, probe, use_cache=not fresh)
+        except Exception as e:
+            print(f"Error probing {self.port}: {e}")
+            return
+        print(f"[{self.timestamp()}] {result.describe()}")
+        if result.found:
+            self.baud_rate, self.line_format = result.best.baud_rate, result.best.line_format
+            self.history.record_event(f"Autobaud {self.port}: {self.baud_rate} {self.line_format}")
+
     def close_serial_connection(self):
-        if self.serial_connection and self.serial_connection.is_open:
-            self.serial_connection.close()
+        if self.engine and self.engine.is_open:
+            self.engine.close()
             print(f"[{self.timestamp()}] Disconnected from {self.port}.")
-            self.log_data.append({"timestamp": self.timestamp(), "event": f"Disconnected from {self.port}"})
-            self.serial_connection = None
+            self.history.record_event(f"Disconnected from {self.port}")
+            self.engine = None
 
-    def serial_read_loop(self):
-        while self.serial_connection and self.serial_connection.is_open:
-            try:
-                if self.serial_connection.in_waiting > 0:
-                    data = self.serial_connection.read(self.serial_connection.in_waiting).decode(errors='ignore').strip()
-                    if data:
-                        print(f"[{self.timestamp()}] Received: {data}")
-                        if self.echo_enabled:
-                            self.serial_connection.write((data + "\r\n").encode())
-                            print(f"[{self.timestamp()}] Echoed: {data}")
-            except Exception as e:
-                print(f"[{self.timestamp()}] Error reading serial data: {e}")
-            time.sleep(0.1)  # Poll every 100 ms
+    def on_serial_data(self, data):
+        # Called from the engine's reader thread as soon as data arrives
+        # With echo on, the engine has already written these bytes back verbatim
+        echoed = " (echoed)" if self.echo_enabled else ""
+        print(f"[{self.timestamp()}] Received{echoed}: {format_bytes(data, self.hex_view)}")
+
+    def on_serial_error(self, error):
+        print(f"[{self.timestamp()}] Error reading serial data: {error}")
 
     def toggle_echo(self):
         self.echo_enabled = not self.echo_enabled
+        if self.engine:
+            self.engine.echo = self.echo_enabled
         status = "ON" if self.echo_enabled else "OFF"
         print(f"[{self.timestamp()}] Echo mode: {status}")
 
+    def toggle_hex_view(self):
+        self.hex_view = not self.hex_view
+        status = "ON" if self.hex_view else "OFF"
+        print(f"[{self.timestamp()}] Hex view: {status}")
+
     def load_json(self, file_path):
         try:
             with open(file_path, "r") as file:
                 data = json.load(file)
-                self.commands = data.get("commands", [])
-                print(f"[{self.timestamp()}] Loaded {len(self.commands)} commands from {file_path}")
-                self.log_data.append({"timestamp": self.timestamp(), "event": f"Loaded JSON file: {file_path}"})
+            if "script" in data:
+                self.set_script(load_script(file_path))
+            else:
+                self.commands = parse_commands(data.get("commands", []))
+                self.framing_rules = FramingRules.from_dict(data.get("framing"))
+                self.script = None
+            if "cache" in data:
+                self.use_cache(ResponseCache.from_dict(data["cache"]))
+            if "pacing" in data:
+                self.use_pacer(Pacer.from_dict(data["pacing"]))
+            print(f"[{self.timestamp()}] Loaded {self.describe_loaded()} from {file_path}")
+            self.history.record_event(f"Loaded JSON file: {file_path}")
         except Exception as e:
             print(f"[{self.timestamp()}] Error loading JSON: {e}")
 
     def load_text(self, file_path):
         try:
             with open(file_path, "r") as file:
-                self.commands = [line.strip() for line in file.readlines()
-                                 if line.strip() and not line.strip().startswith(('#', '//'))]
-                print(f"[{self.timestamp()}] Loaded {len(self.commands)} commands from {file_path}")
-                self.log_data.append({"timestamp": self.timestamp(), "event": f"Loaded text file: {file_path}"})
+                script = compile_script(file.read().splitlines(), self.framing_rules)
+            if script.flat:
+                self.commands = script.commands
+                self.script = None
+            else:
+                self.set_script(script)
+            print(f"[{self.timestamp()}] Loaded {self.describe_loaded()} from {file_path}")
+            self.history.record_event(f"Loaded text file: {file_path}")
         except Exception as e:
             print(f"[{self.timestamp()}] Error loading text file: {e}")
 
+    def set_script(self, script):
+        """Keep a script with expect/wait/loop/retry steps; sendall runs it instead of the command list."""
+        self.script = script
+        self.commands = script.commands
+        self.framing_rules = script.framing_rules
+
+    def describe_loaded(self):
+        if self.script:
+            return f"a script with {len(self.commands)} top-level sends"
+        return f"{len(self.commands)} commands"
+
+    def run_script(self):
+        if not self.engine or not self.engine.is_open:
+            print("Serial connection is not open. Use the 'connect' command first.")
+            return
+        result = ScriptRunner(self.engine, self.script, on_reply=self.report_reply).run()
+        if result.ok:
+            print(f"[{self.timestamp()}] Script finished: {result.sent} commands sent.")
+        else:
+            print(f"[{self.timestamp()}] Script failed after {result.sent} commands: {result.error}")
+        self.history.record_event("Script finished" if result.ok else "Script failed",
+                                  error=result.error, variables=result.variables)
+
     def list_commands(self):
         if not self.commands:
             print("No commands loaded.")
@@ -130,39 +197,216 @@ class SerialCommandSenderCLI:
             print(f"  {idx}: {command}")
 
     def send_command(self, command):
-        if not self.serial_connection or not self.serial_connection.is_open:
+        if command.payload is None:
+            print(f"'{command.text}' uses ${{...}} variables, which are only set while the script runs; "
+                  "use 'sendall' to run it.")
+            return
+        if not self.engine or not self.engine.is_open:
             print("Serial connection is not open. Use the 'connect' command first.")
             return
         try:
-            start_time = time.time()
-            self.serial_connection.write(command.encode())
-            time.sleep(0.1)  # Brief pause to allow response
-            response = ""
-            if self.serial_connection.in_waiting > 0:
-                response = self.serial_connection.read(self.serial_connection.in_waiting).decode(errors='ignore').strip()
-            elapsed_time = time.time() - start_time
-            print(f"[{self.timestamp()}] Sent: {command} (Took {elapsed_time:.3f} sec)")
-            print(f"Response: {response}")
-            self.log_data.append({
-                "timestamp": self.timestamp(),
-                "command": command,
-                "response": response,
-                "time": elapsed_time
-            })
+            reply = self.engine.transact(command.payload, self.framing_rules.get(command.text))
+            self.report_reply(command, reply)
         except Exception as e:
             print(f"Error sending command: {e}")
 
+    def report_reply(self, command, reply, port=None):
+        # Replies stay raw bytes until they are rendered here
+        response = format_bytes(reply.data, self.hex_view)
+        status = " [timed out]" if reply.timed_out else " [cached]" if reply.cached else ""
+        source = f"{port}: " if port else ""
+        print(f"[{self.timestamp()}] {source}Sent: {command.text} (Took {reply.elapsed:.3f} sec){status}")
+        print(f"{source}Response: {response}")
+        self.history.record_reply(command, reply, port)
+        self.stats.record(command.text, reply, port)
+
     def send_all_commands(self):
+        if not self.commands and not self.script:
+            print("No commands loaded.")
+            return
+        if self.script:
+            self.run_script()
+            return
+        if self.window <= 1:
+            for command in self.commands:
+                self.send_command(command)
+            return
+        if not self.engine or not self.engine.is_open:
+            print("Serial connection is not open. Use the 'connect' command first.")
+            return
+        try:
+            requests = [(command.payload, self.framing_rules.get(command.text)) for command in self.commands]
+            self.engine.transact_many(requests, self.window, self.tag_pattern,
+                                      on_reply=lambda index, reply: self.report_reply(self.commands[index], reply))
+        except Exception as e:
+            print(f"Error sending commands: {e}")
+
+    def send_all_on_ports(self, ports):
+        """Run the loaded commands against several ports at once and print per-port and overall results."""
         if not self.commands:
             print("No commands loaded.")
             return
-        for command in self.commands:
-            self.send_command(command)
+        if self.script:
+            print("Scripts with expect/wait/loop/retry steps run on one port; use 'sendall' without --ports.")
+            return
+        if self.port in ports and self.engine and self.engine.is_open:
+            print(f"{self.port} is open in this session; use 'disconnect' first.")
+            return
+
+        start = time.monotonic()
+        results = run_on_ports(ports, self.commands, self.baud_rate, self.framing_rules, self.window,
+                               self.tag_pattern, on_reply=lambda port, command, reply: self.report_reply(command, reply, port),
+                               line_format=self.line_format)
+        summary = summarize(results, time.monotonic() - start)
+        print("Per-port results:")
+        for result in results:
+            if result.error:
+                status = f"ERROR: {result.error}"
+            else:
+                status = f"{len(result.replies)} replies, {result.timeouts} timed out"
+            print(f"  {result.port}: {status} ({result.elapsed:.3f} sec)")
+        print(f"[{self.timestamp()}] {summary['ports_ok']}/{summary['ports']} ports OK, "
+              f"{summary['commands']} commands, {summary['timeouts']} timeouts in {summary['wall_time']:.3f} sec "
+              f"(sequential would take ~{summary['summed_port_time']:.3f} sec)")
+        self.history.record_event("Multi-port sendall", summary=summary)
+
+    def set_window(self, args):
+        """Set how many commands sendall keeps in flight, optionally matching replies by a tag regex."""
+        if not args:
+            tag = f", tag {self.tag_pattern}" if self.tag_pattern else ""
+            print(f"Pipeline window: {self.window}{tag}")
+            return
+        try:
+            window = int(args[0])
+            if window < 1:
+                raise ValueError
+        except ValueError:
+            print("Usage: window <n> [tag <regex>]")
+            return
+        if len(args) > 2 and args[1].lower() == "tag":
+            self.tag_pattern = " ".join(args[2:])
+        elif len(args) == 1:
+            self.tag_pattern = None
+        else:
+            print("Usage: window <n> [tag <regex>]")
+            return
+        self.window = window
+        tag = f", replies matched by tag {self.tag_pattern}" if self.tag_pattern else ", replies matched in order"
+        print(f"Pipeline window set to {self.window}{tag if self.window > 1 else ''}.")
+
+    def set_framing(self, args):
+        """Change the default reply framing, e.g. 'frame until \\r\\nOK\\r\\n ERROR' or 'frame idle 20'."""
+        if not args:
+            print(f"Reply framing: {self.framing_rules.default.describe()}")
+            return
+        option, values = args[0].lower(), args[1:]
+        try:
+            if option == "reset":
+                self.framing_rules.default = FramingRules().default
+            elif option == "until" and values:
+                # Allow \r, \n and \xNN escapes so terminators can be typed at the prompt
+                terminators = [codecs.decode(v, "unicode_escape") for v in values]
+                self.framing_rules.default = Framing.from_dict({"until": terminators}, self.framing_rules.default)
+            elif option == "regex" and values:
+                self.framing_rules.default = Framing.from_dict({"regex": " ".join(values)}, self.framing_rules.default)
+            elif option in ("bytes", "idle", "timeout") and len(values) == 1:
+                key = {"bytes": "bytes", "idle": "idle_ms", "timeout": "timeout_ms"}[option]
+                number = float(values[0])
+                self.framing_rules.default = Framing.from_dict(
+                    {key: int(number) if option == "bytes" else number}, self.framing_rules.default)
+            else:
+                print("Usage: frame [until <text>... | regex <pattern> | bytes <n> | idle <ms> | timeout <ms> | reset]")
+                return
+        except Exception as e:
+            print(f"Invalid framing: {e}")
+            return
+        print(f"Reply framing: {self.framing_rules.default.describe()}")
+
+    def set_capture(self, args):
+        if not args:
+            if self.capture:
+                print(f"Capturing to {self.capture.path}: {self.capture.records} chunks, {self.capture.bytes} bytes.")
+            else:
+                print("Usage: capture <file> | off")
+            return
+        if self.capture:
+            self.capture.close()
+            print(f"[{self.timestamp()}] Capture saved to {self.capture.path} ({self.capture.records} chunks).")
+            self.capture = None
+        if args[0].lower() != "off":
+            try:
+                self.capture = CaptureWriter(args[0], self.port or "", self.baud_rate)
+            except OSError as e:
+                print(f"Error starting capture: {e}")
+                return
+            print(f"[{self.timestamp()}] Capturing raw bytes to {args[0]}.")
+        if self.engine:
+            self.engine.capture = self.capture
+
+    def use_cache(self, cache):
+        self.response_cache = cache
+        if self.engine:
+            self.engine.response_cache = cache
+        print(f"[{self.timestamp()}] Response cache {'on' if cache else 'off'}.")
+
+    def set_cache(self, args):
+        option = args[0].lower() if args else ""
+        if option == "on":
+            self.use_cache(self.response_cache or ResponseCache())
+        elif option == "off":
+            self.use_cache(None)
+        elif option == "clear" and self.response_cache:
+            self.response_cache.clear()
+        elif option:
+            print("Usage: cache [on | off | clear]")
+            return
+        print(self.response_cache.describe() if self.response_cache else "Response cache is off.")
+
+    def use_pacer(self, pacer):
+        self.pacer = pacer
+        if self.engine:
+            self.engine.pacer = pacer
+        print(f"[{self.timestamp()}] Pacing: {pacer or 'off'}.")
+
+    def set_pacing(self, args):
+        """pace <commands/s> [burst <n>] [gap <ms>], pace gap <ms>, or pace off."""
+        if args and args[0].lower() == "off":
+            self.use_pacer(None)
+            return
+        if args:
+            try:
+                options = {"rate": float(args[0])} if args[0][0].isdigit() else {}
+                rest = args[1:] if options else args
+                if len(rest) % 2:
+                    raise ValueError
+                for name, value in zip(rest[::2], rest[1::2]):
+                    options[{"burst": "burst", "gap": "min_gap_ms"}[name.lower()]] = float(value)
+            except (ValueError, KeyError):
+                print("Usage: pace <commands/s> [burst <n>] [gap <ms>] | pace gap <ms> | pace off")
+                return
+            self.use_pacer(Pacer.from_dict(options))
+            return
+        print(self.pacer.describe() if self.pacer else "Pacing is off.")
+
+    def find_history(self, args):
+        """Print the session entries whose command, response or event matches a regex."""
+        if not args:
+            print("Usage: find <regex> [limit]")
+            return
+        limit = int(args[1]) if len(args) > 1 and args[1].isdigit() else 50
+        try:
+            rows = self.history.search(args[0])
+        except re.error as e:
+            print(f"Invalid regex: {e}")
+            return
+        for row in rows[-limit:]:
+            print(format_entry(self.history.entry(row)))
+        shown = min(limit, len(rows))
+        print(f"{len(rows)} of {len(self.history)} entries match" + (f" (last {shown} shown)." if shown < len(rows) else "."))
 
     def save_log(self, file_path):
         try:
-            with open(file_path, "w") as file:
-                json.dump(self.log_data, file, indent=4)
+            self.history.export(file_path)
             print(f"[{self.timestamp()}] Log saved to {file_path}")
         except Exception as e:
             print(f"Error saving log: {e}")
@@ -173,24 +417,51 @@ Available commands:
   help                Show this help message.
   ports               List available COM ports.
   setport <port>      Set the COM port (e.g., COM3 or /dev/ttyUSB0).
-  setbaud <rate>      Set the baud rate (e.g., 9600).
+  setbaud <rate> [<format>]
+                      Set the baud rate (e.g., 9600) and optionally the format (8N1, 7E1...).
+  autobaud [fresh] [probe]
+                      Find the baud rate and format by sending probe (default AT\\r\\n) at each
+                      candidate; settings that worked are remembered per USB serial number
+                      and tried first next time unless 'fresh' is given.
   connect             Open the serial connection.
   disconnect          Close the serial connection.
   loadjson <file>     Load commands from a JSON file.
-  loadtxt <file>      Load commands from a text file.
+  loadtxt <file>      Load commands from a text file. Text files and the JSON "script"
+                      key may use send/expect/wait/set/loop/retry steps (see serial_script.py).
+                      Commands may be hex (hex: 00 84, 0x00\\0x84, echo -en "...")
+                      or text with escapes such as \\r\\n.
   list                List loaded commands.
   send <index>        Send the command at the specified index.
   sendall             Send all loaded commands.
+  sendall --ports <port> [<port>...]
+                      Send all loaded commands to several ports concurrently.
+  window <n> [tag <regex>]
+                      Keep up to n commands in flight during sendall (1 = one at a time).
+                      Replies are matched in order, or by the regex's first group.
   echo                Toggle echo mode on/off.
-  savlog <file>       Save log data to a file (in JSON format).
+  hexview             Toggle showing received bytes as hex.
+  frame [options]     Show or set how replies end: until <text>..., regex <pattern>,
+                      bytes <n>, idle <ms>, timeout <ms> or reset.
+  stats [reset]       Show per-command latency percentiles (write, first byte, p50/p90/p99/max).
+  cache [on|off|clear]
+                      Reuse replies to query commands (AT+...?, AT+VERSION and ATI, or a JSON file's
+                      "cache" rules) until they expire or a non-query command is sent, and show
+                      the hit/miss counts.
+  pace <n> [burst <b>] [gap <ms>] | pace gap <ms> | pace off
+                      Send at most n commands per second (bursts of b) and/or leave at least
+                      ms between commands, for devices that overrun; a JSON file's "pacing"
+                      key sets the same. Without arguments shows how often commands waited.
+  capture <file>|off  Record every byte sent and received, with timestamps, for 'sercom.py replay'.
+  find <regex> [n]    Show the last n (50) session entries whose command, response or event matches.
+  savlog <file>       Save a copy of the session log (JSON, or JSON lines for .jsonl).
   exit                Exit the application.
         """)
 
     def run(self):
         # Set up prompt_toolkit session and auto-completer
         base_commands = [
-            'help', 'ports', 'setport', 'setbaud', 'connect', 'disconnect',
-            'loadjson', 'loadtxt', 'list', 'send', 'sendall', 'echo', 'savlog', 'exit'
+            'help', 'ports', 'setport', 'setbaud', 'autobaud', 'connect', 'disconnect',
+            'loadjson', 'loadtxt', 'list', 'send', 'sendall', 'window', 'echo', 'hexview', 'frame', 'stats', 'cache', 'pace', 'capture', 'find', 'savlog', 'exit'
         ]
         completer = WordCompleter(base_commands, ignore_case=True)
         session = PromptSession(completer=completer)
@@ -226,12 +497,18 @@ Available commands:
             elif command == "setbaud":
                 if args:
                     try:
-                        self.baud_rate = int(args[0])
-                        print(f"Baud rate set to: {self.baud_rate}")
+                        baud_rate = int(args[0])
+                        if len(args) > 1:
+                            line_options(args[1])
+                            self.line_format = args[1].upper()
+                        self.baud_rate = baud_rate
+                        print(f"Baud rate set to: {self.baud_rate} {self.line_format}")
                     except ValueError:
-                        print("Invalid baud rate.")
+                        print("Invalid baud rate or format.")
                 else:
                     print("Usage: setbaud <baud_rate>")
+            elif command == "autobaud":
+                self.autobaud(args)
             elif command == "connect":
                 self.open_serial_connection()
             elif command == "disconnect":
@@ -261,9 +538,40 @@ Available commands:
                 else:
                     print("Usage: send <command_index>")
             elif command == "sendall":
-                self.send_all_commands()
+                if args and args[0] == "--ports":
+                    ports = [p for arg in args[1:] for p in arg.split(",") if p]
+                    if ports:
+                        self.send_all_on_ports(ports)
+                    else:
+                        print("Usage: sendall --ports <port> [<port>...]")
+                else:
+                    self.send_all_commands()
+            elif command == "window":
+                self.set_window(args)
             elif command == "echo":
                 self.toggle_echo()
+            elif command == "hexview":
+                self.toggle_hex_view()
+            elif command == "frame":
+                self.set_framing(args)
+            elif command == "stats":
+                if args and args[0].lower() == "reset":
+                    self.stats.reset()
+                    print("Latency statistics cleared.")
+                else:
+                    print(self.stats.format_table())
+                    if self.response_cache:
+                        print(self.response_cache.describe())
+                    if self.pacer:
+                        print(self.pacer.describe())
+            elif command == "cache":
+                self.set_cache(args)
+            elif command == "pace":
+                self.set_pacing(args)
+            elif command == "capture":
+                self.set_capture(args)
+            elif command == "find":
+                self.find_history(args)
             elif command == "savlog":
                 if args:
                     self.save_log(args[0])
@@ -271,11 +579,24 @@ Available commands:
                     print("Usage: savlog <file_path>")
             elif command == "exit":
                 self.close_serial_connection()
+                if self.capture:
+                    self.capture.close()
+                self.history.close()
                 print("Exiting.")
                 break
             else:
                 print("Unknown command. Type 'help' for available commands.")
 
-if __name__ == "__main__":
+def main(argv=None):
+    if argv:
+        # By now this module has loaded prompt_toolkit and the frontend modules, which a scripted
+        # run should never pay for, so headless runs only go through sercom.py run
+        print("clt_serial_sender.py is the interactive shell and takes no arguments; run headless with:\n"
+              f"  python sercom.py run {' '.join(argv)}", file=sys.stderr)
+        return 2
     cli = SerialCommandSenderCLI()
     cli.run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,9 +1,371 @@
-import serial.tools.list_ports
-
-ports = list(serial.tools.list_ports.comports())
-if ports:
-    print("Available COM Ports:")
-    for port in ports:
-        print(port.device)
-else:
-    print("No COM ports found.")
+#!/usr/bin/env python3
+"""Passive capture: listen on one or more ports and keep only what surrounds a trigger.
+
+    python com_port_sniffer.py                       list the serial ports
+    python sercom.py sniff --port /dev/ttyUSB0 --baud 921600 --error ERROR --idle-ms 500 --out dumps
+
+Each port is read by its own thread straight into a fixed-size ring buffer allocated up front
+(on POSIX serial devices with os.readv, so bytes are never copied on the way in), along with a
+ring of chunk timestamps. Nothing is printed or stored while the traffic is uneventful, so
+memory stays bounded however long the capture runs. When a trigger fires:
+
+    --match   bytes appear (same hex and escape syntax as command files)
+    --regex   a regular expression matches the byte stream
+    --error   a text appears, ignoring case (ERROR, FAIL, panic...)
+    --idle-ms the line goes quiet for that long after traffic
+    the port fails (unplugged, read error)
+
+the pre-trigger window (--pre bytes) and the post-trigger window (--post bytes, or whatever
+arrived within --post-timeout) are written as a capture file that 'sercom.py replay' can play
+back or print with --dump. Triggers firing while a window is still being collected are merged
+into it. The ports are never written to; pyserial still sets the line parameters on open.
+"""
+import os
+import queue
+import re
+import select
+import sys
+import threading
+import time
+from array import array
+
+READ_SIZE = 64 * 1024
+LOOKBACK = 1024  # Bytes of earlier data rescanned with each read, so matches may span reads
+
+
+def parse_size(text):
+    """Byte count with an optional K, M or G suffix (powers of 1024)."""
+    text = str(text).strip().upper().rstrip("B")
+    scale = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+class RingBuffer:
+    """The last capacity bytes of a stream plus the perf_counter_ns() time each chunk arrived.
+
+    Positions are absolute stream offsets (total bytes ever written), so a window stays
+    addressable until it is overwritten.
+    """
+
+    def __init__(self, capacity, chunk_slots=None):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.total = 0
+        slots = chunk_slots or max(1024, capacity // 64)
+        self.chunk_positions = array("Q", bytes(8 * slots))
+        self.chunk_times = array("q", bytes(8 * slots))
+        self.chunks = 0
+
+    @property
+    def oldest(self):
+        return max(0, self.total - self.capacity)
+
+    def segments(self, size):
+        """Memoryviews where the next size bytes go, two when they wrap; fill them, then commit()."""
+        start = self.total % self.capacity
+        size = min(size, self.capacity)
+        first = self.view[start:min(self.capacity, start + size)]
+        return [first, self.view[:size - len(first)]] if len(first) < size else [first]
+
+    def commit(self, count, time_ns):
+        slot = self.chunks % len(self.chunk_positions)
+        self.chunk_positions[slot] = self.total
+        self.chunk_times[slot] = time_ns
+        self.chunks += 1
+        self.total += count
+
+    def append(self, data, time_ns):
+        """Copy data in, for sources without a file descriptor."""
+        data = memoryview(data)[-self.capacity:]
+        written = 0
+        for segment in self.segments(len(data)):
+            segment[:] = data[written:written + len(segment)]
+            written += len(segment)
+        self.commit(len(data), time_ns)
+
+    def read(self, start, end):
+        """Bytes between two absolute positions, which must still be in the buffer."""
+        start = max(start, self.oldest)
+        if end <= start:
+            return b""
+        first, last = start % self.capacity, end % self.capacity or self.capacity
+        if first < last:
+            return bytes(self.view[first:last])
+        return bytes(self.view[first:]) + bytes(self.view[:last])
+
+    def chunk_spans(self, start, end):
+        """(position, time_ns) of the chunks covering start..end, oldest first; older bytes than
+        the chunk ring remembers are dated with the oldest chunk it has."""
+        slots = len(self.chunk_positions)
+        spans = []
+        oldest_time = 0
+        number = self.chunks - 1
+        while number >= max(0, self.chunks - slots):
+            slot = number % slots
+            position, oldest_time = self.chunk_positions[slot], self.chunk_times[slot]
+            if position < end:
+                spans.append((max(position, start), oldest_time))
+                if position <= start:
+                    break
+            number -= 1
+        spans.reverse()
+        if not spans or spans[0][0] > start:
+            spans.insert(0, (start, oldest_time))
+        return spans
+
+
+class Trigger:
+    __slots__ = ("name", "pattern")
+
+    def __init__(self, name, pattern):
+        self.name = name
+        self.pattern = pattern
+
+    @classmethod
+    def build(cls, matches=(), regexes=(), errors=()):
+        from serial_payload import parse_payload
+        triggers = [cls(f"match {text}", re.compile(re.escape(parse_payload(text)))) for text in matches]
+        triggers += [cls(f"regex {text}", re.compile(text.encode())) for text in regexes]
+        triggers += [cls(f"error {text}", re.compile(re.escape(text.encode()), re.IGNORECASE)) for text in errors]
+        return triggers
+
+
+class Dump:
+    """One trigger window: records are (perf_counter_ns, data) with the trigger starting a record."""
+
+    def __init__(self, port, baud_rate, trigger, trigger_ns, pre_bytes, post_bytes, merged, records):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.trigger = trigger
+        self.trigger_ns = trigger_ns
+        self.pre_bytes = pre_bytes
+        self.post_bytes = post_bytes
+        self.merged = merged
+        self.records = records
+        self.path = None
+
+
+class PortSniffer:
+    """Reads one port into a RingBuffer on its own thread and hands a Dump to on_dump per trigger."""
+
+    def __init__(self, port, baud_rate=115200, triggers=(), buffer_size=16 * 1024 * 1024, pre=64 * 1024,
+                 post=16 * 1024, post_timeout=1.0, idle=None, max_dumps=None, on_dump=None, on_error=None):
+        needed = pre + max(post, LOOKBACK) + READ_SIZE  # A window must survive the read that completes it
+        if buffer_size < needed:
+            raise ValueError(f"the buffer must hold the pre and post windows plus one read ({needed} bytes), "
+                             f"not {buffer_size}")
+        self.port = port
+        self.baud_rate = baud_rate
+        self.triggers = list(triggers)
+        self.ring = RingBuffer(buffer_size)
+        self.pre = pre
+        self.post = post
+        self.post_timeout_ns = int(post_timeout * 1e9)
+        self.idle_ns = int(idle * 1e9) if idle else None
+        self.max_dumps = max_dumps
+        self.on_dump = on_dump
+        self.on_error = on_error
+        self.connection = None
+        self.last_data_ns = None
+        self.idle_fired = True  # Only a gap after some traffic counts
+        self.pending = None  # [trigger name, position, time_ns, deadline_ns, merged]
+        self.fired = 0
+        self.dumps = 0
+        self.running = False
+        self.wake_read, self.wake_write = os.pipe() if hasattr(select, "poll") else (None, None)
+        self.thread = threading.Thread(target=self.run, name=f"sniff-{port}", daemon=True)
+
+    def start(self):
+        import serial
+        self.connection = serial.serial_for_url(self.port, self.baud_rate, timeout=0.1)
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.wake_write is not None:
+            os.write(self.wake_write, b"x")
+        elif self.connection is not None and hasattr(self.connection, "cancel_read"):
+            self.connection.cancel_read()
+        if self.thread.is_alive():
+            self.thread.join(timeout=2)
+        if self.pending:
+            self.finish(time.perf_counter_ns())  # Keep a window cut short by stopping
+        for fd in (self.wake_read, self.wake_write):
+            if fd is not None:
+                os.close(fd)
+        self.wake_read = self.wake_write = None
+        if self.connection is not None:
+            self.connection.close()
+
+    def run(self):
+        try:
+            fd = None
+            if self.wake_read is not None:
+                try:
+                    fd = self.connection.fileno()
+                except Exception:
+                    pass
+            if fd is not None:
+                self.run_fd(fd)
+            else:
+                self.run_generic()
+        except Exception as e:
+            if self.running:
+                try:
+                    self.fire("port error", self.ring.total, time.perf_counter_ns())
+                    if self.pending is not None:  # None once max_dumps is reached
+                        self.finish(time.perf_counter_ns())
+                finally:
+                    # Even if writing the last dump fails, so sniff sees the port is done
+                    self.running = False
+                    if self.on_error:
+                        self.on_error(self.port, e)
+
+    def run_fd(self, fd):
+        import serial
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        poller.register(self.wake_read, select.POLLIN)
+        while self.running:
+            events = poller.poll(self.poll_timeout_ms())
+            now = time.perf_counter_ns()
+            if any(ready == self.wake_read for ready, event in events):
+                return
+            if events:
+                try:
+                    count = os.readv(fd, self.ring.segments(READ_SIZE))
+                except BlockingIOError:
+                    continue
+                if count == 0:
+                    raise serial.SerialException("device reports readiness but returned no data (disconnected?)")
+                self.ring.commit(count, now)
+                self.received(count, now)
+            self.check_timers(now)
+
+    def run_generic(self):
+        connection = self.connection
+        while self.running:
+            data = connection.read(min(READ_SIZE, connection.in_waiting or 1))
+            now = time.perf_counter_ns()
+            if data:
+                self.ring.append(data, now)
+                self.received(len(data), now)
+            self.check_timers(now)
+
+    def poll_timeout_ms(self):
+        deadlines = []
+        if self.pending:
+            deadlines.append(self.pending[3])
+        if self.idle_ns and not self.idle_fired:
+            deadlines.append(self.last_data_ns + self.idle_ns)
+        if not deadlines:
+            return 200
+        return max(0, min(200, (min(deadlines) - time.perf_counter_ns()) // 1_000_000 + 1))
+
+    def received(self, count, now):
+        ring = self.ring
+        start = ring.total - count
+        self.last_data_ns = now
+        self.idle_fired = False
+        if self.triggers:
+            scan_start = max(start - LOOKBACK, ring.oldest)
+            data = ring.read(scan_start, ring.total)
+            for trigger in self.triggers:
+                for match in trigger.pattern.finditer(data):
+                    if scan_start + match.end() > start:  # Matches ending in older data were seen before
+                        self.fire(trigger.name, scan_start + match.start(), now)
+                        break
+        if self.pending and ring.total >= self.pending[1] + self.post:
+            self.finish(now)
+
+    def check_timers(self, now):
+        if self.idle_ns and not self.idle_fired and now - self.last_data_ns >= self.idle_ns:
+            self.idle_fired = True
+            self.fire(f"idle {self.idle_ns // 1_000_000} ms", self.ring.total, now)
+        if self.pending and now >= self.pending[3]:
+            self.finish(now)
+
+    def fire(self, name, position, now):
+        self.fired += 1
+        if self.pending:
+            self.pending[4] += 1
+        elif self.max_dumps is None or self.dumps < self.max_dumps:
+            self.pending = [name, position, now, now + self.post_timeout_ns, 0]
+
+    def finish(self, now):
+        name, position, fired_ns, deadline, merged = self.pending
+        self.pending = None
+        ring = self.ring
+        start = max(position - self.pre, ring.oldest)
+        end = min(position + self.post, ring.total)
+        records = []
+        spans = ring.chunk_spans(start, end)
+        # Split at the trigger so the post window starts a record of its own
+        index = next((index for index, (span_start, time_ns) in enumerate(spans) if span_start >= position), len(spans))
+        if start < position < end and (index == len(spans) or spans[index][0] != position):
+            spans.insert(index, (position, spans[index - 1][1]))
+        for (span_start, time_ns), (span_end, next_ns) in zip(spans, spans[1:] + [(end, 0)]):
+            if span_end > span_start:
+                records.append((time_ns, ring.read(span_start, span_end)))
+        self.dumps += 1
+        if self.on_dump:
+            self.on_dump(Dump(self.port, self.baud_rate, name, fired_ns, position - start, end - position,
+                              merged, records))
+
+
+class DumpWriter:
+    """Writes Dumps as capture files in out_dir on a background thread, off the reader threads."""
+
+    def __init__(self, out_dir, on_written=None):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.on_written = on_written
+        self.clock_offset = time.time_ns() - time.perf_counter_ns()  # perf_counter_ns -> time_ns
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.write_loop, name="sniff-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, dump):
+        self.queue.put(dump)
+
+    def write_loop(self):
+        import datetime
+        from serial_capture import RX, write_capture
+        while True:
+            dump = self.queue.get()
+            if dump is None:
+                return
+            started = dump.records[0][0] if dump.records else dump.trigger_ns
+            stamp = datetime.datetime.fromtimestamp((dump.trigger_ns + self.clock_offset) / 1e9)
+            port = re.sub(r"[^\w.-]+", "_", str(dump.port)).strip("_")
+            kind = dump.trigger.split()[0]
+            dump.path = os.path.join(self.out_dir, f"{port}_{stamp:%Y%m%d_%H%M%S_%f}_{kind}.scap")
+            try:
+                write_capture(dump.path, [(time_ns - started, RX, data) for time_ns, data in dump.records],
+                              dump.port, dump.baud_rate, started + self.clock_offset)
+            except OSError as e:
+                dump.path = None
+                print(f"Error writing dump: {e}", file=sys.stderr)
+            if self.on_written:
+                self.on_written(dump)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        from sercom import main
+        sys.exit(main(["sniff", *sys.argv[1:]]))
+    from serial_ports import PortRegistry
+
+    ports = PortRegistry().ports()
+    if ports:
+        print("Available COM Ports:")
+        for port in ports:
+            print(port)
+    else:
+        print("No COM ports found.")
@@ -13,19 +13,18 @@ if %errorlevel% neq 0 (
 if not exist venv (
     echo Creating virtual environment...
     python -m venv venv
+    call venv\Scripts\activate
+    :: Install required Python packages once, when the environment is created
+    echo Installing dependencies...
+    python -m pip install --upgrade pip
+    python -m pip install pyserial PyQt6 prompt_toolkit textual
+) else (
+    call venv\Scripts\activate
 )
 
-:: Activate virtual environment
-call venv\Scripts\activate
-
-:: Install required Python packages
-echo Installing dependencies...
-pip install --upgrade pip
-pip install pyserial PyQt6
-
-:: Run the Python script
+:: Run the GUI through the common entry point; a missing package is reported, not installed
 echo Launching Serial Command Sender...
-start /b python serial_command_sender.py
+start /b python sercom.py gui
 
 :: Deactivate virtual environment after script execution (not required for GUI apps)
 endlocal
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""Single entry point for the Serial Command Sender tools.
+
+    python sercom.py gui                      PyQt6 window
+    python sercom.py cli                      prompt_toolkit shell
+    python sercom.py tui                      Textual terminal UI
+    python sercom.py ports                    list serial ports
+    python sercom.py run --port COM3 AT\\r\\n   send commands headless and print the replies
+    python sercom.py run --port COM3 --script test.json --out result.jsonl
+    python sercom.py bridge --port COM3 [--to COM4] [--tap]   raw echo, or a null-modem between two ports
+    python sercom.py serve --port COM3 --raw-port 7000         share a port over TCP (socket:// and rfc2217://)
+    python sercom.py replay session.scap [--speed 10 | --max]  play a raw capture back through a pty
+    python sercom.py simulate --rules rules.json --count 8     virtual devices on ptys for testing without hardware
+    python sercom.py logs session.jsonl --command ATI --stats  query a large log through a sidecar index
+    python sercom.py autobaud --port COM3 --probe "AT\r\n"      find the baud rate and format (8N1, 7E1)
+    python sercom.py sniff --port COM3 --error ERROR --idle-ms 500   keep only the bytes around each trigger
+
+Frontends are imported only when their subcommand runs, so a headless run never loads Qt,
+Textual or prompt_toolkit. Missing packages are reported with the command that installs
+them; nothing is installed automatically.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+# Subcommand -> (module, entry function, [(import name, pip package)] it needs)
+FRONTENDS = {
+    "gui": ("serial_command_sender", "main", [("serial", "pyserial"), ("PyQt6", "PyQt6")]),
+    "cli": ("clt_serial_sender", "main", [("serial", "pyserial"), ("prompt_toolkit", "prompt_toolkit")]),
+    "tui": ("textual_serial_sender", "main", [("serial", "pyserial"), ("textual", "textual")]),
+}
+
+
+class MissingDependency(Exception):
+    pass
+
+
+def require(requirements, feature):
+    """Import-check each (module, package) pair and raise one MissingDependency listing all that failed."""
+    missing = []
+    for module, package in requirements:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            missing.append((package, e))
+    if missing:
+        packages = " ".join(package for package, error in missing)
+        details = "\n".join(f"  {package}: {error}" for package, error in missing)
+        raise MissingDependency(f"{feature} needs {packages}, which could not be imported:\n{details}\n"
+                                f"Install with: {sys.executable} -m pip install {packages}")
+
+
+def run_frontend(name):
+    module_name, function, requirements = FRONTENDS[name]
+    require(requirements, f"'{name}'")
+    return getattr(importlib.import_module(module_name), function)()
+
+
+def list_ports(args):
+    require([("serial", "pyserial")], "'ports'")
+    from serial_ports import PortRegistry
+    ports = PortRegistry().ports()
+    if not ports:
+        print("No COM ports found.")
+    for port in ports:
+        print(port)
+    return 0
+
+
+def run_batch(args):
+    require([("serial", "pyserial")], "'run'")
+    import serial_batch
+    return serial_batch.run(args)
+
+
+def run_bridge(args):
+    require([("serial", "pyserial")], "'bridge'")
+    import time
+    from serial_bridge import SerialBridge
+    tap = sink = None
+    if args.tap:
+        import datetime
+        from serial_log_sink import JsonlLogSink
+        from serial_payload import log_fields
+        sink = JsonlLogSink(args.log_dir, prefix="bridge")
+
+        def tap(direction, data):
+            sink.write({"timestamp": datetime.datetime.now().isoformat(timespec="microseconds"),
+                        "direction": direction, **log_fields(data, "data")})
+
+    def on_error(direction, error):
+        print(f"{direction}: {error}", file=sys.stderr)
+    bridge = SerialBridge(args.port, args.to, args.baud, tap, on_error)
+    try:
+        bridge.open()
+    except Exception as e:
+        print(f"Error opening ports: {e}", file=sys.stderr)
+        return 3
+    mode = f"{args.port} <-> {args.to}" if args.to else f"echoing {args.port}"
+    print(f"Bridge running ({mode}); press Ctrl+C to stop.", file=sys.stderr)
+    try:
+        previous = bridge.counters()
+        while True:
+            time.sleep(args.stats_interval or 3600)
+            if args.stats_interval:
+                print(bridge.describe_rates(previous, args.stats_interval), file=sys.stderr)
+                previous = bridge.counters()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bridge.close()
+        if sink:
+            sink.close()
+    print(f"Stopped: {bridge.describe_rates()}", file=sys.stderr)
+    return 0
+
+
+def run_server(args):
+    require([("serial", "pyserial")], "'serve'")
+    import datetime
+    import time
+    from serial_server import SerialShareServer
+
+    def on_event(message):
+        print(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {message}", file=sys.stderr, flush=True)
+    server = SerialShareServer(args.port, args.baud, args.host, args.raw_port, args.rfc2217_port, on_event)
+    try:
+        server.start()
+    except Exception as e:
+        print(f"Error starting server: {e}", file=sys.stderr)
+        return 3
+    urls = [f"{'socket' if index == 0 and args.raw_port is not None else 'rfc2217'}://{host}:{port}"
+            for index, (host, port) in enumerate(server.addresses)]
+    on_event(f"Sharing {args.port} at {args.baud} baud on {', '.join(urls)}; press Ctrl+C to stop.")
+    try:
+        while server.engine.is_open:
+            time.sleep(0.5)
+        on_event(f"{args.port} closed.")
+        return 3
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.stop()
+
+
+def run_replay(args):
+    from serial_capture import CaptureReader, CaptureReplay, format_record
+    if args.dump:
+        with CaptureReader(args.capture) as reader:
+            print(f"# {reader.port} at {reader.baud_rate} baud")
+            for record in reader:
+                print(format_record(record, args.hex))
+        return 0
+    if args.speed <= 0:
+        raise ValueError("--speed must be positive; use --max for as fast as possible")
+    if not hasattr(os, "openpty"):
+        print("Replay needs a pseudo-terminal (Linux/macOS).", file=sys.stderr)
+        return 2
+    replay = CaptureReplay(args.capture, 0 if args.max else args.speed, args.follow_tx, args.link)
+    try:
+        print(f"Replaying {args.capture} on {replay.device}" + (f" ({args.link})" if args.link else "")
+              + "; waiting for a program to open it.", file=sys.stderr)
+        replay.wait_for_open()
+        elapsed, recorded = replay.run()
+        print(f"Replayed {replay.rx_records} chunks ({replay.rx_bytes} bytes) in {elapsed:.3f} s "
+              f"(recorded over {recorded:.3f} s); received {replay.tx_bytes} bytes.", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.close()
+    return 0
+
+
+def run_simulator(args):
+    if not hasattr(os, "openpty"):
+        print("The simulator needs pseudo-terminals (Linux/macOS).", file=sys.stderr)
+        return 2
+    import asyncio
+    from serial_simulator import DeviceSimulator, SimulatorRules
+    rules = SimulatorRules.load(args.rules)
+    overrides = {key: getattr(args, key) for key in ("latency_ms", "jitter_ms", "partial", "garbage", "disconnect")
+                 if getattr(args, key) is not None}
+    rules.faults.update(overrides)
+    for rule in rules.rules:
+        rule.faults.update(overrides)
+
+    def on_event(message):
+        print(message, file=sys.stderr, flush=True)
+    simulator = DeviceSimulator(rules, args.count, args.link_dir, args.seed, on_event)
+
+    async def serve():
+        stopped = asyncio.Event()
+        try:
+            import signal
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)  # Remove the links on kill too
+        except (ImportError, NotImplementedError):
+            pass
+        await simulator.start()
+        try:
+            for port in simulator.ports:
+                print(port, flush=True)
+            print(f"{len(simulator.devices)} simulated devices running; press Ctrl+C to stop.", file=sys.stderr)
+            await stopped.wait()
+        finally:
+            await simulator.stop()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    answered, disconnects = simulator.totals()
+    print(f"Answered {answered} commands, {disconnects} simulated disconnects.", file=sys.stderr)
+    return 0
+
+
+def query_logs(args):
+    import itertools
+    import json
+    from serial_logquery import LogQuery, format_entry
+    from serial_stats import format_rows
+    query = LogQuery(args.log, args.reindex)
+    numbers = query.matches(args.command, args.command_regex, args.port, args.since, args.until,
+                            args.errors, args.events)
+    if args.stats:
+        filtered = any((args.command, args.command_regex, args.port, args.since, args.until, args.errors, args.events))
+        print(format_rows(query.latency_rows(numbers if filtered else None)))
+        return 0
+    if args.count:
+        print(sum(1 for _ in numbers))
+        return 0
+    if args.limit:
+        numbers = itertools.islice(numbers, args.limit)
+    for entry in query.entries(numbers):
+        print(json.dumps(entry, separators=(",", ":")) if args.json else format_entry(entry))
+    return 0
+
+
+def baud_rate(text):
+    """A --baud value: a number, or 'auto' to detect it."""
+    return "auto" if text.lower() == "auto" else int(text)
+
+
+def run_autobaud(args):
+    require([("serial", "pyserial")], "'autobaud'")
+    from serial_autobaud import AutobaudCache, detect
+    from serial_payload import parse_payload
+
+    def on_probe(result):
+        if args.verbose:
+            print(f"  {str(result):>14}  score {result.score:.2f}  {result.reply!r}", file=sys.stderr)
+    bauds = [int(rate) for rate in args.bauds.split(",")] if args.bauds else None
+    formats = [text.strip() for text in args.formats.split(",")] if args.formats else None
+    result = detect(args.port, parse_payload(args.probe), args.expect, bauds, formats, args.step_ms / 1000,
+                    cache=AutobaudCache(args.cache) if args.cache else None, use_cache=not args.no_cache,
+                    on_probe=on_probe)
+    print(result.describe(), file=sys.stderr)
+    if not result.found:
+        return 1
+    print(f"{result.best.baud_rate} {result.best.line_format}")
+    return 0
+
+
+def run_sniffer(args):
+    require([("serial", "pyserial")], "'sniff'")
+    import datetime
+    import time
+    from com_port_sniffer import DumpWriter, PortSniffer, Trigger, parse_size
+    triggers = Trigger.build(args.match or (), args.regex or (), args.error or ())
+    if not triggers and not args.idle_ms:
+        print("Give at least one trigger: --match, --regex, --error or --idle-ms.", file=sys.stderr)
+        return 2
+
+    def on_event(message):
+        print(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {message}", file=sys.stderr, flush=True)
+
+    def on_written(dump):
+        merged = f", {dump.merged} more triggers merged" if dump.merged else ""
+        on_event(f"{dump.port}: {dump.trigger} -> {dump.path} ({dump.pre_bytes} bytes before, "
+                 f"{dump.post_bytes} after{merged})")
+
+    def on_error(port, error):
+        on_event(f"{port}: {error}; stopped listening")
+    writer = DumpWriter(args.out, on_written)
+    sniffers = [PortSniffer(port, args.baud, triggers, parse_size(args.buffer), parse_size(args.pre),
+                            parse_size(args.post), args.post_timeout, args.idle_ms / 1000 if args.idle_ms else None,
+                            args.max_dumps, writer.put, on_error)
+                for port in args.port]
+    try:
+        for sniffer in sniffers:
+            sniffer.start()
+    except Exception as e:
+        print(f"Error opening ports: {e}", file=sys.stderr)
+        for sniffer in sniffers:
+            sniffer.stop()
+        writer.close()
+        return 3
+    on_event(f"Listening on {', '.join(args.port)} at {args.baud} baud with a {args.buffer} buffer each; "
+             f"press Ctrl+C to stop.")
+    try:
+        while any(sniffer.running for sniffer in sniffers):
+            time.sleep(args.stats_interval or 0.5)
+            if args.stats_interval:
+                on_event("; ".join(f"{sniffer.port} {sniffer.ring.total} bytes, {sniffer.fired} triggers, "
+                                   f"{sniffer.dumps} dumps" for sniffer in sniffers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sniffer in sniffers:
+            sniffer.stop()
+        writer.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="sercom", description="Serial Command Sender")
+    subcommands = parser.add_subparsers(dest="subcommand", metavar="{gui,cli,tui,ports,run,bridge,serve,replay,simulate,logs,sniff,autobaud}")
+    subcommands.add_parser("gui", help="PyQt6 window (the default)")
+    subcommands.add_parser("cli", help="interactive prompt_toolkit shell")
+    subcommands.add_parser("tui", help="Textual terminal UI")
+    subcommands.add_parser("ports", help="list serial ports with USB details")
+    run = subcommands.add_parser("run", help="send commands, a command file or stdin without a UI",
+                                 description="Exit status: 0 OK, 1 timeout, 2 usage error, 3 port error, 4 failed reply.")
+    run.add_argument("--port", required=True, help="device or URL, e.g. COM3, /dev/ttyUSB0, socket://host:port")
+    run.add_argument("--baud", type=baud_rate, default=9600, help="baud rate, or 'auto' to detect it by sending --probe")
+    run.add_argument("--format", default="8N1", help="data bits, parity and stop bits (default 8N1; e.g. 7E1)")
+    run.add_argument("--probe", default="AT\\r\\n", help="command --baud auto sends at each rate (default AT\\r\\n)")
+    run.add_argument("--script", help="JSON or text command file; '-' or no file and no commands reads stdin")
+    run.add_argument("--out", help="also write one JSON line per reply to this file")
+    run.add_argument("--json", action="store_true", help="print JSON lines instead of text")
+    run.add_argument("--hex", action="store_true", help="print replies as hex")
+    run.add_argument("--window", type=int, default=1, help="commands in flight for command files (default 1)")
+    run.add_argument("--tag", help="regex whose first group matches pipelined replies to commands")
+    run.add_argument("--timeout-ms", type=float, help="reply timeout per command (overrides the file's default)")
+    run.add_argument("--fail-regex", default="ERROR", help="replies matching this count as failures ('' disables); scripts use expect instead")
+    run.add_argument("--stop-on-failure", action="store_true", help="stop at the first failed or timed-out reply")
+    run.add_argument("--cache", action="store_true",
+                     help="reuse replies to query commands (AT+...?, AT+VERSION and ATI) until they expire or a "
+                          "non-query command is sent; a command file's \"cache\" key sets its own rules")
+    run.add_argument("--rate", type=float, help="send at most this many commands per second (a command file's "
+                                                 "\"pacing\" key can set rate, burst and min_gap_ms)")
+    run.add_argument("--burst", type=int, default=1, help="commands --rate lets through back to back (default 1)")
+    run.add_argument("--min-gap-ms", type=float, help="leave at least this long between the starts of two commands")
+    run.add_argument("--capture", help="record every byte sent and received, with timestamps, to this file")
+    run.add_argument("commands", nargs="*", help="commands, with the same hex and escape syntax as command files")
+    bridge = subcommands.add_parser("bridge", help="forward raw bytes: echo a port, or join two ports")
+    bridge.add_argument("--port", required=True, help="port A")
+    bridge.add_argument("--to", help="port B; without it everything received on A is echoed back to A")
+    bridge.add_argument("--baud", type=int, default=115200)
+    bridge.add_argument("--tap", action="store_true", help="log every forwarded chunk to --log-dir as JSON lines")
+    bridge.add_argument("--log-dir", default="logs")
+    bridge.add_argument("--stats-interval", type=float, default=5.0, help="seconds between rate reports (0 = off)")
+    serve = subcommands.add_parser("serve", help="share a port with several TCP clients (raw and RFC 2217)")
+    serve.add_argument("--port", required=True)
+    serve.add_argument("--baud", type=int, default=9600)
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for all interfaces)")
+    serve.add_argument("--raw-port", type=int, default=7000, help="TCP port for socket:// clients")
+    serve.add_argument("--rfc2217-port", type=int, help="TCP port for rfc2217:// clients (off by default)")
+    replay = subcommands.add_parser("replay", help="play a raw capture back through a pty, or print it")
+    replay.add_argument("capture", help="file recorded with run --capture or the CLI's capture command")
+    replay.add_argument("--speed", type=float, default=1.0, help="playback speed factor (default 1 = as recorded)")
+    replay.add_argument("--max", action="store_true", help="as fast as the program reading the pty keeps up")
+    replay.add_argument("--follow-tx", action="store_true",
+                        help="wait for the program to send what the recording sent before replaying the next reply")
+    replay.add_argument("--link", help="also make this symlink to the pty, e.g. /tmp/ttyREPLAY")
+    replay.add_argument("--dump", action="store_true", help="print the records instead of replaying them")
+    replay.add_argument("--hex", action="store_true", help="with --dump, print data as hex")
+    simulate = subcommands.add_parser("simulate", help="virtual devices on ptys answering from a rules file")
+    simulate.add_argument("--rules", required=True, help="JSON rules file, or a command file such as serial_commands.json")
+    simulate.add_argument("--count", type=int, default=1, help="number of devices (default 1)")
+    simulate.add_argument("--link-dir", help="create stable symlinks ttySIM0, ttySIM1, ... in this directory")
+    simulate.add_argument("--seed", type=int, help="random seed, for repeatable jitter and faults")
+    simulate.add_argument("--latency-ms", type=float, help="override the rules' reply latency")
+    simulate.add_argument("--jitter-ms", type=float, help="override the rules' extra random latency")
+    simulate.add_argument("--partial", type=float, help="override the chance of a reply written in pieces (0-1)")
+    simulate.add_argument("--garbage", type=float, help="override the chance of random bytes before a reply (0-1)")
+    simulate.add_argument("--disconnect", type=float, help="override the chance of a disconnect per command (0-1)")
+    logs = subcommands.add_parser("logs", help="query a session log (JSON or JSON lines) without loading it whole")
+    logs.add_argument("log", help="log file; an index is kept next to it as <log>.idx")
+    logs.add_argument("--command", action="append", help="only this command (repeat for several)")
+    logs.add_argument("--command-regex", help="only commands matching this regex")
+    logs.add_argument("--port", help="only entries from this port")
+    logs.add_argument("--since", help="start time: HH:MM[:SS] any day, or YYYY-MM-DD HH:MM[:SS]")
+    logs.add_argument("--until", help="end time, inclusive, in the same forms")
+    logs.add_argument("--errors", action="store_true", help="only ERROR, failed or timed-out replies")
+    logs.add_argument("--events", action="store_true", help="only events (connects, loads, port changes)")
+    logs.add_argument("--stats", action="store_true", help="latency percentiles per command instead of entries")
+    logs.add_argument("--count", action="store_true", help="print only the number of matching entries")
+    logs.add_argument("--limit", type=int, help="print at most this many entries")
+    logs.add_argument("--json", action="store_true", help="print entries as JSON lines")
+    logs.add_argument("--reindex", action="store_true", help="rebuild the index even if it looks current")
+    sniff = subcommands.add_parser("sniff", help="listen passively and save the bytes around each trigger")
+    sniff.add_argument("--port", action="append", required=True, help="port to listen on (repeat for several)")
+    sniff.add_argument("--baud", type=int, default=115200)
+    sniff.add_argument("--match", action="append", help="trigger on these bytes (hex: or escapes, as in command files)")
+    sniff.add_argument("--regex", action="append", help="trigger on a regex over the byte stream")
+    sniff.add_argument("--error", action="append", help="trigger on this text, ignoring case, e.g. ERROR")
+    sniff.add_argument("--idle-ms", type=float, help="trigger when the line goes quiet this long after traffic")
+    sniff.add_argument("--buffer", default="16M", help="ring buffer size per port (default 16M)")
+    sniff.add_argument("--pre", default="64K", help="bytes kept from before a trigger (default 64K)")
+    sniff.add_argument("--post", default="16K", help="bytes kept from after a trigger (default 16K)")
+    sniff.add_argument("--post-timeout", type=float, default=1.0,
+                       help="seconds to wait for the post window before saving what arrived (default 1)")
+    sniff.add_argument("--max-dumps", type=int, help="stop saving windows after this many per port")
+    sniff.add_argument("--out", default="captures", help="directory for the .scap windows (default captures)")
+    sniff.add_argument("--stats-interval", type=float, default=0, help="seconds between status lines (0 = off)")
+    autobaud = subcommands.add_parser("autobaud", help="find a device's baud rate and format by probing it")
+    autobaud.add_argument("--port", required=True)
+    autobaud.add_argument("--probe", default="AT\\r\\n", help="command sent at each step (default AT\\r\\n)")
+    autobaud.add_argument("--expect", help="regex a good reply must match (default: any clean line)")
+    autobaud.add_argument("--bauds", help="comma-separated rates to try (default 9600 up to 3000000)")
+    autobaud.add_argument("--formats", help="comma-separated formats to try (default 8N1,7E1)")
+    autobaud.add_argument("--step-ms", type=float, default=150, help="reply timeout per step (default 150)")
+    autobaud.add_argument("--cache", help="cache file (default ~/.serial_command_sender/autobaud.json)")
+    autobaud.add_argument("--no-cache", action="store_true", help="ignore cached settings and probe every candidate")
+    autobaud.add_argument("-v", "--verbose", action="store_true", help="print every probe and its score")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    subcommand = args.subcommand or "gui"
+    try:
+        if subcommand in FRONTENDS:
+            return run_frontend(subcommand)
+        if subcommand == "ports":
+            return list_ports(args)
+        if subcommand == "bridge":
+            return run_bridge(args)
+        if subcommand == "serve":
+            return run_server(args)
+        if subcommand == "replay":
+            return run_replay(args)
+        if subcommand == "simulate":
+            return run_simulator(args)
+        if subcommand == "logs":
+            return query_logs(args)
+        if subcommand == "sniff":
+            return run_sniffer(args)
+        if subcommand == "autobaud":
+            return run_autobaud(args)
+        return run_batch(args)
+    except MissingDependency as e:
+        print(e, file=sys.stderr)
+        return 2
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
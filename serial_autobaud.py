@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Find a device's baud rate and character format by probing it.
+
+Each candidate (baud rate and format such as 8N1 or 7E1) gets the probe command with a short
+timeout on one open connection; the port is only reconfigured between steps. A reply read at
+the wrong settings comes back as bytes with the high bit set, control characters or nothing,
+so each reply is scored by the share of clean ASCII in it, whether it ends a line, and whether
+it matches the expected pattern. The first candidate scoring above the threshold wins.
+
+Winners are cached in a JSON file keyed by the USB serial number (the device name for ports
+without one), so the next detection tries the cached settings first and needs a single probe.
+
+    python sercom.py autobaud --port /dev/ttyUSB0 --probe "AT\\r\\n"
+"""
+import json
+import os
+import re
+import time
+
+import serial
+
+BAUD_RATES = (9600, 115200, 38400, 19200, 57600, 230400, 460800, 921600, 1000000, 1500000, 2000000, 3000000,
+              4800, 2400, 1200)
+LINE_FORMATS = ("8N1", "7E1")
+DEFAULT_PROBE = b"AT\r\n"
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".serial_command_sender", "autobaud.json")
+
+_FORMAT = re.compile(r"([5-8])([NEOMS])([12]|1\.5)", re.IGNORECASE)
+_CLEAN = frozenset(range(0x20, 0x7F)) | {0x09, 0x0A, 0x0D}
+
+
+def line_options(line_format="8N1"):
+    """pyserial keyword arguments for a character format written like 8N1, 7E1 or 8O2."""
+    match = _FORMAT.fullmatch(line_format.strip())
+    if not match:
+        raise ValueError(f"unknown character format {line_format!r}; use e.g. 8N1 or 7E1")
+    bits, parity, stop = match.groups()
+    return {"bytesize": int(bits), "parity": parity.upper(), "stopbits": float(stop) if stop == "1.5" else int(stop)}
+
+
+def score_reply(data, expect=None):
+    """0 (nothing, or garbage) to 1 (clean ASCII ending a line and matching expect)."""
+    if not data:
+        return 0.0
+    score = sum(byte in _CLEAN for byte in data) / len(data)
+    if b"\n" not in data and b"\r" not in data:
+        score *= 0.6
+    if len(data) < 2:
+        score *= 0.5  # One stray byte is too easy to get by chance
+    if expect is not None and not expect.search(data):
+        score *= 0.3
+    return score
+
+
+class ProbeResult:
+    __slots__ = ("baud_rate", "line_format", "reply", "score")
+
+    def __init__(self, baud_rate, line_format, reply, score):
+        self.baud_rate = baud_rate
+        self.line_format = line_format
+        self.reply = reply
+        self.score = score
+
+    def __str__(self):
+        return f"{self.baud_rate} {self.line_format}"
+
+
+class AutobaudResult:
+    """The winning settings (None when nothing answered cleanly) and every probe made."""
+
+    def __init__(self, port, best, probes, cached, elapsed):
+        self.port = port
+        self.best = best
+        self.probes = probes
+        self.cached = cached
+        self.elapsed = elapsed
+
+    @property
+    def found(self):
+        return self.best is not None
+
+    def describe(self):
+        if not self.best:
+            return f"No settings gave a clean reply on {self.port} ({len(self.probes)} probes, {self.elapsed:.2f} s)."
+        source = "cached settings confirmed" if self.cached else f"{len(self.probes)} probes"
+        return (f"{self.port}: {self.best} (score {self.best.score:.2f}, {source}, {self.elapsed:.2f} s), "
+                f"reply {self.best.reply!r}")
+
+
+class AutobaudCache:
+    """Settings that worked, per port key, in a small JSON file."""
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = path
+        try:
+            with open(path, "r") as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(port):
+        """'sn:<USB serial number>' when the port has one, otherwise 'port:<device>'."""
+        try:
+            from serial_ports import shared_registry
+            info = shared_registry().find(device=port)
+        except Exception:
+            info = None
+        if info is not None and info.serial_number:
+            return f"sn:{info.serial_number}"
+        return f"port:{port}"
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        return entry["baud_rate"], entry["line_format"]
+
+    def put(self, key, port, baud_rate, line_format):
+        self.entries[key] = {"baud_rate": baud_rate, "line_format": line_format, "port": port,
+                             "updated": time.strftime("%Y-%m-%d %H:%M:%S")}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(self.entries, file, indent=4)
+        os.replace(temporary, self.path)
+
+
+def candidates(baud_rates=None, line_formats=None):
+    """Every format at every rate, all 8N1 rates first since a 7E1 device garbles 8N1 replies anyway."""
+    return [(baud_rate, line_format) for line_format in (line_formats or LINE_FORMATS)
+            for baud_rate in (baud_rates or BAUD_RATES)]
+
+
+def probe_once(connection, payload, step_timeout):
+    """Write payload and collect the reply until a line has ended and the line went quiet, or step_timeout.
+
+    The connection's read timeout is how long "quiet" is.
+    """
+    connection.reset_input_buffer()
+    connection.write(payload)
+    connection.flush()
+    reply = bytearray()
+    deadline = time.monotonic() + step_timeout
+    while time.monotonic() < deadline:
+        chunk = connection.read(connection.in_waiting or 1)
+        if chunk:
+            reply += chunk
+        elif b"\n" in reply or b"\r" in reply:
+            break
+    return bytes(reply)
+
+
+def detect(port, probe=DEFAULT_PROBE, expect=None, baud_rates=None, line_formats=None, step_timeout=0.15,
+           threshold=0.9, cache=None, use_cache=True, on_probe=None):
+    """Probe port for working settings; returns an AutobaudResult.
+
+    probe is the payload to send at each step, expect an optional regex (str or bytes) a good
+    reply must match. cache is an AutobaudCache (the default file when None); with use_cache
+    the cached settings are tried first and the winner is stored. on_probe(ProbeResult) is
+    called after every step.
+    """
+    if isinstance(expect, str):
+        expect = expect.encode()
+    if isinstance(expect, bytes):
+        expect = re.compile(expect)
+    started = time.monotonic()
+    order = candidates(baud_rates, line_formats)
+    cache = cache if cache is not None else (AutobaudCache() if use_cache else None)
+    key = AutobaudCache.key(port) if cache is not None else None
+    remembered = cache.get(key) if cache is not None and use_cache else None
+    if remembered:
+        order = [remembered] + [candidate for candidate in order if candidate != remembered]
+    probes = []
+    best = None
+    current_format = "8N1"  # Opened with settings every port accepts, so only a missing port fails here
+    connection = serial.serial_for_url(port, 9600, timeout=0.01)
+    try:
+        for baud_rate, line_format in order:
+            try:
+                if line_format != current_format or not connection.is_open:
+                    # Reopened with the new format applied at once: changing the data bits and
+                    # parity one at a time can pass through a combination a driver rejects
+                    connection.close()
+                    connection.apply_settings({"baudrate": baud_rate, **line_options(line_format)})
+                    connection.open()
+                    current_format = line_format
+                else:
+                    connection.baudrate = baud_rate
+                reply = probe_once(connection, probe, step_timeout)
+            except serial.SerialTimeoutException:
+                reply = b""
+            except Exception:
+                continue  # Settings this port cannot do, such as 3 Mbaud on many adapters
+            result = ProbeResult(baud_rate, line_format, reply, score_reply(reply, expect))
+            probes.append(result)
+            if on_probe:
+                on_probe(result)
+            if best is None or result.score > best.score:
+                best = result
+            if result.score >= threshold:
+                break
+    finally:
+        connection.close()
+    if best is not None and best.score < threshold:
+        best = None
+    if best is not None and cache is not None and (best.baud_rate, best.line_format) != remembered:
+        cache.put(key, port, best.baud_rate, best.line_format)
+    cached = best is not None and remembered == (best.baud_rate, best.line_format) and len(probes) == 1
+    return AutobaudResult(port, best, probes, cached, time.monotonic() - started)
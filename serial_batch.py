@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Non-interactive runner: sends a command file (or commands piped on stdin) and exits with a status.
+
+    python sercom.py run --port /dev/ttyUSB0 --baud 115200 --script board_test.json --out result.jsonl
+    generate_commands | python sercom.py run --port COM3 --json
+
+Exit status: 0 all replies OK, 1 at least one reply timed out, 3 the port could not be opened
+or failed mid-run, 4 at least one reply matched --fail-regex (default: ERROR) or a script's
+expect failed. 2 is left for usage and dependency errors.
+"""
+import datetime
+import json
+import re
+import sys
+import threading
+import time
+
+from serial_cache import ResponseCache
+from serial_capture import CaptureWriter
+from serial_engine import SerialEngine
+from serial_framing import Framing, FramingRules
+from serial_payload import Command, format_bytes, parse_commands, parse_payload, reply_log_entry
+from serial_scheduler import Pacer
+from serial_script import Script, ScriptRunner, load_script
+
+EXIT_OK = 0
+EXIT_TIMEOUT = 1
+EXIT_USAGE = 2
+EXIT_PORT = 3
+EXIT_FAILED = 4
+
+
+class BatchRunner:
+    """Sends commands on one port and streams a result per reply to stdout and optionally a JSONL file."""
+
+    def __init__(self, port, baud_rate=9600, framing_rules=None, window=1, tag_pattern=None, fail_pattern=rb"ERROR",
+                 out=None, json_output=False, hex_view=False, stop_on_failure=False, stdout=None, capture=None,
+                 line_format="8N1", response_cache=None, pacer=None):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.line_format = line_format
+        self.response_cache = response_cache  # A serial_cache.ResponseCache, or None to always ask the device
+        self.pacer = pacer  # A serial_scheduler.Pacer, or None to send as fast as replies allow
+        self.framing_rules = framing_rules or FramingRules()
+        self.window = window
+        self.tag_pattern = tag_pattern
+        self.fail_pattern = re.compile(fail_pattern) if fail_pattern else None
+        self.out = out
+        self.json_output = json_output
+        self.hex_view = hex_view
+        self.stop_on_failure = stop_on_failure
+        self.stdout = stdout or sys.stdout
+        self.capture = capture  # Path of a raw capture file (see serial_capture.py)
+        self.sent = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.stopped = False
+
+    def failed(self, reply):
+        return self.fail_pattern is not None and self.fail_pattern.search(reply.data) is not None
+
+    def report(self, command, reply):
+        entry = reply_log_entry(datetime.datetime.now().isoformat(timespec="milliseconds"), command, reply, self.port)
+        self.sent += 1
+        if reply.timed_out:
+            self.timeouts += 1
+        if self.failed(reply):
+            self.failures += 1
+            entry["failed"] = True
+        if self.stop_on_failure and (reply.timed_out or entry.get("failed")):
+            self.stopped = True
+        line = json.dumps(entry, separators=(",", ":"))
+        if self.out:
+            self.out.write(line + "\n")
+            self.out.flush()
+        if self.json_output:
+            self.stdout.write(line + "\n")
+        else:
+            status = " TIMEOUT" if reply.timed_out else " FAIL" if entry.get("failed") else " CACHED" if reply.cached else ""
+            self.stdout.write(f"> {command.text} ({reply.elapsed * 1000:.1f} ms){status}\n"
+                              f"{format_bytes(reply.data, self.hex_view)}\n")
+        self.stdout.flush()
+
+    def run(self, commands):
+        """Send a list of Commands (pipelined when window > 1), run a Script or stream an iterable of
+        lines; returns the exit status."""
+        engine = SerialEngine(self.port, self.baud_rate, line_format=self.line_format)
+        engine.response_cache = self.response_cache
+        engine.pacer = self.pacer
+        if self.capture:
+            engine.capture = CaptureWriter(self.capture, self.port, self.baud_rate)
+        try:
+            engine.open()
+        except Exception as e:
+            print(f"Error opening {self.port}: {e}", file=sys.stderr)
+            if engine.capture:
+                engine.capture.close()
+            return EXIT_PORT
+        try:
+            if isinstance(commands, Script):
+                self.run_script(engine, commands)
+            elif isinstance(commands, list):
+                self.run_list(engine, commands)
+            else:
+                self.run_stream(engine, commands)
+        except Exception as e:
+            print(f"Error on {self.port}: {e}", file=sys.stderr)
+            return EXIT_PORT
+        finally:
+            engine.close()
+            if engine.capture:
+                engine.capture.close()
+        return self.status()
+
+    def run_list(self, engine, commands):
+        stop = threading.Event() if self.stop_on_failure else None
+
+        def on_reply(index, reply):
+            self.report(commands[index], reply)
+            if self.stopped:
+                stop.set()
+        requests = [(command.payload, self.framing_rules.get(command.text)) for command in commands]
+        engine.transact_many(requests, self.window, self.tag_pattern, on_reply=on_reply, cancel_event=stop)
+
+    def run_script(self, engine, script):
+        # A script judges its replies with expect; an ERROR a retry recovers from is not a failure
+        self.fail_pattern = None
+        stop = threading.Event()
+
+        def on_reply(command, reply):
+            self.report(command, reply)
+            if self.stopped:
+                stop.set()
+        result = ScriptRunner(engine, script, on_reply, stop).run()
+        if not result.ok:
+            print(f"Script failed: {result.error}", file=sys.stderr)
+            self.failures += 1
+
+    def run_stream(self, engine, lines):
+        # Lines are sent as they arrive, so a producer on the other end of a pipe gets replies immediately
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith(("#", "//")):
+                continue
+            try:
+                command = Command(line)
+            except ValueError as e:
+                print(f"Skipping line {number} ({line!r}): {e}", file=sys.stderr)
+                self.failures += 1
+                continue
+            self.report(command, engine.transact(command.payload, self.framing_rules.get(command.text)))
+            if self.stopped:
+                break
+
+    def status(self):
+        if self.failures:
+            return EXIT_FAILED
+        if self.timeouts:
+            return EXIT_TIMEOUT
+        return EXIT_OK
+
+
+def run(args):
+    """Execute the arguments of 'sercom.py run' and return the exit status."""
+    timeout = {"timeout_ms": args.timeout_ms} if args.timeout_ms is not None else None
+    from_file = args.script and args.script != "-"
+    response_cache = pacer = None
+    if from_file:
+        script = load_script(args.script, timeout)
+        framing_rules = script.framing_rules
+        response_cache = script.response_cache
+        pacer = script.pacer
+        if script.flat:
+            commands = script.commands + parse_commands(args.commands)
+        elif args.commands:
+            raise ValueError("extra commands cannot be added to a script with expect/loop/retry steps")
+        else:
+            commands = script
+    elif args.commands:
+        commands, framing_rules = parse_commands(args.commands), FramingRules()
+    else:
+        commands, framing_rules = sys.stdin, FramingRules()
+    if timeout and not from_file:
+        framing_rules.default = Framing.from_dict(timeout, framing_rules.default)
+    baud_rate, line_format = args.baud, args.format
+    if baud_rate == "auto":
+        from serial_autobaud import detect
+        try:
+            result = detect(args.port, parse_payload(args.probe))
+        except Exception as e:
+            print(f"Error opening {args.port}: {e}", file=sys.stderr)
+            return EXIT_PORT
+        print(result.describe(), file=sys.stderr)
+        if not result.found:
+            return EXIT_PORT
+        baud_rate, line_format = result.best.baud_rate, result.best.line_format
+    if args.cache and response_cache is None:
+        response_cache = ResponseCache()
+    if args.rate or args.min_gap_ms:
+        pacer = Pacer(args.rate, args.burst, (args.min_gap_ms or 0) / 1000)
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    start = time.perf_counter()
+    try:
+        runner = BatchRunner(args.port, baud_rate, framing_rules, args.window, args.tag,
+                             args.fail_regex.encode() if args.fail_regex else None, out, args.json, args.hex,
+                             args.stop_on_failure, capture=args.capture, line_format=line_format,
+                             response_cache=response_cache, pacer=pacer)
+        status = runner.run(commands)
+    finally:
+        if out:
+            out.close()
+    print(f"{runner.sent} commands, {runner.timeouts} timed out, {runner.failures} failed "
+          f"in {time.perf_counter() - start:.3f} s", file=sys.stderr)
+    if response_cache is not None:
+        print(response_cache.describe(), file=sys.stderr)
+    if pacer is not None:
+        print(pacer.describe(), file=sys.stderr)
+    return status
+
+
+def main(argv=None):
+    import sercom  # The 'run' subcommand owns the argument definitions
+    return sercom.main(["run", *(sys.argv[1:] if argv is None else argv)])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Throughput and latency benchmark for the serial send/receive path.
+
+Drives SerialEngine (the engine behind SerialCommandSenderCLI and the other frontends)
+against pyserial's loop:// URL and against a pty pair with a scripted responder, then
+reports commands/sec, bytes/sec and round-trip percentiles. Results are written as JSON so
+runs can be compared before and after a change:
+
+    python serial_benchmark.py --count 2000 --out bench.json
+    python serial_benchmark.py --count 2000 --compare bench.json
+
+--cold-start N also launches "sercom.py run" N times against a pty and times each start
+to the first byte on the wire, the figure scripted test stations care about.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import select
+import subprocess
+import sys
+import threading
+import time
+
+from serial_engine import SerialEngine
+from serial_framing import Framing
+from serial_stats import percentile
+
+REPLY_FRAMING = Framing(terminators=[b"OK\r\n"], timeout=2.0)
+
+
+class PtyResponder:
+    """Plays a device on the master side of a pty: answers each CR-terminated command with a reply."""
+
+    def __init__(self, reply=b"OK\r\n", delay=0.0):
+        import tty
+        self.reply = reply
+        self.delay = delay
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="pty-responder", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        pending = b""
+        while self.running:
+            try:
+                pending += os.read(self.master, 65536)
+            except OSError:
+                return
+            count = pending.count(b"\r")
+            if not count:
+                continue
+            pending = pending[pending.rindex(b"\r") + 1:]
+            if self.delay:
+                time.sleep(self.delay)
+            os.write(self.master, self.reply * count)
+
+    def close(self):
+        self.running = False
+        os.close(self.slave)
+        os.close(self.master)
+
+
+def run_case(port, payload, expected_reply_bytes, count, window, baud_rate=115200):
+    engine = SerialEngine(port, baud_rate)
+    engine.open()
+    try:
+        # Warm up so the first measured command doesn't pay for thread start-up and caches
+        engine.transact_many([(payload, REPLY_FRAMING)] * min(20, count), window)
+        start = time.perf_counter()
+        replies = engine.transact_many([(payload, REPLY_FRAMING)] * count, window)
+        wall = time.perf_counter() - start
+    finally:
+        engine.close()
+    latencies = sorted(reply.elapsed for reply in replies if reply is not None)
+    timeouts = sum(1 for reply in replies if reply is None or reply.timed_out)
+    received = sum(len(reply.data) for reply in replies if reply is not None)
+    return {
+        "commands": count,
+        "window": window,
+        "timeouts": timeouts,
+        "wall_time_s": wall,
+        "commands_per_s": count / wall if wall else 0.0,
+        "bytes_per_s": (count * len(payload) + received) / wall if wall else 0.0,
+        "reply_bytes_per_command": expected_reply_bytes,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000,
+        },
+    }
+
+
+def run_benchmarks(args):
+    payload = b"AT+BENCH" + b"X" * max(0, args.payload_size - 9) + b"\r"
+    reply = b"+" + b"R" * max(0, args.reply_size - 7) + b"\r\nOK\r\n"
+    results = {}
+    if args.transport in ("loop", "all"):
+        # loop:// hands every written byte straight back, so the "reply" is the command itself
+        loop_payload = payload + reply
+        results["loop"] = run_case("loop://", loop_payload, len(loop_payload), args.count, args.window)
+    if args.transport in ("pty", "all"):
+        if not hasattr(os, "openpty"):
+            print("pty benchmark skipped: os.openpty is not available on this platform.")
+        else:
+            responder = PtyResponder(reply, args.delay_ms / 1000)
+            try:
+                results["pty"] = run_case(responder.port, payload, len(reply), args.count, args.window)
+            finally:
+                responder.close()
+    return results
+
+
+def measure_cold_start(runs, timeout=10.0):
+    """Launch a headless sercom run per iteration and time process start to its first byte on the pty."""
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sercom.py")
+    command = [sys.executable, script, "run", "--port", os.ttyname(slave), "--baud", "115200", "AT\\r"]
+    times = []
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            ready, _, _ = select.select([master], [], [], timeout)
+            if not ready:
+                process.kill()
+                raise RuntimeError(f"sercom run sent nothing within {timeout:g} s: "
+                                   f"{process.communicate()[1].decode(errors='replace').strip()}")
+            times.append(time.perf_counter() - start)
+            os.read(master, 65536)
+            os.write(master, b"OK\r\n")
+            process.wait()
+    finally:
+        os.close(slave)
+        os.close(master)
+    times.sort()
+    return {
+        "runs": runs,
+        "first_byte_ms": {
+            "p50": percentile(times, 0.50) * 1000,
+            "min": times[0] * 1000,
+            "max": times[-1] * 1000,
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_results(results):
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        print(f"{name:5} {result['commands_per_s']:10.0f} cmd/s {result['bytes_per_s'] / 1024:10.1f} KiB/s  "
+              f"p50 {latency['p50']:.3f} ms  p95 {latency['p95']:.3f} ms  p99 {latency['p99']:.3f} ms  "
+              f"max {latency['max']:.3f} ms  timeouts {result['timeouts']}")
+
+
+def print_cold_start(cold_start):
+    first_byte = cold_start["first_byte_ms"]
+    print(f"cold start to first byte over {cold_start['runs']} runs: p50 {first_byte['p50']:.1f} ms  "
+          f"min {first_byte['min']:.1f} ms  max {first_byte['max']:.1f} ms")
+
+
+def compare(results, parameters, baseline_path, tolerance, cold_start=None):
+    """Print the change against a previous run and return True if anything regressed beyond tolerance."""
+    with open(baseline_path) as file:
+        report = json.load(file)
+    baseline = report["results"]
+    keys = ("count", "window", "payload_size", "reply_size", "delay_ms")
+    changed = [key for key in keys if report.get("parameters", {}).get(key) != parameters.get(key)]
+    if changed:
+        print(f"Note: baseline was run with different {', '.join(changed)}; the comparison is not like for like.")
+    regressed = False
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        throughput = result["commands_per_s"] / old["commands_per_s"] - 1 if old["commands_per_s"] else 0.0
+        p99 = result["latency_ms"]["p99"] / old["latency_ms"]["p99"] - 1 if old["latency_ms"]["p99"] else 0.0
+        flag = ""
+        if throughput < -tolerance or p99 > tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{name:5} throughput {throughput:+.1%}  p99 latency {p99:+.1%}{flag}")
+    if cold_start and report.get("cold_start"):
+        old = report["cold_start"]["first_byte_ms"]["p50"]
+        change = cold_start["first_byte_ms"]["p50"] / old - 1 if old else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"cold start p50 {change:+.1%}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the serial command send/receive path.")
+    parser.add_argument("--transport", choices=["loop", "pty", "all"], default="all")
+    parser.add_argument("--count", type=int, default=1000, help="commands per transport")
+    parser.add_argument("--window", type=int, default=1, help="commands in flight (1 = one at a time)")
+    parser.add_argument("--payload-size", type=int, default=16, help="bytes per command")
+    parser.add_argument("--reply-size", type=int, default=16, help="bytes per reply")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="responder think time per reply (pty only)")
+    parser.add_argument("--cold-start", type=int, default=0, metavar="N",
+                        help="also time N headless 'sercom.py run' starts to the first byte (pty only)")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare against a previous --out file; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    print_results(results)
+    cold_start = None
+    if args.cold_start:
+        if not hasattr(os, "openpty"):
+            print("cold-start benchmark skipped: os.openpty is not available on this platform.")
+        else:
+            cold_start = measure_cold_start(args.cold_start)
+            print_cold_start(cold_start)
+    if args.out:
+        report = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "parameters": vars(args),
+            "results": results,
+        }
+        if cold_start:
+            report["cold_start"] = cold_start
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=4)
+        print(f"Results written to {args.out}")
+    if args.compare:
+        return 1 if compare(results, vars(args), args.compare, args.tolerance, cold_start) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
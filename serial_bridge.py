@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Raw byte forwarding: echo a port back to itself, or bridge two ports as a software null-modem.
+
+Bytes are forwarded verbatim. Each direction has its own thread and one preallocated buffer.
+On POSIX serial devices the thread polls the file descriptor, reads into the buffer with
+os.readv and writes from a memoryview slice, so a chunk is never copied on its way through.
+Other platforms and URL handlers (loop://, socket://) use pyserial's read()/write().
+"""
+import os
+import select
+import threading
+import time
+
+import serial
+
+BUFFER_SIZE = 64 * 1024
+
+
+class Pump:
+    """Copies everything readable on source to target until stopped; tap(direction, data) sees each chunk."""
+
+    def __init__(self, source, target, direction, tap=None, on_error=None, buffer_size=BUFFER_SIZE):
+        self.source = source
+        self.target = target
+        self.direction = direction
+        self.tap = tap
+        self.on_error = on_error
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.bytes = 0
+        self.chunks = 0
+        self.running = False
+        self.wake_read, self.wake_write = os.pipe() if hasattr(select, "poll") else (None, None)
+        self.thread = threading.Thread(target=self.run, name=f"bridge-{direction}", daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.wake_write is not None:
+            os.write(self.wake_write, b"x")
+        elif hasattr(self.source, "cancel_read"):
+            self.source.cancel_read()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        for fd in (self.wake_read, self.wake_write):
+            if fd is not None:
+                os.close(fd)
+        self.wake_read = self.wake_write = None
+
+    def run(self):
+        try:
+            if self.wake_read is not None and _fileno(self.source) is not None and _fileno(self.target) is not None:
+                self.run_fd(_fileno(self.source), _fileno(self.target))
+            else:
+                self.run_generic()
+        except Exception as e:
+            if self.running and self.on_error:
+                self.on_error(self.direction, e)
+
+    def run_fd(self, source, target):
+        readable = select.poll()
+        readable.register(source, select.POLLIN)
+        readable.register(self.wake_read, select.POLLIN)
+        writable = select.poll()
+        writable.register(target, select.POLLOUT)
+        writable.register(self.wake_read, select.POLLIN)
+        view = self.view
+        while self.running:
+            events = readable.poll()
+            if any(fd == self.wake_read for fd, event in events):
+                return
+            try:
+                count = os.readv(source, [view])
+            except BlockingIOError:
+                continue
+            if count == 0:
+                raise serial.SerialException("device reports readiness but returned no data (disconnected?)")
+            chunk = view[:count]
+            sent = 0
+            while sent < count:
+                try:
+                    sent += os.write(target, chunk[sent:])
+                except BlockingIOError:
+                    # The target's output buffer is full: wait for room instead of spinning
+                    if any(fd == self.wake_read for fd, event in writable.poll()):
+                        return
+            self.delivered(chunk)
+
+    def run_generic(self):
+        source, target = self.source, self.target
+        while self.running:
+            data = source.read(source.in_waiting or 1)
+            if data:
+                target.write(data)
+                self.delivered(data)
+
+    def delivered(self, chunk):
+        self.bytes += len(chunk)
+        self.chunks += 1
+        if self.tap:
+            self.tap(self.direction, bytes(chunk))  # The only copy, and only when tapping
+
+
+def _fileno(connection):
+    try:
+        return connection.fileno()
+    except Exception:
+        return None
+
+
+class SerialBridge:
+    """Echo port_a back to itself, or with port_b forward A->B and B->A.
+
+    tap(direction, data) is called from the pump threads with "A>A", "A>B" or "B>A";
+    on_error(direction, error) when a port fails.
+    """
+
+    def __init__(self, port_a, port_b=None, baud_rate=115200, tap=None, on_error=None, buffer_size=BUFFER_SIZE):
+        self.port_a = port_a
+        self.port_b = port_b
+        self.baud_rate = baud_rate
+        self.tap = tap
+        self.on_error = on_error
+        self.buffer_size = buffer_size
+        self.connections = []
+        self.pumps = []
+        self.started = 0.0
+
+    def open(self):
+        try:
+            a = serial.serial_for_url(self.port_a, self.baud_rate, timeout=0.1)
+            self.connections.append(a)
+            if self.port_b:
+                b = serial.serial_for_url(self.port_b, self.baud_rate, timeout=0.1)
+                self.connections.append(b)
+                self.pumps = [Pump(a, b, "A>B", self.tap, self.on_error, self.buffer_size),
+                              Pump(b, a, "B>A", self.tap, self.on_error, self.buffer_size)]
+            else:
+                self.pumps = [Pump(a, a, "A>A", self.tap, self.on_error, self.buffer_size)]
+        except Exception:
+            self.close()
+            raise
+        self.started = time.monotonic()
+        for pump in self.pumps:
+            pump.start()
+
+    def close(self):
+        for pump in self.pumps:
+            pump.stop()
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+
+    def counters(self):
+        """{direction: (bytes, chunks)} forwarded so far."""
+        return {pump.direction: (pump.bytes, pump.chunks) for pump in self.pumps}
+
+    def describe_rates(self, previous=None, interval=None):
+        """One status line with bytes/s per direction, since start or since the previous counters()."""
+        elapsed = interval or max(1e-9, time.monotonic() - self.started)
+        parts = []
+        for direction, (count, chunks) in self.counters().items():
+            before = previous.get(direction, (0, 0))[0] if previous else 0
+            parts.append(f"{direction} {(count - before) / elapsed / 1024:.1f} KiB/s ({count} bytes)")
+        return ", ".join(parts)
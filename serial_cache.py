@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Replies to read-only query commands, kept for a while so repeated queries skip the serial line.
+
+Rules map a regex to the seconds a reply stays fresh, as the "cache" key of a command file:
+
+    {"cache": {"AT\\\\+VERSION": 3600, "AT\\\\+\\\\w+\\\\?": 30}}
+
+(or "cache": true for DEFAULT_RULES). A pattern must match the whole command, line ending
+aside; a TTL of 0 marks a read whose answer changes every time (AT+MEASURE), so it is always
+sent but leaves the cache alone. A command that matches no pattern is not a query: sending it
+empties the port's cache, since it may change what the queries would answer (AT+RESET,
+AT+BAUD1, AT+NAME=...). Only complete replies are kept, and the cache is keyed by port and
+command bytes, so one cache can serve several ports and outlives reconnects.
+"""
+import re
+import threading
+import time
+
+from serial_engine import Reply
+
+# The bare AT ping and ATI identification are reads too; without them every AT a polling loop
+# sends would empty the cache
+DEFAULT_RULES = {r"AT\+\w+\?": 30.0, r"AT\+VERSION": 300.0, r"ATI\d*": 300.0, r"AT": 0.0}
+
+
+class ResponseCache:
+    """Thread-safe; SerialEngine calls before_send() and store() around each command it writes."""
+
+    def __init__(self, rules=None, clock=time.monotonic):
+        rules = DEFAULT_RULES if rules is None else rules
+        self.rules = [(re.compile(pattern.encode() if isinstance(pattern, str) else pattern), float(ttl))
+                      for pattern, ttl in rules.items()]
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}  # (port, payload) -> (expires, data)
+        self.generations = {}  # port -> number of invalidations so far
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        """The cache a command file's "cache" value asks for: None when absent or false."""
+        if not data:
+            return None
+        return cls(None if data is True else data)
+
+    def ttl(self, payload):
+        """Seconds a reply to payload may be reused, or None if payload is not a query."""
+        command = payload.rstrip(b"\r\n")
+        for pattern, ttl in self.rules:
+            if pattern.fullmatch(command):
+                return ttl
+        return None
+
+    def before_send(self, port, payload):
+        """(cached Reply or None, token for store()); a non-query empties the port's entries."""
+        ttl = self.ttl(payload)
+        with self.lock:
+            if ttl is None:
+                self.invalidations += 1
+                self.generations[port] = self.generations.get(port, 0) + 1
+                for key in [key for key in self.entries if key[0] == port]:
+                    del self.entries[key]
+                return None, None
+            if not ttl:
+                return None, None
+            entry = self.entries.get((port, payload))
+            if entry is not None and entry[0] > self.clock():
+                self.hits += 1
+                return Reply(entry[1], False, 0, 0, 0, cached=True), None
+            self.misses += 1
+            return None, (self.generations.get(port, 0), ttl)
+
+    def store(self, port, payload, reply, token):
+        """Keep a reply fetched after before_send() handed out token, unless the port was invalidated since."""
+        if token is None or reply.timed_out:
+            return
+        generation, ttl = token
+        with self.lock:
+            if self.generations.get(port, 0) == generation:
+                self.entries[(port, payload)] = (self.clock() + ttl, reply.data)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations = {port: generation + 1 for port, generation in self.generations.items()}
+            self.hits = self.misses = self.invalidations = 0
+
+    def describe(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            rate = f" ({self.hits / lookups:.0%} hit rate)" if lookups else ""
+            return (f"Response cache: {self.hits} hits, {self.misses} misses{rate}, "
+                    f"{self.invalidations} invalidating commands, {len(self.entries)} entries")
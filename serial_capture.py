@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Raw session capture: every chunk read or written, with a nanosecond timestamp and direction.
+
+A capture file is a header followed by fixed-size record headers, each followed by its bytes:
+
+    header  "SCAP", version u16, port name length u16, wall-clock start (time_ns) i64, baud u32, port name
+    record  offset from the start of the capture in ns u64, direction u8 (0 RX, 1 TX), length u32, data
+
+Records are appended to an in-memory buffer and written by a background thread, so the serial
+reader never waits on the disk. CaptureReplay plays the device side of a capture back through a
+pseudo-terminal (Linux/macOS) at the recorded speed, faster, or as fast as the reader keeps up:
+
+    python sercom.py run --port /dev/ttyUSB0 --capture session.scap --script test.txt
+    python sercom.py replay session.scap --speed 20 --link /tmp/ttyREPLAY
+"""
+import os
+import select
+import struct
+import threading
+import time
+
+RX = 0
+TX = 1
+DIRECTION_NAMES = ("RX", "TX")
+
+MAGIC = b"SCAP"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHqI")
+_RECORD = struct.Struct("<QBI")
+
+
+class CaptureWriter:
+    """Appends records to path; record() is safe to call from any thread and only copies into memory.
+
+    The writer thread empties the buffer every flush_interval seconds, or sooner once it holds
+    buffer_size bytes.
+    """
+
+    def __init__(self, path, port="", baud_rate=0, flush_interval=0.2, buffer_size=1024 * 1024):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.file = open(path, "wb")
+        name = str(port).encode()
+        self.file.write(_HEADER.pack(MAGIC, VERSION, len(name), time.time_ns(), baud_rate or 0) + name)
+        self.started_ns = time.perf_counter_ns()
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.records = 0
+        self.bytes = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.write_loop, name="capture-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, direction, data, timestamp_ns=None):
+        """Add one chunk; timestamp_ns is a perf_counter_ns() reading, taken now if not given."""
+        offset = (timestamp_ns or time.perf_counter_ns()) - self.started_ns
+        with self.lock:
+            if self.closed:
+                return
+            self.buffer += _RECORD.pack(max(0, offset), direction, len(data))
+            self.buffer += data
+            self.records += 1
+            self.bytes += len(data)
+            full = len(self.buffer) >= self.buffer_size
+        if full:
+            self.wake.set()
+
+    def write_loop(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            with self.lock:
+                buffer, self.buffer = self.buffer, bytearray()
+                closed = self.closed
+            if buffer:
+                self.file.write(buffer)
+                self.file.flush()
+            if closed:
+                return
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.wake.set()
+        self.thread.join()
+        self.file.close()
+
+
+def write_capture(path, records, port="", baud_rate=0, started_ns=None):
+    """Write a whole capture at once; records are (offset_ns, direction, data), offsets from started_ns (time_ns)."""
+    name = str(port).encode()
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, len(name), started_ns or time.time_ns(), baud_rate or 0) + name)
+        for offset, direction, data in records:
+            file.write(_RECORD.pack(max(0, offset), direction, len(data)))
+            file.write(data)
+
+
+class CaptureRecord:
+    __slots__ = ("offset_ns", "direction", "data")
+
+    def __init__(self, offset_ns, direction, data):
+        self.offset_ns = offset_ns
+        self.direction = direction
+        self.data = data
+
+    def __repr__(self):
+        return f"CaptureRecord({self.offset_ns}, {DIRECTION_NAMES[self.direction]}, {self.data!r})"
+
+
+class CaptureReader:
+    """Iterates the records of a capture file; port, baud_rate and started_ns come from its header."""
+
+    def __init__(self, path, buffer_size=1024 * 1024):
+        self.path = path
+        self.file = open(path, "rb", buffering=buffer_size)
+        header = self.file.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:4] != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a capture file")
+        magic, version, name_length, self.started_ns, self.baud_rate = _HEADER.unpack(header)
+        if version != VERSION:
+            self.file.close()
+            raise ValueError(f"{path}: unsupported capture version {version}")
+        self.port = self.file.read(name_length).decode(errors="replace")
+        self.data_start = self.file.tell()
+
+    def __iter__(self):
+        self.file.seek(self.data_start)
+        read = self.file.read
+        unpack = _RECORD.unpack
+        size = _RECORD.size
+        while True:
+            header = read(size)
+            if len(header) < size:
+                return  # End of file, or a record cut short when the capture was interrupted
+            offset, direction, length = unpack(header)
+            data = read(length)
+            if len(data) < length:
+                return
+            yield CaptureRecord(offset, direction, data)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReplay:
+    """Plays the RX side of a capture to whatever opens a pseudo-terminal, as the device did.
+
+    speed scales the recorded gaps (2.0 = twice as fast); 0 writes as fast as the reader takes
+    the data. Bytes the program under test writes are read and counted. With follow_tx the replay
+    also waits, at each recorded TX record, until the program has written as many bytes as the
+    recording had by then, and times the following RX from that moment, so request/response
+    sessions replay deterministically regardless of how fast the program answers.
+    """
+
+    def __init__(self, path, speed=1.0, follow_tx=False, link=None, tx_timeout=5.0, settle=0.1):
+        import pty
+        import tty
+        self.path = path
+        self.speed = speed
+        self.follow_tx = follow_tx
+        self.link = link
+        self.tx_timeout = tx_timeout
+        self.settle = settle
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.device = os.ttyname(slave)
+        os.close(slave)  # Keeping it closed lets POLLHUP on the master tell us when the program opens it
+        if link:
+            if os.path.islink(link):
+                os.remove(link)
+            os.symlink(self.device, link)
+        self.rx_bytes = 0
+        self.rx_records = 0
+        self.tx_bytes = 0
+        self.tx_expected = 0
+        self.tx_changed = threading.Condition()
+        self.running = False
+
+    def wait_for_open(self, timeout=None):
+        """Block until a program opens the pty; returns False on timeout."""
+        poller = select.poll()
+        poller.register(self.master, select.POLLIN)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            events = poller.poll(200)
+            if not any(event & select.POLLHUP for fd, event in events):
+                # pyserial flushes the input buffer while opening; give it a moment before writing
+                time.sleep(self.settle)
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def drain_loop(self):
+        while self.running:
+            try:
+                data = os.read(self.master, 65536)
+            except OSError:
+                data = b""
+            if not data:
+                time.sleep(0.01)  # The program closed the pty; it may reopen it
+                continue
+            with self.tx_changed:
+                self.tx_bytes += len(data)
+                self.tx_changed.notify_all()
+
+    def run(self, on_progress=None):
+        """Replay the whole capture; returns (elapsed seconds, recorded duration in seconds)."""
+        self.running = True
+        threading.Thread(target=self.drain_loop, name="replay-drain", daemon=True).start()
+        started = anchor_ns = time.perf_counter_ns()
+        anchor_offset = None
+        last_offset = 0
+        with CaptureReader(self.path) as reader:
+            for record in reader:
+                if anchor_offset is None:
+                    anchor_offset = record.offset_ns
+                last_offset = record.offset_ns
+                if record.direction == TX:
+                    if self.follow_tx:
+                        self.tx_expected += len(record.data)
+                        with self.tx_changed:
+                            self.tx_changed.wait_for(lambda: self.tx_bytes >= self.tx_expected, self.tx_timeout)
+                        anchor_ns, anchor_offset = time.perf_counter_ns(), record.offset_ns
+                    continue
+                if self.speed:
+                    delay = anchor_ns + (record.offset_ns - anchor_offset) / self.speed - time.perf_counter_ns()
+                    if delay > 0:
+                        time.sleep(delay / 1e9)
+                view = memoryview(record.data)
+                while view:
+                    view = view[os.write(self.master, view):]
+                self.rx_bytes += len(record.data)
+                self.rx_records += 1
+                if on_progress:
+                    on_progress(record)
+        self.running = False
+        return (time.perf_counter_ns() - started) / 1e9, last_offset / 1e9
+
+    def close(self):
+        self.running = False
+        os.close(self.master)
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+
+
+def format_record(record, hex_view=False):
+    from serial_payload import format_bytes
+    return (f"{record.offset_ns / 1e6:12.3f} ms {DIRECTION_NAMES[record.direction]} "
+            f"{len(record.data):5d}  {format_bytes(record.data, hex_view)}")
@@ -1,60 +1,309 @@
 import sys
-import subprocess
-import importlib
-import platform
-import shutil
 import json
-import serial
-import serial.tools.list_ports
 import datetime
-import time
-
-# Function to install packages if missing
-def install_and_import(package, import_name=None):
-    if import_name is None:
-        import_name = package
-    try:
-        module = importlib.import_module(import_name)
-    except ImportError:
-        print(f"⚠ {package} not found. Installing...")
-
-        # Check if running on Raspberry Pi
-        if shutil.which("apt") and "raspberrypi" in platform.uname().release:
-            try:
-                subprocess.check_call(["sudo", "apt", "install", "-y", f"python3-{package.lower()}"])
-                module = importlib.import_module(import_name)
-            except subprocess.CalledProcessError:
-                print(f"⚠ Failed to install {package} via apt. Trying pip instead...")
-                subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-        else:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-        
-        # Import the module again after installation
-        module = importlib.import_module(import_name)
-
-    # Store module in global namespace
-    globals()[import_name] = module
-
-# Install required packages
-required_packages = [("pyserial", "serial"), ("PyQt6", None)]
-for package, import_name in required_packages:
-    install_and_import(package, import_name)
 
 from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QPushButton, QComboBox, QLabel, QTextEdit, QFileDialog, QVBoxLayout, QHBoxLayout, QWidget, QListWidget, QAbstractItemView
+    QApplication, QMainWindow, QPushButton, QComboBox, QLabel, QFileDialog, QVBoxLayout, QHBoxLayout, QWidget, QListWidget, QAbstractItemView,
+    QSpinBox, QCheckBox, QProgressBar, QPlainTextEdit, QDialog
 )
-from PyQt6.QtGui import QPalette, QColor
-from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QPalette, QColor, QFontDatabase
+from PyQt6.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal, pyqtSlot
+import threading
+import time
+from collections import deque
+
+from serial_autobaud import detect
+from serial_cache import ResponseCache
+from serial_engine import SerialEngine
+from serial_framing import FramingRules
+from serial_history import SessionHistory
+from serial_log_sink import JsonlLogSink
+from serial_payload import format_bytes, parse_commands
+from serial_ports import shared_registry
+from serial_scheduler import BATCH, INTERACTIVE, CommandScheduler, Pacer
+from serial_stats import LatencyStats
+
+class ResponseView(QPlainTextEdit):
+    """Plain-text response pane that renders queued lines in frame-rate batches.
+
+    append() only queues the text; a timer appends everything queued since the last frame in
+    one call, and the document keeps at most scrollback lines. While paused nothing is
+    rendered, but the newest scrollback lines are kept and shown on resume.
+    """
+
+    def __init__(self, scrollback=10000, frame_interval_ms=16):
+        super().__init__()
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(scrollback)
+        self.pending = deque(maxlen=scrollback)
+        self.paused = False
+        self.render_timer = QTimer(self)
+        self.render_timer.timeout.connect(self.render_pending)
+        self.render_timer.start(frame_interval_ms)
+
+    def append(self, text):
+        self.pending.append(text)
+
+    def set_scrollback(self, lines):
+        self.setMaximumBlockCount(lines)
+        self.pending = deque(self.pending, maxlen=lines)
+
+    def set_paused(self, paused):
+        self.paused = paused
+        if not paused:
+            self.render_pending()
+
+    def render_pending(self):
+        if self.paused or not self.pending:
+            return
+        text = "\n".join(self.pending)
+        self.pending.clear()
+        scrollbar = self.verticalScrollBar()
+        follow = scrollbar.value() == scrollbar.maximum()  # Only auto-scroll if the user hasn't scrolled up
+        self.appendPlainText(text)
+        if follow:
+            scrollbar.setValue(scrollbar.maximum())
+
+class LatencyStatsDialog(QDialog):
+    """Non-modal window with the per-command latency table, refreshed once a second while shown."""
+
+    def __init__(self, stats, parent=None, status=None):
+        super().__init__(parent)
+        self.stats = stats
+        self.status = status  # Returns lines shown under the table (response cache, queues), or None
+        self.setWindowTitle("Latency Stats")
+        self.resize(760, 300)
+        self.table = QPlainTextEdit()
+        self.table.setReadOnly(True)
+        self.table.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.table.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addWidget(reset_button)
+        self.setLayout(layout)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+
+    def refresh(self):
+        if self.isVisible():
+            status = self.status() if self.status else None
+            self.table.setPlainText(self.stats.format_table() + (f"\n\n{status}" if status else ""))
+
+    def reset(self):
+        self.stats.reset()
+        self.refresh()
+
+class SerialWorker(QObject):
+    """Owns the serial engine on a QThread and talks to the window only through signals.
+
+    Opening, closing and queueing run in this object's slots on the worker thread; the commands
+    themselves go through a CommandScheduler, so a command sent on its own overtakes a running
+    Send All. enqueue(), cancel(), take_received() and set_echo() only touch thread-safe state, so
+    the window calls them directly even while a long send is in progress.
+    """
+    data_available = pyqtSignal()  # Received data is waiting in take_received()
+    reply_ready = pyqtSignal(object, object)  # Command, Reply
+    progress = pyqtSignal(int, int)  # done, total
+    queue_finished = pyqtSignal(int, bool)  # commands sent, cancelled
+    connection_changed = pyqtSignal(bool, str)  # connected, message
+    error = pyqtSignal(str)
+    open_requested = pyqtSignal(str, int)
+    close_requested = pyqtSignal()
+    queue_ready = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.engine = None
+        self.scheduler = None
+        self.echo_enabled = False
+        self.response_cache = None  # Set from a command file's "cache" key; survives reconnects
+        self.pacer = None  # Set from a command file's "pacing" key; survives reconnects
+        self.pending = deque()  # (commands, framing_rules, window, lane) jobs in send order
+        self.running = 0  # Jobs queued here or in the scheduler and not finished
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.received = bytearray()
+        self.received_signalled = False
+        self.total = 0
+        self.done = 0
+        self.open_requested.connect(self.open_port)
+        self.close_requested.connect(self.close_port)
+        self.queue_ready.connect(self.process_queue)
+
+    # Declared as slots so queued calls run on the worker's thread rather than the thread that connected them
+    @pyqtSlot(str, int)
+    def open_port(self, port, baud_rate):
+        self.close_port(notify=False)
+        line_format = "8N1"
+        try:
+            if not baud_rate:
+                result = detect(port)
+                if not result.found:
+                    self.connection_changed.emit(False, f"❌ {result.describe()}")
+                    return
+                baud_rate, line_format = result.best.baud_rate, result.best.line_format
+            engine = SerialEngine(port, baud_rate, line_format=line_format)
+            engine.subscribe(self.on_data, self.on_error, include_responses=False)
+            engine.echo = self.echo_enabled
+            engine.response_cache = self.response_cache
+            engine.open()
+            self.engine = engine
+            self.scheduler = CommandScheduler(engine, self.pacer, on_job_done=self.job_done)
+            self.connection_changed.emit(True, f"Connected to {port} at {baud_rate} baud {line_format}.")
+        except Exception as e:
+            self.connection_changed.emit(False, f"❌ Error opening serial connection: {e}")
+
+    @pyqtSlot()
+    def close_port(self, notify=True):
+        if self.engine:
+            self.engine.close()
+            self.scheduler.stop()  # Jobs still queued finish unsent
+            self.engine = self.scheduler = None
+            if notify:
+                self.connection_changed.emit(False, "Disconnected.")
+
+    def on_data(self, data):
+        # Runs on the engine's reader thread. Chunks are coalesced until the window collects them,
+        # so a chatty device costs one queued signal per GUI frame instead of one per chunk.
+        with self.lock:
+            self.received += data
+            notify = not self.received_signalled
+            self.received_signalled = True
+        if notify:
+            self.data_available.emit()
+
+    def on_error(self, error):
+        self.error.emit(str(error))
+        if self.engine and not self.engine.is_open:
+            self.connection_changed.emit(False, "Device disconnected.")
+
+    def take_received(self):
+        with self.lock:
+            data = bytes(self.received)
+            self.received.clear()
+            self.received_signalled = False
+        return data
+
+    def set_echo(self, enabled):
+        # The engine echoes raw bytes itself, on its reader thread, before this worker sees them
+        self.echo_enabled = enabled
+        engine = self.engine
+        if engine:
+            engine.echo = enabled
+
+    def set_response_cache(self, cache):
+        self.response_cache = cache
+        engine = self.engine
+        if engine:
+            engine.response_cache = cache
+
+    def set_pacer(self, pacer):
+        self.pacer = pacer
+        scheduler = self.scheduler
+        if scheduler:
+            scheduler.pacer = pacer
+
+    def status(self):
+        """Response cache, queue and pacing counters for the stats window, or None."""
+        lines = [self.response_cache.describe()] if self.response_cache else []
+        scheduler = self.scheduler
+        if scheduler:
+            lines.append(scheduler.describe())
+        return "\n".join(lines) or None
+
+    @property
+    def busy(self):
+        """Whether any job is queued here or in the scheduler."""
+        with self.lock:
+            return self.running > 0
+
+    def enqueue(self, commands, framing_rules, window=1, lane=BATCH):
+        with self.lock:
+            if not self.running:
+                self.cancel_event.clear()  # A cancel only applies to the jobs that were active then
+            self.pending.append((list(commands), framing_rules, window, lane))
+            self.total += len(commands)
+            self.running += 1
+        self.queue_ready.emit()
+
+    def cancel(self):
+        """Drop queued commands and stop the running batch after the replies already awaited.
+
+        Does nothing while idle, so a cancel can never carry over to the next send.
+        """
+        with self.lock:
+            if self.running:
+                self.cancel_event.set()
+
+    @pyqtSlot()
+    def process_queue(self):
+        # Only hands jobs to the scheduler, so queued opens and closes still run in order
+        while True:
+            with self.lock:
+                if not self.pending:
+                    break
+                commands, framing_rules, window, lane = self.pending.popleft()
+            if not self.cancel_event.is_set() and not (self.scheduler and self.engine.is_open):
+                self.error.emit("Serial connection is not open.")
+                self.cancel_event.set()
+            if self.cancel_event.is_set():
+                self.job_done(None)
+                continue
+            requests = [(command.payload, framing_rules.get(command.text)) for command in commands]
+
+            def deliver(index, reply, commands=commands):
+                with self.lock:
+                    self.done += 1
+                    done, total = self.done, self.total
+                self.reply_ready.emit(commands[index], reply)
+                self.progress.emit(done, total)
+            self.scheduler.submit(requests, lane, window, on_reply=deliver, cancel_event=self.cancel_event)
+
+    def job_done(self, job):
+        # On the scheduler's thread, or this worker's for a job that was never submitted
+        if job is not None and job.error is not None:
+            self.error.emit(f"Error sending command: {job.error}")
+        with self.lock:
+            self.running -= 1
+            if self.running:
+                return
+            done, total = self.done, self.total
+            self.total = self.done = 0
+            cancelled = self.cancel_event.is_set()
+            self.cancel_event.clear()
+        if total:
+            self.queue_finished.emit(done, cancelled)
   
 class SerialCommandSender(QMainWindow):
+    port_event = pyqtSignal(str, object)  # "added"/"removed", PortInfo; emitted from the registry's thread
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Serial Command Sender")
         self.setGeometry(100, 100, 800, 600)
+        self.history = SessionHistory(JsonlLogSink(prefix="gui"))  # Kept in memory, and streamed to logs/
 
         self.echo_enabled = False  # Default: Echo is OFF
-        self.serial_read_timer = QTimer()
-        self.serial_read_timer.timeout.connect(self.read_and_echo_serial)
+        self.connected = False
+        self.timestamp_second = None
+        self.timestamp_text = ""
+        self.stats = LatencyStats()
+        self.stats_dialog = None
+
+        # 🔹 All serial traffic runs on a worker thread so slow devices never block the window
+        self.serial_thread = QThread()
+        self.worker = SerialWorker()
+        self.worker.moveToThread(self.serial_thread)
+        self.worker.data_available.connect(self.read_and_echo_serial)
+        self.worker.reply_ready.connect(self.show_reply)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.queue_finished.connect(self.send_finished)
+        self.worker.connection_changed.connect(self.connection_changed)
+        self.worker.error.connect(self.report_serial_error)
+        self.serial_thread.start()
 
         main_layout = QVBoxLayout()
         top_layout = QHBoxLayout()
@@ -64,6 +313,8 @@ class SerialCommandSender(QMainWindow):
         top_layout.addWidget(self.port_label)
         
         self.com_port_combo = QComboBox()
+        self.com_port_combo.setEditable(True)  # Also accepts URLs such as socket://host:7000 or rfc2217://host:7001
+        self.com_port_combo.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
         top_layout.addWidget(self.com_port_combo)
         self.com_port_combo.showPopup = self.refresh_com_ports_then_show_popup
 
@@ -71,7 +322,8 @@ class SerialCommandSender(QMainWindow):
         top_layout.addWidget(self.baud_label)
         
         self.baud_rate_combo = QComboBox()
-        self.baud_rate_combo.addItems(["9600", "115200", "38400", "19200", "57600"])
+        self.baud_rate_combo.addItems(["9600", "115200", "38400", "19200", "57600", "230400", "460800", "921600",
+                                       "1000000", "1500000", "2000000", "3000000", "Auto"])
         self.baud_rate_combo.setCurrentText("9600")
         top_layout.addWidget(self.baud_rate_combo)
 
@@ -107,15 +359,50 @@ class SerialCommandSender(QMainWindow):
         self.fire_all_button.clicked.connect(self.send_all_commands)
         button_layout.addWidget(self.fire_all_button)
 
+        # Commands kept in flight by "Send All"; 1 waits for each reply before sending the next
+        self.window_label = QLabel("Window:")
+        button_layout.addWidget(self.window_label)
+        self.window_spin = QSpinBox()
+        self.window_spin.setRange(1, 64)
+        self.window_spin.setValue(1)
+        button_layout.addWidget(self.window_spin)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_sending)
+        button_layout.addWidget(self.cancel_button)
+
+        self.send_progress = QProgressBar()
+        self.send_progress.setFormat("%v / %m")
+        self.send_progress.setValue(0)
+        button_layout.addWidget(self.send_progress)
+
         self.clear_selection_button = QPushButton("Clear Selection")
         self.clear_selection_button.clicked.connect(self.clear_selection)
         button_layout.addWidget(self.clear_selection_button)
         bottom_layout.addLayout(button_layout)
         
-        self.response_area = QTextEdit()
-        self.response_area.setReadOnly(True)
+        self.response_area = ResponseView(scrollback=10000)
         bottom_layout.addWidget(self.response_area)
 
+        view_layout = QHBoxLayout()
+        self.pause_view_checkbox = QCheckBox("Pause View")
+        self.pause_view_checkbox.toggled.connect(self.response_area.set_paused)
+        view_layout.addWidget(self.pause_view_checkbox)
+        view_layout.addWidget(QLabel("Scrollback lines:"))
+        self.scrollback_spin = QSpinBox()
+        self.scrollback_spin.setRange(100, 1000000)
+        self.scrollback_spin.setSingleStep(1000)
+        self.scrollback_spin.setValue(10000)
+        self.scrollback_spin.valueChanged.connect(self.response_area.set_scrollback)
+        view_layout.addWidget(self.scrollback_spin)
+        view_layout.addStretch()
+        bottom_layout.addLayout(view_layout)
+
+        self.stats_button = QPushButton("Latency Stats")
+        self.stats_button.clicked.connect(self.show_stats)
+        view_layout.addWidget(self.stats_button)
+
         self.save_log_button = QPushButton("Save Log")
         self.save_log_button.clicked.connect(self.save_log)
         bottom_layout.addWidget(self.save_log_button)
@@ -124,6 +411,9 @@ class SerialCommandSender(QMainWindow):
         self.echo_button.clicked.connect(self.toggle_echo)
         button_layout.addWidget(self.echo_button)
 
+        self.hex_view_checkbox = QCheckBox("Hex View")
+        button_layout.addWidget(self.hex_view_checkbox)
+
         main_layout.addLayout(top_layout)
         main_layout.addLayout(bottom_layout)
         
@@ -131,14 +421,16 @@ class SerialCommandSender(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
-        self.serial_connection = None
         self.commands = []
-        self.log_data = []
-        self.check_connection_timer = QTimer()
-        self.check_connection_timer.timeout.connect(self.check_connection)
+        self.framing_rules = FramingRules()
+
+        # The registry keeps the port list current in the background, so the combo box reads it instantly
+        self.port_registry = shared_registry()
+        self.port_event.connect(self.on_port_event)
+        self.unsubscribe_ports = self.port_registry.subscribe(self.port_event.emit)
 
     def refresh_com_ports_then_show_popup(self):
-        """Refresh COM port list before showing dropdown."""
+        """Refresh COM port list from the registry's cache before showing dropdown."""
         self.refresh_com_ports()
         QComboBox.showPopup(self.com_port_combo)
 
@@ -146,65 +438,94 @@ class SerialCommandSender(QMainWindow):
         """Toggles the echo mode on/off."""
         self.echo_enabled = not self.echo_enabled
         status = "ON" if self.echo_enabled else "OFF"
+        self.worker.set_echo(self.echo_enabled)
         self.echo_button.setText(f"Echo Data: {status}")
         self.response_area.append(f"[{self.timestamp()}] Echo Mode: {status}\n")
 
     def read_and_echo_serial(self):
-        """Reads incoming serial data and echoes it back if echo is enabled."""
-        if not self.serial_connection or not self.serial_connection.is_open:
-            self.serial_read_timer.stop()  # 🔹 Stop timer if connection is lost
+        """Displays data collected by the serial worker; with echo on the engine has already sent it back verbatim."""
+        data = self.worker.take_received()
+        if not data:
             return
+        echoed = " (echoed)" if self.echo_enabled else ""
+        message = f"Received{echoed}: {format_bytes(data, self.hex_view_checkbox.isChecked())}"
+        self.history.record_message(message)
+        self.response_area.append(f"[{self.timestamp()}] {message}")
 
-        try:
-            if self.serial_connection.in_waiting > 0:  # 🔹 Only read when data is available
-                received_data = self.serial_connection.read(self.serial_connection.in_waiting).decode(errors='ignore').strip()
-                
-                if received_data:
-                    # Display received data in the UI
-                    self.response_area.append(f"[{self.timestamp()}] Received: {received_data}")
-
-                    # Echo data back only if echo mode is enabled
-                    if self.echo_enabled:
-                        self.serial_connection.write((received_data + "\r\n").encode())
-                        self.response_area.append(f"[{self.timestamp()}] Echoed: {received_data}")
-
-        except Exception as e:
-            self.response_area.append(f"[{self.timestamp()}] ❌ Error reading serial data: {e}\n")
+    def report_serial_error(self, message):
+        self.response_area.append(f"[{self.timestamp()}] ❌ {message}\n")
 
     def refresh_com_ports(self):
-        ports = [port.device for port in serial.tools.list_ports.comports()]
+        ports = self.port_registry.ports()
+        selected = self.com_port_combo.currentText()
         self.com_port_combo.clear()
         if not ports:
             self.com_port_combo.addItem("No COM Ports Found")
         else:
-            self.com_port_combo.addItems(ports)
-            # Select the first available port automatically
-            if self.com_port_combo.currentIndex() == -1:
-                self.com_port_combo.setCurrentIndex(0)
+            for index, port in enumerate(ports):
+                self.com_port_combo.addItem(port.device)
+                self.com_port_combo.setItemData(index, str(port), Qt.ItemDataRole.ToolTipRole)
+            # Keep the user's choice if the port is still there, otherwise select the first one
+            self.com_port_combo.setCurrentIndex(max(0, self.com_port_combo.findText(selected)))
+        if "://" in selected:
+            self.com_port_combo.setEditText(selected)  # A typed URL is never in the port list
+
+    def on_port_event(self, event, port):
+        self.response_area.append(f"[{self.timestamp()}] 🔌 Port {event}: {port}\n")
+        self.history.record_event(f"Port {event}: {port.device}", vid=port.vid, pid=port.pid,
+                                  serial_number=port.serial_number)
+        self.refresh_com_ports()
 
     def send_selected_command(self):
         selected_items = self.command_list.selectedItems()
         if selected_items:
-            for item in selected_items:
-                self.send_command(item.text())
+            self.send_commands([self.commands[self.command_list.row(item)] for item in selected_items],
+                               lane=INTERACTIVE)
 
     def send_all_commands(self):
-        for command in self.commands:
-            self.send_command(command)
+        self.send_commands(self.commands, self.window_spin.value())
 
     def send_command(self, command):
-        if not self.serial_connection:
-            self.open_serial_connection()
-        if self.serial_connection and self.serial_connection.is_open:
-            start_time = time.time()  # Start timing
-            try:
-                self.serial_connection.write((command).encode())
-                response = self.serial_connection.read(self.serial_connection.in_waiting).decode().strip()
-                elapsed_time = time.time() - start_time  # Calculate elapsed time
-                self.response_area.append(f"[{self.timestamp()}] > {command} (Took {elapsed_time:.3f} sec)\nResponse: {response}\n")
-                self.log_data.append({"timestamp": self.timestamp(), "command": command, "response": response, "time": elapsed_time})
-            except Exception as e:
-                self.response_area.append(f"Error sending command: {e}\n")
+        self.send_commands([command], lane=INTERACTIVE)
+
+    def send_commands(self, commands, window=1, lane=BATCH):
+        """Queues commands on the serial worker; replies and progress come back as signals.
+
+        Commands in the INTERACTIVE lane are sent ahead of any BATCH commands still queued.
+        """
+        if not commands:
+            return
+        if not self.connected:
+            self.open_serial_connection()  # Queued ahead of the commands, so it runs first
+        self.worker.enqueue(commands, self.framing_rules, window, lane)
+        self.cancel_button.setEnabled(True)
+
+    def cancel_sending(self):
+        self.worker.cancel()
+        self.cancel_button.setEnabled(False)
+
+    def update_progress(self, done, total):
+        self.send_progress.setMaximum(total)
+        self.send_progress.setValue(done)
+
+    def send_finished(self, sent, cancelled):
+        self.cancel_button.setEnabled(False)
+        if cancelled:
+            self.response_area.append(f"[{self.timestamp()}] ⚠ Sending cancelled after {sent} commands.\n")
+
+    def show_reply(self, command, reply):
+        response = format_bytes(reply.data, self.hex_view_checkbox.isChecked())
+        status = " ⚠ timed out" if reply.timed_out else " (cached)" if reply.cached else ""
+        self.response_area.append(f"[{self.timestamp()}] > {command.text} (Took {reply.elapsed:.3f} sec){status}\nResponse: {response}\n")
+        self.history.record_reply(command, reply)
+        self.stats.record(command.text, reply)
+
+    def show_stats(self):
+        if self.stats_dialog is None:
+            self.stats_dialog = LatencyStatsDialog(self.stats, self, self.worker.status)
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
+        self.stats_dialog.refresh()
 
     def clear_selection(self):
         """Clears the selection of commands."""
@@ -212,67 +533,53 @@ class SerialCommandSender(QMainWindow):
         self.enable_buttons()  # Refresh button states
 
     def toggle_connection(self):
-        if self.serial_connection and self.serial_connection.is_open:
-            self.serial_connection.close()
-            self.update_status_label(False)
-            self.connect_button.setText("Connect")
-            self.check_connection_timer.stop()
-
-            # 🔹 Ensure serial_read_timer stops properly
-            if self.serial_read_timer.isActive():
-                self.serial_read_timer.stop()
-            
-            self.serial_connection = None  # Set to None to indicate no active connection
-
+        if self.connected:
+            if self.worker.busy:
+                self.worker.cancel()
+            self.worker.close_requested.emit()
         else:
             self.open_serial_connection()
 
     def open_serial_connection(self):
-        port = self.com_port_combo.currentText()
+        port = self.com_port_combo.currentText().strip()
         
         if not port or port == "No COM Ports Found":
             self.response_area.append(f"[{self.timestamp()}] ⚠ No valid COM port selected.\n")
             return
         
-        baud_rate = int(self.baud_rate_combo.currentText())
-        
-        try:
-            self.serial_connection = serial.Serial(port, baud_rate, timeout=1)
-            self.update_status_label(True)
-            self.connect_button.setText("Disconnect")
-            self.check_connection_timer.start(1000)
-
-            # 🔹 Start polling for incoming data only if not already running
-            if not self.serial_read_timer.isActive():
-                self.serial_read_timer.start(100)  # Polling interval: 100ms
-
-        except Exception as e:
-            self.update_status_label(False)
-            self.response_area.append(f"[{self.timestamp()}] ❌ Error opening serial connection: {e}\n")
-
-    def check_connection(self):
-        if self.serial_connection and not self.serial_connection.is_open:
-            self.update_status_label(False)
-            self.response_area.append("Device disconnected.\n")
-            self.serial_connection = None
-            self.connect_button.setText("Connect")
-            self.check_connection_timer.stop()
+        text = self.baud_rate_combo.currentText()
+        if text == "Auto":
+            self.response_area.append(f"[{self.timestamp()}] Probing {port} for its baud rate and format...\n")
+        baud_rate = 0 if text == "Auto" else int(text)  # 0 asks the worker to detect it
+        self.worker.open_requested.emit(port, baud_rate)
+
+    def connection_changed(self, connected, message):
+        self.connected = connected
+        self.update_status_label(connected)
+        self.connect_button.setText("Disconnect" if connected else "Connect")
+        self.response_area.append(f"[{self.timestamp()}] {message}\n")
 
     def save_log(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Log File", "", "JSON Files (*.json);;Text Files (*.txt)")
         if file_path:
-            with open(file_path, "w") as file:
-                json.dump(self.log_data, file, indent=4)
+            try:
+                self.history.export(file_path)
+            except Exception as e:
+                self.response_area.append(f"[{self.timestamp()}] ❌ Error saving log: {e}\n")
+                return
             self.response_area.append(f"[{self.timestamp()}] Log saved to {file_path}\n")
 
     def timestamp(self):
-        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Formatting is only redone when the second changes; bursts of lines share one string
+        now = int(time.time())
+        if now != self.timestamp_second:
+            self.timestamp_second = now
+            self.timestamp_text = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        return self.timestamp_text
 
     def update_status_label(self, connected):
-        if not hasattr(self, 'log_data'):  # Ensure log_data exists before using it
-            self.log_data = []
         event = "Connected to Serial Port" if connected else "Disconnected from Serial Port"
-        self.log_data.append({"timestamp": self.timestamp(), "event": event})
+        self.history.record_event(event)
         self.com_port_combo.setDisabled(connected)
         self.baud_rate_combo.setDisabled(connected)
         if connected:
@@ -288,11 +595,20 @@ class SerialCommandSender(QMainWindow):
             try:
                 with open(file_path, "r") as file:
                     data = json.load(file)
-                    self.commands = data.get("commands", [])
+                    self.commands = parse_commands(data.get("commands", []))
+                    self.framing_rules = FramingRules.from_dict(data.get("framing"))
                     self.command_list.clear()
-                    self.command_list.addItems(self.commands)
+                    self.command_list.addItems([command.text for command in self.commands])
                     self.response_area.append(f"[{self.timestamp()}] Loaded {len(self.commands)} commands from {file_path}\n")
-                    self.log_data.append({"timestamp": self.timestamp(), "event": f"Loaded JSON file: {file_path}"})
+                    self.history.record_event(f"Loaded JSON file: {file_path}")
+                    if "cache" in data:
+                        cache = ResponseCache.from_dict(data["cache"])
+                        self.worker.set_response_cache(cache)
+                        self.response_area.append(f"[{self.timestamp()}] Response cache {'on' if cache else 'off'}.\n")
+                    if "pacing" in data:
+                        pacer = Pacer.from_dict(data["pacing"])
+                        self.worker.set_pacer(pacer)
+                        self.response_area.append(f"[{self.timestamp()}] Pacing: {pacer or 'off'}.\n")
                     if self.commands:
                         self.fire_all_button.setEnabled(True)
             except Exception as e:
@@ -303,22 +619,34 @@ class SerialCommandSender(QMainWindow):
         if file_path:
             try:
                 with open(file_path, "r") as file:
-                    self.commands = [line.strip() for line in file.readlines() if line.strip() and not line.strip().startswith(('#', '//'))]
+                    self.commands = parse_commands([line.strip() for line in file.readlines() if line.strip() and not line.strip().startswith(('#', '//'))])
                     self.command_list.clear()
-                    self.command_list.addItems(self.commands)
+                    self.command_list.addItems([command.text for command in self.commands])
                     self.response_area.append(f"[{self.timestamp()}] Loaded {len(self.commands)} commands from {file_path}\n")
-                    self.log_data.append({"timestamp": self.timestamp(), "event": f"Loaded text file: {file_path}"})
+                    self.history.record_event(f"Loaded text file: {file_path}")
                     if self.commands:
                         self.fire_all_button.setEnabled(True)
             except Exception as e:
                 self.response_area.append(f"[{self.timestamp()}] Error loading text file: {e}\n")
 
+    def closeEvent(self, event):
+        self.unsubscribe_ports()
+        self.worker.cancel()
+        self.serial_thread.quit()
+        self.serial_thread.wait()
+        self.worker.close_port(notify=False)  # The worker thread has stopped, so this is safe here
+        self.history.close()
+        super().closeEvent(event)
+
     def enable_buttons(self):
         """Enable the send button when at least one command is selected."""
         self.step_button.setEnabled(len(self.command_list.selectedItems()) > 0)
         
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+def main(argv=None):
+    app = QApplication(sys.argv if argv is None else argv)
     window = SerialCommandSender()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    return app.exec()
+
+if __name__ == "__main__":
+    sys.exit(main())
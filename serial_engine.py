@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+import re
+import threading
+import time
+from collections import deque
+
+import serial
+
+from serial_autobaud import line_options
+from serial_capture import RX, TX
+from serial_framing import DEFAULT_FRAMING
+
+
+class Reply:
+    """Bytes received for one command, whether the framing timed out, and how long each phase took.
+
+    Phases are perf_counter_ns offsets from the start of the write: write_ns when the write
+    returned, first_byte_ns when the first reply byte arrived (None if nothing came back) and
+    total_ns when the reply was complete. cached replies came from a ResponseCache without
+    touching the port, so their phases are all 0.
+    """
+    __slots__ = ("data", "timed_out", "total_ns", "write_ns", "first_byte_ns", "cached")
+
+    def __init__(self, data, timed_out, total_ns, write_ns=0, first_byte_ns=None, cached=False):
+        self.data = data
+        self.timed_out = timed_out
+        self.total_ns = total_ns
+        self.write_ns = write_ns
+        self.first_byte_ns = first_byte_ns
+        self.cached = cached
+
+    @property
+    def elapsed(self):
+        return self.total_ns / 1e9
+
+
+class SerialEngine:
+    """Owns one serial port and pushes received data to subscribers from a dedicated reader thread."""
+
+    def __init__(self, port, baud_rate=9600, read_timeout=0.1, framing=None, line_format="8N1"):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.line_format = line_format  # Data bits, parity and stop bits, e.g. 8N1 or 7E1
+        # Only bounds how quickly the reader notices close(); data is delivered as soon as it arrives.
+        self.read_timeout = read_timeout
+        self.serial_connection = None
+        self.reader_thread = None
+        self.subscribers = []
+        self.error_handlers = []
+        self.framing = framing or DEFAULT_FRAMING
+        self.lock = threading.Condition()  # Notified whenever bytes arrive for a command in flight
+        self.write_lock = threading.Lock()
+        self.transaction_lock = threading.Lock()
+        self.response_buffer = None  # Collects received bytes while a command is in flight
+        self.first_received_ns = 0  # When the oldest byte in response_buffer arrived
+        self.last_received_ns = 0
+        self.echo = False  # Write unsolicited bytes straight back, verbatim, from the reader thread
+        self.capture = None  # A serial_capture.CaptureWriter that records every chunk read and written
+        self.response_cache = None  # A serial_cache.ResponseCache consulted by transact() and transact_many()
+        self.pacer = None  # A serial_scheduler.Pacer that may hold back each command before it is written
+
+    @property
+    def is_open(self):
+        return self.serial_connection is not None and self.serial_connection.is_open
+
+    def open(self):
+        # serial_for_url accepts plain device names as well as loop://, socket:// and rfc2217:// URLs
+        self.serial_connection = serial.serial_for_url(self.port, self.baud_rate, timeout=self.read_timeout,
+                                                       **line_options(self.line_format))
+        self.reader_thread = threading.Thread(target=self.read_loop, name=f"serial-reader-{self.port}", daemon=True)
+        self.reader_thread.start()
+
+    def close(self):
+        connection, self.serial_connection = self.serial_connection, None
+        if connection is None:
+            return
+        try:
+            if hasattr(connection, "cancel_read"):
+                connection.cancel_read()
+        except Exception:
+            pass
+        connection.close()
+        if self.reader_thread and self.reader_thread is not threading.current_thread():
+            self.reader_thread.join(timeout=1)
+        self.reader_thread = None
+
+    def subscribe(self, callback, on_error=None, include_responses=True):
+        """Register callback(data) for received chunks; returns a function that unsubscribes it.
+
+        With include_responses=False the callback only sees unsolicited data, i.e. nothing
+        that arrives while a command sent through transact() is waiting for its reply.
+        """
+        entry = (callback, include_responses)
+        with self.lock:
+            self.subscribers.append(entry)
+            if on_error is not None:
+                self.error_handlers.append(on_error)
+
+        def unsubscribe():
+            with self.lock:
+                if entry in self.subscribers:
+                    self.subscribers.remove(entry)
+                if on_error in self.error_handlers:
+                    self.error_handlers.remove(on_error)
+        return unsubscribe
+
+    def read_loop(self):
+        connection = self.serial_connection
+        while self.serial_connection is connection and connection.is_open:
+            try:
+                # Blocks in the OS until the first byte arrives, then drains whatever else is buffered
+                data = connection.read(1)
+                if data:
+                    waiting = connection.in_waiting
+                    if waiting:
+                        data += connection.read(waiting)
+            except Exception as e:
+                if self.serial_connection is connection:
+                    self.dispatch_error(e)
+                    self.close()  # The device is gone; let frontends see is_open go False
+                break
+            if data:
+                if self.capture is not None:
+                    self.capture.record(RX, data)
+                self.dispatch(data)
+
+    def dispatch(self, data):
+        with self.lock:
+            capturing = self.response_buffer is not None
+            if capturing:
+                now = time.perf_counter_ns()
+                if not self.response_buffer:
+                    self.first_received_ns = now
+                self.response_buffer.extend(data)
+                self.last_received_ns = now
+                self.lock.notify_all()
+        if self.echo and not capturing:
+            # Echo before the subscribers run so the round trip never waits on logging or display
+            try:
+                self.write(data)
+            except Exception as e:
+                self.dispatch_error(e)
+        self.notify(data, unsolicited=not capturing)
+
+    def notify(self, data, unsolicited=True, taps=True):
+        """Call subscribers; taps are those registered with include_responses=True."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback, include_responses in subscribers:
+            if taps if include_responses else unsolicited:
+                try:
+                    callback(data)
+                except Exception as e:
+                    self.dispatch_error(e)
+
+    def dispatch_error(self, error):
+        with self.lock:
+            handlers = list(self.error_handlers)
+        for handler in handlers:
+            try:
+                handler(error)
+            except Exception:
+                pass
+
+    def write(self, data):
+        if not self.is_open:
+            raise serial.SerialException("Serial port is not open")
+        with self.write_lock:
+            if self.capture is not None:
+                # Recorded before writing so a fast reply can never appear ahead of its command
+                self.capture.record(TX, data)
+            self.serial_connection.write(data)
+
+    def transact(self, payload, framing=None):
+        """Write payload and wait until framing says the reply is complete; returns a Reply.
+
+        Anything received after the end of the reply is passed on to the unsolicited-data subscribers.
+        """
+        framing = framing or self.framing
+        cache = self.response_cache
+        with self.transaction_lock:
+            token = None
+            if cache is not None:
+                cached, token = cache.before_send(self.port, payload)
+                if cached is not None:
+                    return cached
+            if self.pacer is not None:
+                self.pacer.wait()  # Before the clock starts, so reply timings leave pacing out
+            with self.lock:
+                self.response_buffer = bytearray()
+            start = time.perf_counter_ns()
+            timed_out = False
+            try:
+                self.write(payload)
+                written = time.perf_counter_ns()
+                deadline = start + int(framing.timeout * 1e9)
+                idle_gap = int(framing.idle_gap * 1e9) if framing.idle_gap else 0
+                scanned = 0
+                with self.lock:
+                    buffer = self.response_buffer
+                    while True:
+                        end = framing.find_end(buffer, scanned)
+                        if end is not None:
+                            break
+                        scanned = len(buffer)
+                        now = time.perf_counter_ns()
+                        if now >= deadline:
+                            timed_out = True
+                            end = len(buffer)
+                            break
+                        wait = deadline - now
+                        if idle_gap and buffer:
+                            idle_deadline = self.last_received_ns + idle_gap
+                            if now >= idle_deadline:
+                                end = len(buffer)
+                                break
+                            wait = min(wait, idle_deadline - now)
+                        self.lock.wait(wait / 1e9)
+                    finished = time.perf_counter_ns()
+                    first_byte = self.first_received_ns - start if buffer else None
+            except BaseException:
+                with self.lock:
+                    self.response_buffer = None
+                raise
+            with self.lock:
+                buffer, self.response_buffer = self.response_buffer, None
+        # Late bytes that arrived after the reply ended are not part of it
+        surplus = bytes(buffer[end:])
+        if surplus:
+            self.notify(surplus, taps=False)  # Taps already saw these bytes
+        reply = Reply(bytes(buffer[:end]), timed_out, finished - start, written - start, first_byte)
+        if token is not None:
+            cache.store(self.port, payload, reply, token)
+        return reply
+
+    def transact_many(self, requests, window=1, tag_pattern=None, on_reply=None, cancel_event=None):
+        """Send (payload, framing) requests with up to window of them awaiting a reply at once.
+
+        Replies are matched to commands in FIFO order or, with tag_pattern, by its first group
+        when the same tag is found in a command and in a reply. Returns the Replies in request
+        order and calls on_reply(index, reply) as each one completes. A window of 1 sends each
+        command only after the previous reply, exactly like transact(). Once cancel_event is set
+        no further commands are written; replies already awaited are still collected and the
+        unsent commands are left as None.
+        """
+        requests = [(payload, framing or self.framing) for payload, framing in requests]
+        results = [None] * len(requests)
+
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+        if window <= 1:
+            for index, (payload, framing) in enumerate(requests):
+                if cancelled():
+                    break
+                results[index] = self.transact(payload, framing)
+                if on_reply:
+                    on_reply(index, results[index])
+            return results
+        if isinstance(tag_pattern, str):
+            tag_pattern = tag_pattern.encode()
+        if isinstance(tag_pattern, bytes):
+            tag_pattern = re.compile(tag_pattern)
+
+        # [index, framing, sent_ns, tag, written_ns] in the order the commands were written
+        in_flight = deque()
+        next_index = 0
+        cache = self.response_cache
+        tokens = {}  # index -> ResponseCache token for commands whose reply may be cached
+        looked_up = -1  # Last index checked against the cache, so a paced command is not counted twice
+        pacer = self.pacer
+        with self.transaction_lock:
+            with self.lock:
+                self.response_buffer = buffer = bytearray()
+            try:
+                while in_flight or (next_index < len(requests) and not cancelled()):
+                    pace = 0
+                    while next_index < len(requests) and len(in_flight) < window and not cancelled():
+                        payload, framing = requests[next_index]
+                        if cache is not None and looked_up != next_index:
+                            looked_up = next_index
+                            cached, token = cache.before_send(self.port, payload)
+                            if cached is not None:
+                                # Nothing is written, so FIFO matching of the other replies is unaffected
+                                results[next_index] = cached
+                                if on_reply:
+                                    on_reply(next_index, cached)
+                                next_index += 1
+                                continue
+                            if token is not None:
+                                tokens[next_index] = token
+                        if pacer is not None:
+                            pace = pacer.reserve()
+                            if pace:
+                                break  # Collect replies meanwhile instead of sleeping
+                        match = tag_pattern.search(payload) if tag_pattern else None
+                        sent = time.perf_counter_ns()
+                        self.write(payload)
+                        in_flight.append((next_index, framing, sent, match.group(1) if match else None,
+                                          time.perf_counter_ns()))
+                        next_index += 1
+                    with self.lock:
+                        completed = self.take_replies(buffer, in_flight, tag_pattern)
+                        if not completed and (in_flight or pace):
+                            deadline = self.next_deadline(buffer, in_flight) if in_flight else None
+                            if pace:
+                                paced = time.perf_counter_ns() + pace * 1e9
+                                deadline = paced if deadline is None else min(deadline, paced)
+                            self.lock.wait(max(0, deadline - time.perf_counter_ns()) / 1e9)
+                            completed = self.take_replies(buffer, in_flight, tag_pattern)
+                    for (index, framing, sent, tag, written), data, timed_out, first, finished in completed:
+                        first_byte = max(0, first - sent) if first is not None else None
+                        results[index] = Reply(data, timed_out, finished - sent, written - sent, first_byte)
+                        if index in tokens:
+                            cache.store(self.port, requests[index][0], results[index], tokens.pop(index))
+                        if on_reply:
+                            on_reply(index, results[index])
+            finally:
+                with self.lock:
+                    surplus, self.response_buffer = bytes(buffer), None
+        if surplus:
+            self.notify(surplus, taps=False)
+        return results
+
+    def take_replies(self, buffer, in_flight, tag_pattern):
+        """Cut every complete reply off the front of buffer; the caller holds self.lock."""
+        completed = []
+        now = time.perf_counter_ns()
+        while in_flight:
+            head = in_flight[0]
+            framing = head[1]
+            end = framing.find_end(buffer)
+            if end is None and framing.idle_gap and buffer and now >= self.last_received_ns + framing.idle_gap * 1e9:
+                end = len(buffer)
+            if end is None:
+                break
+            frame = bytes(buffer[:end])
+            first = self.first_received_ns
+            del buffer[:end]
+            # The arrival time of bytes left behind is not known exactly; the latest chunk bounds it
+            self.first_received_ns = self.last_received_ns
+            owner = head
+            match = tag_pattern.search(frame) if tag_pattern else None
+            if match:
+                owner = next((entry for entry in in_flight if entry[3] == match.group(1)), head)
+            in_flight.remove(owner)
+            completed.append((owner, frame, False, first, now))
+        for entry in list(in_flight):
+            if now >= entry[2] + entry[1].timeout * 1e9:
+                # A partial reply at the front of the buffer belongs to the oldest command
+                frame = b""
+                first = None
+                if entry is in_flight[0] and buffer:
+                    frame = bytes(buffer)
+                    first = self.first_received_ns
+                    del buffer[:]
+                in_flight.remove(entry)
+                completed.append((entry, frame, True, first, now))
+        return completed
+
+    def next_deadline(self, buffer, in_flight):
+        deadline = min(entry[2] + entry[1].timeout * 1e9 for entry in in_flight)
+        framing = in_flight[0][1]
+        if framing.idle_gap and buffer:
+            deadline = min(deadline, self.last_received_ns + framing.idle_gap * 1e9)
+        return deadline
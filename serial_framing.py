@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import re
+
+
+def _to_bytes(value):
+    return value.encode() if isinstance(value, str) else bytes(value)
+
+
+class Framing:
+    """Decides when a device's reply is complete.
+
+    A reply ends at the first terminator or regex match, once byte_count bytes have arrived,
+    or when the line has been idle for idle_gap seconds after the first byte. timeout is the
+    hard limit for the whole reply; every limit is in seconds.
+    """
+
+    def __init__(self, terminators=(), pattern=None, byte_count=None, idle_gap=None, timeout=1.0):
+        self.terminators = tuple(_to_bytes(t) for t in terminators if t)
+        self.pattern = re.compile(_to_bytes(pattern)) if pattern else None
+        self.byte_count = byte_count
+        self.idle_gap = idle_gap
+        self.timeout = timeout
+        # Terminators can straddle two chunks, so rescans back up by the longest one
+        self.overlap = max((len(t) for t in self.terminators), default=1) - 1
+
+    def find_end(self, buffer, scanned=0):
+        r"""Return the index just past the reply in buffer, or None while it is incomplete.
+
+        scanned is how much of buffer an earlier call already looked at without finding an end.
+
+        >>> DEFAULT_FRAMING.find_end(b"+NAME:BOOK\r\n+VER:1\r\nOK\r\n")
+        24
+        >>> DEFAULT_FRAMING.find_end(b"+NAME:BOOK\r\n") is None
+        True
+        >>> DEFAULT_FRAMING.find_end(b"ERROR: 5\r\nlate")
+        10
+        """
+        ends = []
+        start = max(0, scanned - self.overlap)
+        for terminator in self.terminators:
+            index = buffer.find(terminator, start)
+            if index >= 0:
+                ends.append(index + len(terminator))
+        if self.pattern is not None:
+            match = self.pattern.search(buffer)
+            if match:
+                ends.append(match.end())
+        if self.byte_count and len(buffer) >= self.byte_count:
+            ends.append(self.byte_count)
+        return min(ends) if ends else None
+
+    @classmethod
+    def from_dict(cls, data, base=None):
+        """Build a Framing from a JSON-style dict, filling unspecified keys from base.
+
+        Keys: until (string or list of strings), regex, bytes, idle_ms, timeout_ms.
+        """
+        base = base or DEFAULT_FRAMING
+        if any(key in data for key in ("until", "regex", "bytes")):
+            # Any explicit end condition replaces all of the inherited ones
+            until = data.get("until") or ()
+            terminators = [until] if isinstance(until, str) else until
+            pattern = data.get("regex")
+            byte_count = data.get("bytes")
+        else:
+            terminators = base.terminators
+            pattern = base.pattern.pattern if base.pattern is not None else None
+            byte_count = base.byte_count
+        idle_ms = data.get("idle_ms")
+        timeout_ms = data.get("timeout_ms")
+        return cls(
+            terminators=terminators,
+            pattern=pattern,
+            byte_count=byte_count,
+            idle_gap=base.idle_gap if idle_ms is None else idle_ms / 1000,
+            timeout=base.timeout if timeout_ms is None else timeout_ms / 1000,
+        )
+
+    def describe(self):
+        parts = []
+        if self.terminators:
+            parts.append("until " + " | ".join(repr(t)[2:-1] for t in self.terminators))
+        if self.pattern is not None:
+            parts.append(f"regex {self.pattern.pattern.decode(errors='replace')}")
+        if self.byte_count:
+            parts.append(f"{self.byte_count} bytes")
+        if self.idle_gap:
+            parts.append(f"idle {self.idle_gap * 1000:g} ms")
+        parts.append(f"timeout {self.timeout * 1000:g} ms")
+        return ", ".join(parts)
+
+
+# AT-style devices finish with a line that is OK or starts with ERROR (a data line merely ending
+# in OK, like +NAME:BOOK, does not count); devices that send neither are cut off by the idle gap
+DEFAULT_FRAMING = Framing(pattern=rb"(?:^|\n)(?:OK|ERROR[^\r\n]*)\r?\n", idle_gap=0.05, timeout=1.0)
+
+
+class FramingRules:
+    """Per-command framing loaded from the optional "framing" section of a JSON command file.
+
+    {"framing": {"default": {"until": "OK\\r\\n"}, "AT+RESET": {"idle_ms": 500, "timeout_ms": 3000}}}
+    """
+
+    def __init__(self, default=None, commands=None):
+        self.default = default or DEFAULT_FRAMING
+        self.commands = commands or {}
+
+    def get(self, command):
+        return self.commands.get(command, self.default)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data or {})
+        default = Framing.from_dict(data.pop("default", {}))
+        commands = {command: Framing.from_dict(options, default) for command, options in data.items()}
+        return cls(default, commands)
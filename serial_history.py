@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Session history kept in memory as columns instead of one dict per entry.
+
+Every reply, event and message becomes one row: integer time_ns timestamps and durations in
+array columns, commands and ports interned in tables, and response bytes and event texts
+appended to one shared bytearray. A reply costs 54 bytes plus its response, about 70 bytes for
+a short one, against about 400 as a dict of strings, so a million-entry session fits in tens of MB.
+
+Entries are turned back into the usual log dicts only when iterated or exported, so the
+history offers the same write/iter_lines/export/flush/close calls as JsonlLogSink and forwards
+every entry to a sink when it is given one.
+"""
+import datetime
+import json
+import re
+import threading
+import time
+from array import array
+
+from serial_engine import Reply
+from serial_payload import reply_log_entry
+
+KIND_REPLY = 0
+KIND_EVENT = 1
+KIND_MESSAGE = 2
+KIND_OTHER = 3  # A dict given to write() as it is
+
+FLAG_TIMED_OUT = 1
+FLAG_CACHED = 2
+_NO_FIRST_BYTE = -1
+
+
+def format_time_ns(time_ns):
+    return datetime.datetime.fromtimestamp(time_ns / 1e9).isoformat(sep=" ", timespec="milliseconds")
+
+
+class SessionHistory:
+    """Columnar store of a session's log entries; safe to record into from several threads."""
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.lock = threading.Lock()
+        self.times = array("q")
+        self.kinds = array("B")
+        self.flags = array("B")
+        self.command_ids = array("i")
+        self.port_ids = array("i")
+        self.offsets = array("Q")  # Where the row's bytes start in arena
+        self.lengths = array("I")
+        self.total_ns = array("q")
+        self.write_ns = array("q")
+        self.first_byte_ns = array("q")
+        self.arena = bytearray()
+        self.commands = []  # Command objects, one per distinct command text
+        self.command_lookup = {}
+        self.ports = []
+        self.port_lookup = {}
+        self.extras = {}  # Row -> extra event fields, or the whole dict for KIND_OTHER; rare
+
+    def __len__(self):
+        return len(self.times)
+
+    def _intern(self, table, lookup, key, value):
+        index = lookup.get(key)
+        if index is None:
+            index = lookup[key] = len(table)
+            table.append(value)
+        return index
+
+    def _append(self, kind, data, time_ns=None, flags=0, command_id=-1, port_id=-1,
+                total_ns=0, write_ns=0, first_byte_ns=_NO_FIRST_BYTE):
+        """Add a row; the caller holds self.lock. Returns the row number."""
+        row = len(self.times)
+        self.times.append(time_ns or time.time_ns())
+        self.kinds.append(kind)
+        self.flags.append(flags)
+        self.command_ids.append(command_id)
+        self.port_ids.append(port_id)
+        self.offsets.append(len(self.arena))
+        self.lengths.append(len(data))
+        self.arena += data
+        self.total_ns.append(total_ns)
+        self.write_ns.append(write_ns)
+        self.first_byte_ns.append(first_byte_ns)
+        return row
+
+    def record_reply(self, command, reply, port=None):
+        with self.lock:
+            command_id = self._intern(self.commands, self.command_lookup, (command.text, command.payload), command)
+            port_id = -1 if port is None else self._intern(self.ports, self.port_lookup, port, port)
+            flags = (FLAG_TIMED_OUT if reply.timed_out else 0) | (FLAG_CACHED if reply.cached else 0)
+            row = self._append(KIND_REPLY, reply.data, flags=flags,
+                               command_id=command_id, port_id=port_id, total_ns=reply.total_ns,
+                               write_ns=reply.write_ns,
+                               first_byte_ns=_NO_FIRST_BYTE if reply.first_byte_ns is None else reply.first_byte_ns)
+        self._forward(row)
+        return row
+
+    def record_event(self, text, time_ns=None, **fields):
+        """An event such as a connect or a file load; fields are extra log keys (vid, pid, summary...)."""
+        with self.lock:
+            row = self._append(KIND_EVENT, text.encode(), time_ns)
+            if fields:
+                self.extras[row] = fields
+        self._forward(row)
+        return row
+
+    def record_message(self, text, time_ns=None):
+        """A line of frontend output; time_ns is when it happened if it is recorded later."""
+        with self.lock:
+            row = self._append(KIND_MESSAGE, text.encode(), time_ns)
+        self._forward(row)
+        return row
+
+    def write(self, entry):
+        """Accept any log dict, as JsonlLogSink.write() does; it is kept as it is."""
+        with self.lock:
+            row = self._append(KIND_OTHER, b"")
+            self.extras[row] = dict(entry)
+        self._forward(row)
+        return row
+
+    def _forward(self, row):
+        if self.sink is not None:
+            self.sink.write(self.entry(row))
+
+    def entry(self, row):
+        """The log dict for one row, in the same shape the frontends have always written."""
+        kind = self.kinds[row]
+        if kind == KIND_OTHER:
+            return dict(self.extras[row])
+        timestamp = format_time_ns(self.times[row])
+        start = self.offsets[row]
+        data = bytes(self.arena[start:start + self.lengths[row]])
+        if kind == KIND_REPLY:
+            first_byte = self.first_byte_ns[row]
+            reply = Reply(data, bool(self.flags[row] & FLAG_TIMED_OUT), self.total_ns[row], self.write_ns[row],
+                          None if first_byte == _NO_FIRST_BYTE else first_byte, bool(self.flags[row] & FLAG_CACHED))
+            port_id = self.port_ids[row]
+            return reply_log_entry(timestamp, self.commands[self.command_ids[row]], reply,
+                                   self.ports[port_id] if port_id >= 0 else None)
+        entry = {"timestamp": timestamp, "event" if kind == KIND_EVENT else "message": data.decode(errors="replace")}
+        entry.update(self.extras.get(row, ()))
+        return entry
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.entry(row)
+
+    def iter_lines(self):
+        for entry in self:
+            yield json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+
+    def export(self, file_path):
+        """Write the session: JSON lines for .jsonl, otherwise the pretty-printed JSON array."""
+        if file_path.endswith(".jsonl"):
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.writelines(self.iter_lines())
+            return
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write("[")
+            separator = "\n"
+            for entry in self:
+                file.write(separator + "    " + json.dumps(entry, indent=4, default=str).replace("\n", "\n    "))
+                separator = ",\n"
+            file.write("\n]" if separator != "\n" else "]")
+
+    def search(self, pattern, limit=None):
+        """Rows whose command, response or event text matches the regex pattern (str or bytes), in order."""
+        if isinstance(pattern, str):
+            pattern = pattern.encode()
+        regex = re.compile(pattern)
+        with self.lock:
+            # Copies, so recording can go on while the regex runs
+            arena = bytes(self.arena)
+            kinds = self.kinds[:]
+            offsets = self.offsets[:]
+            lengths = self.lengths[:]
+            command_ids = self.command_ids[:]
+            commands = list(self.commands)
+            extras = list(self.extras.items())
+        # Each row's text is searched on its own, so matches never span rows and ^ and $ are per row
+        view = memoryview(arena)
+        search = regex.search
+        rows = {row for row, (kind, start, length) in enumerate(zip(kinds, offsets, lengths))
+                if kind != KIND_OTHER and search(view[start:start + length])}
+        command_hits = {number for number, command in enumerate(commands) if regex.search(command.text.encode())}
+        if command_hits:
+            rows.update(row for row, command_id in enumerate(command_ids) if command_id in command_hits)
+        rows.update(row for row, extra in extras if regex.search(json.dumps(extra, default=str).encode()))
+        found = sorted(rows)
+        return found[:limit] if limit else found
+
+    def memory_bytes(self):
+        """Approximate bytes held by the columns and the arena (the interned tables are not counted)."""
+        columns = (self.times, self.kinds, self.flags, self.command_ids, self.port_ids, self.offsets, self.lengths,
+                   self.total_ns, self.write_ns, self.first_byte_ns)
+        return sum(column.itemsize * len(column) for column in columns) + len(self.arena)
+
+    def clear(self):
+        with self.lock:
+            for column in (self.times, self.kinds, self.flags, self.command_ids, self.port_ids, self.offsets,
+                           self.lengths, self.total_ns, self.write_ns, self.first_byte_ns):
+                del column[:]
+            self.arena = bytearray()
+            self.extras.clear()
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import atexit
+import datetime
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class JsonlLogSink:
+    """Streams log entries to disk as compact JSON lines from a background thread.
+
+    write() only queues the entry, so callers never wait on the disk. The writer flushes
+    every flush_interval seconds and starts a new segment when the current one reaches
+    max_bytes or is older than max_age seconds; finished segments can be gzipped.
+    """
+
+    def __init__(self, directory="logs", prefix="session", flush_interval=1.0, max_bytes=64 * 1024 * 1024,
+                 max_age=None, compress=False, buffer_size=64 * 1024):
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.session = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.segments = []  # Paths in write order; the last one is being written
+        self.pending_compression = []
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.segment_bytes = 0
+        self.segment_opened = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.write_loop, name=f"log-sink-{prefix}", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, entry):
+        self.queue.put(entry)
+
+    def flush(self):
+        """Block until every entry written so far is on disk."""
+        if not self.thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put((_FLUSH, done))
+        done.wait()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(_CLOSE)
+            self.thread.join()
+        for worker in self.pending_compression:
+            worker.join()
+
+    def write_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                break
+            if isinstance(item, tuple) and item and item[0] is _FLUSH:
+                if self.file:
+                    self.file.flush()
+                item[1].set()
+                continue
+            if item is not None:
+                self.write_entry(item)
+            now = time.monotonic()
+            if self.file and now - last_flush >= self.flush_interval:
+                self.file.flush()
+                last_flush = now
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def write_entry(self, entry):
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        if self.file is None or self.segment_due():
+            self.rotate()
+        self.file.write(line)
+        self.segment_bytes += len(line)
+
+    def segment_due(self):
+        if self.max_bytes and self.segment_bytes >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.monotonic() - self.segment_opened >= self.max_age
+
+    def rotate(self):
+        if self.file:
+            self.file.close()
+            if self.compress:
+                # Compress off the writer thread so logging never waits on gzip
+                index = len(self.segments) - 1
+                worker = threading.Thread(target=self.compress_segment, args=(index,), daemon=True)
+                worker.start()
+                self.pending_compression.append(worker)
+        path = os.path.join(self.directory, f"{self.prefix}_{self.session}_{len(self.segments):03d}.jsonl")
+        self.file = open(path, "a", encoding="utf-8", buffering=self.buffer_size)
+        self.segments.append(path)
+        self.segment_bytes = 0
+        self.segment_opened = time.monotonic()
+
+    def compress_segment(self, index):
+        path = self.segments[index]
+        with open(path, "rb") as source, gzip.open(path + ".gz", "wb") as target:
+            shutil.copyfileobj(source, target)
+        self.segments[index] = path + ".gz"
+        os.remove(path)
+
+    def iter_lines(self):
+        self.flush()
+        for worker in list(self.pending_compression):
+            worker.join()
+        for path in list(self.segments):
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as file:
+                yield from file
+
+    def export(self, file_path):
+        """Copy the session so far to file_path: JSON lines for .jsonl, otherwise a JSON array."""
+        if file_path.endswith(".jsonl"):
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.writelines(self.iter_lines())
+            return
+        # Same layout as the pretty-printed array the tools used to save, but streamed entry by entry
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write("[")
+            separator = "\n"
+            for line in self.iter_lines():
+                entry = json.dumps(json.loads(line), indent=4)
+                file.write(separator + "    " + entry.replace("\n", "\n    "))
+                separator = ",\n"
+            file.write("\n]" if separator != "\n" else "]")
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""Query large session logs through a sidecar index instead of loading them whole.
+
+    python sercom.py logs 20250221_log.json --command AT+VERSION --since 02:00 --until 03:00
+    python sercom.py logs logs/soak.jsonl --stats
+    python sercom.py logs logs/soak.jsonl --errors --limit 20
+
+Works on the JSON arrays the frontends save and on the JSON lines the log sinks write. The log
+is memory-mapped; the first query scans it once and writes <log>.idx next to it with each
+entry's offset, time, kind, command, port, error flag and latencies, plus per-command, error
+and event posting lists. Later queries read only the index and the entries they print, and the
+index is rebuilt automatically when the log changes. Gzipped segments must be unpacked first.
+"""
+import bisect
+import datetime
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+
+from serial_stats import percentile
+
+INDEX_MAGIC = b"SLIX"
+INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct("<4sI")
+
+KIND_OTHER = 0
+KIND_REPLY = 1
+KIND_EVENT = 2
+
+FLAG_ERROR = 1  # Response matched ERROR, or the entry is marked failed
+FLAG_TIMEOUT = 2
+
+# Everything up to the next brace outside a JSON string, capturing the brace
+_NEXT_BRACE = re.compile(rb'(?:[^{}"]|"(?:[^"\\]|\\.)*")*([{}])')
+_TIME_OF_DAY = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+_ERROR = re.compile(r"ERROR")
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# (name, typecode) of the per-entry columns, in file order
+_COLUMNS = (("offsets", "Q"), ("lengths", "I"), ("times", "d"), ("kinds", "B"), ("flags", "B"),
+            ("command_ids", "i"), ("port_ids", "i"), ("latencies", "d"), ("write_times", "d"),
+            ("first_byte_times", "d"))
+
+
+def parse_timestamp(text):
+    """Seconds since 1970 for a log timestamp, taken as naive local time; None if unparseable."""
+    try:
+        return (datetime.datetime.fromisoformat(text) - _EPOCH).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def _intern(table, lookup, value):
+    if value is None:
+        return -1
+    index = lookup.get(value)
+    if index is None:
+        index = lookup[value] = len(table)
+        table.append(value)
+    return index
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+class LogIndex:
+    """Column arrays for every entry of one log, plus the string tables and posting lists."""
+
+    def __init__(self):
+        for name, typecode in _COLUMNS:
+            setattr(self, name, array(typecode))
+        self.commands = []
+        self.ports = []
+        self.by_command = {}  # command id -> array of entry numbers, ascending
+        self.errors = array("I")
+        self.events = array("I")
+        self.time_sorted = True
+        self.source_size = 0
+        self.source_mtime_ns = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, log_path):
+        index = cls()
+        stat = os.stat(log_path)
+        index.source_size, index.source_mtime_ns = stat.st_size, stat.st_mtime_ns
+        command_lookup, port_lookup = {}, {}
+        last_timestamp, last_time, previous_time = None, math.nan, -math.inf
+        with open(log_path, "rb") as file:
+            if stat.st_size == 0:
+                return index
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for offset, end in _entry_spans(view, log_path):
+                    try:
+                        entry = json.loads(view[offset:end])
+                    except ValueError:
+                        continue
+                    if not isinstance(entry, dict):
+                        continue
+                    timestamp = entry.get("timestamp")
+                    if timestamp != last_timestamp:  # Consecutive entries usually share a timestamp
+                        last_timestamp = timestamp
+                        parsed = parse_timestamp(timestamp)
+                        last_time = math.nan if parsed is None else parsed
+                    number = len(index.offsets)
+                    index.offsets.append(offset)
+                    index.lengths.append(end - offset)
+                    index.times.append(last_time)
+                    if last_time == last_time:  # Not NaN
+                        if last_time < previous_time:
+                            index.time_sorted = False
+                        previous_time = last_time
+                    flags = 0
+                    command = entry.get("command")
+                    if command is not None:
+                        kind = KIND_REPLY
+                        if entry.get("failed") or _ERROR.search(str(entry.get("response", ""))):
+                            flags |= FLAG_ERROR
+                        if entry.get("timed_out"):
+                            flags |= FLAG_TIMEOUT
+                    elif "event" in entry:
+                        kind = KIND_EVENT
+                        index.events.append(number)
+                    else:
+                        kind = KIND_OTHER
+                    if flags:
+                        index.errors.append(number)
+                    index.kinds.append(kind)
+                    index.flags.append(flags)
+                    command_id = _intern(index.commands, command_lookup, None if command is None else str(command))
+                    index.command_ids.append(command_id)
+                    if command_id >= 0:
+                        index.by_command.setdefault(command_id, array("I")).append(number)
+                    index.port_ids.append(_intern(index.ports, port_lookup, entry.get("port")))
+                    index.latencies.append(_number(entry.get("time")))
+                    index.write_times.append(_number(entry.get("write_time")))
+                    index.first_byte_times.append(_number(entry.get("first_byte_time")))
+        return index
+
+    def save(self, index_path):
+        postings = [(command_id, len(numbers)) for command_id, numbers in self.by_command.items()]
+        header = json.dumps({
+            "version": INDEX_VERSION,
+            "source_size": self.source_size,
+            "source_mtime_ns": self.source_mtime_ns,
+            "count": len(self),
+            "time_sorted": self.time_sorted,
+            "commands": self.commands,
+            "ports": self.ports,
+            "postings": postings,
+            "errors": len(self.errors),
+            "events": len(self.events),
+        }).encode()
+        temporary = index_path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(_INDEX_HEADER.pack(INDEX_MAGIC, len(header)) + header)
+            for name, typecode in _COLUMNS:
+                getattr(self, name).tofile(file)
+            for command_id, count in postings:
+                self.by_command[command_id].tofile(file)
+            self.errors.tofile(file)
+            self.events.tofile(file)
+        os.replace(temporary, index_path)
+
+    @classmethod
+    def load(cls, index_path, log_path):
+        """The saved index, or None when it is missing, unreadable or older than the log."""
+        try:
+            with open(index_path, "rb") as file:
+                data = file.read()
+            magic, header_length = _INDEX_HEADER.unpack_from(data)
+            if magic != INDEX_MAGIC:
+                return None
+            header = json.loads(data[_INDEX_HEADER.size:_INDEX_HEADER.size + header_length])
+            stat = os.stat(log_path)
+        except (OSError, ValueError, struct.error):
+            return None
+        if (header.get("version") != INDEX_VERSION or header["source_size"] != stat.st_size
+                or header["source_mtime_ns"] != stat.st_mtime_ns):
+            return None
+        index = cls()
+        index.source_size, index.source_mtime_ns = stat.st_size, stat.st_mtime_ns
+        index.time_sorted = header["time_sorted"]
+        index.commands = header["commands"]
+        index.ports = header["ports"]
+        view = memoryview(data)
+        position = _INDEX_HEADER.size + header_length
+
+        def take(typecode, count):
+            nonlocal position
+            column = array(typecode)
+            size = column.itemsize * count
+            column.frombytes(view[position:position + size])
+            position += size
+            return column
+        count = header["count"]
+        for name, typecode in _COLUMNS:
+            setattr(index, name, take(typecode, count))
+        for command_id, length in header["postings"]:
+            index.by_command[command_id] = take("I", length)
+        index.errors = take("I", header["errors"])
+        index.events = take("I", header["events"])
+        return index
+
+
+def _entry_spans(view, log_path):
+    """(start, end) of every entry: one per line for JSON lines, one per object for a JSON array."""
+    if log_path.lower().endswith(".jsonl"):
+        position, size = 0, len(view)
+        while position < size:
+            end = view.find(b"\n", position)
+            if end < 0:
+                end = size
+            if end > position and not view[position:end].isspace():
+                yield position, end
+            position = end + 1
+    else:
+        # Entries may hold objects of their own (an event's summary or variables), so only
+        # braces at depth 0 start and end one
+        depth = start = 0
+        for match in _NEXT_BRACE.finditer(view):
+            if match.group(1) == b"{":
+                if not depth:
+                    start = match.end() - 1
+                depth += 1
+            elif depth:
+                depth -= 1
+                if not depth:
+                    yield start, match.end()
+
+
+def open_index(log_path, rebuild=False):
+    """Load log_path's sidecar index, building and saving it first when needed."""
+    if log_path.lower().endswith(".gz"):
+        raise ValueError(f"{log_path} is compressed; unpack it (gunzip -k) and query the result")
+    index_path = log_path + ".idx"
+    index = None if rebuild else LogIndex.load(index_path, log_path)
+    if index is None:
+        index = LogIndex.build(log_path)
+        try:
+            index.save(index_path)
+        except OSError:
+            pass  # A read-only location still gets answers, just without the sidecar
+    return index
+
+
+def parse_bound(text):
+    """("time_of_day", seconds) for HH:MM[:SS], otherwise ("absolute", seconds since 1970)."""
+    match = _TIME_OF_DAY.match(text)
+    if match:
+        hours, minutes, seconds = (int(group or 0) for group in match.groups())
+        return "time_of_day", hours * 3600 + minutes * 60 + seconds
+    value = parse_timestamp(text)
+    if value is None:
+        raise ValueError(f"cannot read time {text!r}; use HH:MM[:SS] or YYYY-MM-DD HH:MM[:SS]")
+    return "absolute", value
+
+
+class LogQuery:
+    """Filters over one log's index. matches() yields entry numbers; entries() parses just those."""
+
+    def __init__(self, log_path, rebuild=False):
+        self.log_path = log_path
+        self.index = open_index(log_path, rebuild)
+
+    def matches(self, commands=None, command_regex=None, port=None, since=None, until=None,
+                errors=False, events=False):
+        index = self.index
+        lists = []
+        if commands:
+            lookup = {command: number for number, command in enumerate(index.commands)}
+            ids = {lookup[command] for command in commands if command in lookup}
+            if not ids:
+                return
+            lists.append(sorted(number for command_id in ids for number in index.by_command[command_id]))
+        if errors:
+            lists.append(index.errors)
+        if events:
+            lists.append(index.events)
+        # Start from the shortest posting list; the rest are checked per entry
+        candidates = min(lists, key=len) if lists else range(len(index))
+        others = [set(numbers) for numbers in lists if numbers is not candidates]
+
+        since = parse_bound(since) if since else None
+        until = parse_bound(until) if until else None
+        if index.time_sorted:
+            # Absolute bounds on a time-ordered log become a slice of entry numbers
+            low, high = 0, len(index)
+            if since and since[0] == "absolute":
+                low = bisect.bisect_left(index.times, since[1])
+            if until and until[0] == "absolute":
+                high = bisect.bisect_right(index.times, until[1])
+            if (low, high) != (0, len(index)):
+                if isinstance(candidates, range):
+                    candidates = range(low, high)
+                else:
+                    candidates = candidates[bisect.bisect_left(candidates, low):bisect.bisect_left(candidates, high)]
+
+        command_ids = None
+        if command_regex:
+            pattern = re.compile(command_regex)
+            command_ids = {number for number, command in enumerate(index.commands) if pattern.search(command)}
+        port_id = index.ports.index(port) if port in index.ports else -2 if port else None
+
+        # A time-of-day range such as 23:00-01:00 wraps past midnight
+        wraps = bool(since and until and since[0] == until[0] == "time_of_day" and since[1] > until[1])
+
+        def within(time):
+            if time != time:  # No usable timestamp
+                return False
+            results = []
+            for bound, after in ((since, True), (until, False)):
+                if bound is not None:
+                    kind, value = bound
+                    moment = time % 86400 if kind == "time_of_day" else time
+                    results.append(moment >= value if after else moment <= value)
+            return any(results) if wraps else all(results)
+        needs_time_check = bool(since or until) and not (
+            index.time_sorted and all(bound is None or bound[0] == "absolute" for bound in (since, until)))
+        for number in candidates:
+            if others and not all(number in numbers for numbers in others):
+                continue
+            if command_ids is not None and index.command_ids[number] not in command_ids:
+                continue
+            if port_id is not None and index.port_ids[number] != port_id:
+                continue
+            if needs_time_check and not within(index.times[number]):
+                continue
+            yield number
+
+    def entries(self, numbers):
+        """Parsed log entries for entry numbers, read straight from the memory-mapped log."""
+        index = self.index
+        with open(self.log_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for number in numbers:
+                offset = index.offsets[number]
+                yield json.loads(view[offset:offset + index.lengths[number]])
+
+    def latency_rows(self, numbers=None):
+        """LatencyStats.rows()-style percentiles per command, exact and computed from the index alone.
+
+        numbers=None covers the whole log and goes straight to the per-command posting lists.
+        """
+        index = self.index
+        groups = {}  # (port id, command id) -> entry numbers
+        show_port = len(index.ports) > 1
+        command_ids, port_ids = index.command_ids, index.port_ids
+        if numbers is None and not show_port:
+            groups = {(-1, command_id): members for command_id, members in index.by_command.items()}
+        for number in (range(len(index)) if numbers is None and show_port else numbers or ()):
+            command_id = command_ids[number]
+            if command_id >= 0:
+                groups.setdefault((port_ids[number] if show_port else -1, command_id), []).append(number)
+        rows = []
+        for (port_id, command_id), members in groups.items():
+            timed_out = [number for number in members if index.flags[number] & FLAG_TIMEOUT]
+            answered = members
+            if timed_out:
+                excluded = set(timed_out)
+                answered = [number for number in members if number not in excluded]
+
+            def column(values):
+                # map/filterfalse keep the per-entry work in C; a log can hold millions of replies
+                return sorted(itertools.filterfalse(math.isnan, map(values.__getitem__, answered)))
+            total = column(index.latencies)
+            rows.append({
+                "port": index.ports[port_id] if port_id >= 0 else None,
+                "command": index.commands[command_id],
+                "count": len(total),
+                "timeouts": len(timed_out),
+                "write_p50": percentile(column(index.write_times), 0.50) * 1000,
+                "first_byte_p50": percentile(column(index.first_byte_times), 0.50) * 1000,
+                "p50": percentile(total, 0.50) * 1000,
+                "p90": percentile(total, 0.90) * 1000,
+                "p99": percentile(total, 0.99) * 1000,
+                "max": total[-1] * 1000 if total else 0.0,
+            })
+        return rows
+
+
+def format_entry(entry):
+    """One line per entry: time, command and reply (or the event) and the latency in ms."""
+    timestamp = entry.get("timestamp", "")
+    if "command" in entry:
+        port = f"{entry['port']} " if entry.get("port") else ""
+        response = str(entry.get("response", "")).replace("\r", "\\r").replace("\n", "\\n")
+        latency = f" ({entry['time'] * 1000:.3f} ms)" if isinstance(entry.get("time"), (int, float)) else ""
+        status = " TIMEOUT" if entry.get("timed_out") else ""
+        return f"{timestamp} {port}{entry['command']} -> {response}{latency}{status}"
+    if "event" in entry:
+        return f"{timestamp} [{entry['event']}]"
+    return f"{timestamp} {json.dumps(entry)}"
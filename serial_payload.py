@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import re
+
+# \0x84 is the PowerShell tools' byte syntax; \x84, \r, \n, \t, \0, \\ and \" are the usual C escapes
+_ESCAPE = re.compile(r'\\(0x[0-9a-fA-F]{2}|x[0-9a-fA-F]{2}|[rnt0\\"])')
+_SIMPLE_ESCAPES = {"r": b"\r", "n": b"\n", "t": b"\t", "0": b"\x00", "\\": b"\\", '"': b'"'}
+_ECHO = re.compile(r'^echo\s+-en?\s+"(.*)"$')
+_HEX_BYTES = re.compile(r'^\\?0x[0-9a-fA-F]{2}(?:[\s,\\]*0x[0-9a-fA-F]{2})*$')
+
+
+def parse_payload(text):
+    """Turn one command line into the bytes to send.
+
+    Supported forms:
+      hex: 00 84 0A         bytes given as hex digits (spaces optional)
+      0x00\\0x84\\0x00      the PowerShell tools' byte list
+      echo -en "..."        the same echo lines send_hex_serial_commands.ps1 reads
+      AT+NAME?\\r\\n          plain text, with C-style escapes such as \\r, \\n and \\xNN
+    """
+    stripped = text.strip()
+    if stripped.lower().startswith("hex:"):
+        return bytes.fromhex(stripped[4:])
+    match = _ECHO.match(stripped)
+    if match:
+        text = stripped = match.group(1)
+    if _HEX_BYTES.match(stripped):
+        return bytes(int(value, 16) for value in re.findall(r"0x([0-9a-fA-F]{2})", stripped))
+    if "\\" not in text:
+        return text.encode()
+    parts = []
+    position = 0
+    for escape in _ESCAPE.finditer(text):
+        parts.append(text[position:escape.start()].encode())
+        code = escape.group(1)
+        parts.append(_SIMPLE_ESCAPES[code] if len(code) == 1 else bytes([int(code[-2:], 16)]))
+        position = escape.end()
+    parts.append(text[position:].encode())
+    return b"".join(parts)
+
+
+class Command:
+    """A loaded command: the text shown to the user and the bytes sent, parsed once at load time."""
+    __slots__ = ("text", "payload")
+
+    def __init__(self, text):
+        self.text = text
+        self.payload = parse_payload(text)
+
+    @classmethod
+    def from_payload(cls, text, payload):
+        """A Command whose bytes were already built, e.g. from a script template."""
+        command = cls.__new__(cls)
+        command.text = text
+        command.payload = payload
+        return command
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"Command({self.text!r})"
+
+
+def parse_commands(lines):
+    """Parse every command up front so a bad hex line fails the load instead of the send."""
+    commands = []
+    for number, line in enumerate(lines, 1):
+        try:
+            commands.append(Command(line))
+        except ValueError as e:
+            raise ValueError(f"command {number} ({line!r}): {e}") from None
+    return commands
+
+
+def is_text(data):
+    """True when data is UTF-8 without control characters other than CR, LF and tab."""
+    try:
+        text = data.decode()
+    except UnicodeDecodeError:
+        return False
+    return all(ch >= " " or ch in "\r\n\t" for ch in text)
+
+
+def to_hex(data):
+    return data.hex(" ").upper()
+
+
+def format_bytes(data, hex_view=False):
+    """Render received bytes for display without altering them; control bytes are shown escaped."""
+    if hex_view:
+        return to_hex(data)
+    text = data.decode(errors="backslashreplace")
+    if not is_text(data):
+        text = "".join(ch if ch >= " " or ch in "\r\n\t" else f"\\x{ord(ch):02x}" for ch in text)
+    return text.rstrip("\r\n")
+
+
+def log_fields(data, prefix="response"):
+    """Log entry fields for raw bytes: the text, plus a hex copy when the bytes are not plain text."""
+    fields = {prefix: data.decode(errors="backslashreplace")}
+    if not is_text(data):
+        fields[f"{prefix}_hex"] = to_hex(data)
+    return fields
+
+
+def reply_log_entry(timestamp, command, reply, port=None):
+    """The log entry every frontend writes for one command and its Reply."""
+    entry = {"timestamp": timestamp}
+    if port:
+        entry["port"] = port
+    entry["command"] = command.text
+    if not is_text(command.payload):
+        entry["command_hex"] = to_hex(command.payload)
+    entry.update(log_fields(reply.data))
+    entry["time"] = reply.elapsed
+    entry["write_time"] = reply.write_ns / 1e9
+    if reply.first_byte_ns is not None:
+        entry["first_byte_time"] = reply.first_byte_ns / 1e9
+    if reply.timed_out:
+        entry["timed_out"] = True
+    if reply.cached:
+        entry["cached"] = True
+    return entry
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+import glob
+import sys
+import threading
+
+import serial.tools.list_ports
+
+try:
+    import pyudev  # Optional: hotplug notifications instead of polling on Linux
+except ImportError:
+    pyudev = None
+
+# The device node patterns pyserial's Linux enumeration looks at
+_LINUX_PATTERNS = ("/dev/ttyS*", "/dev/ttyUSB*", "/dev/ttyXRUSB*", "/dev/ttyACM*", "/dev/ttyAMA*", "/dev/rfcomm*", "/dev/ttyAP*")
+
+
+class PortInfo:
+    """A serial port with the USB metadata pyserial reports for it (None where unknown)."""
+    __slots__ = ("device", "description", "hwid", "vid", "pid", "serial_number", "manufacturer", "product", "location")
+
+    def __init__(self, info):
+        self.device = info.device
+        self.description = info.description
+        self.hwid = info.hwid
+        self.vid = info.vid
+        self.pid = info.pid
+        self.serial_number = info.serial_number
+        self.manufacturer = info.manufacturer
+        self.product = info.product
+        self.location = info.location
+
+    def usb_id(self):
+        return f"{self.vid:04X}:{self.pid:04X}" if self.vid is not None and self.pid is not None else None
+
+    def __str__(self):
+        details = [self.description] if self.description and self.description != "n/a" else []
+        if self.usb_id():
+            details.append(self.usb_id())
+        if self.serial_number:
+            details.append(f"SN {self.serial_number}")
+        return f"{self.device} - {', '.join(details)}" if details else self.device
+
+
+class PortRegistry:
+    """Cached list of serial ports, kept current in the background.
+
+    ports() never enumerates: it returns the list from the last scan. On Linux the watcher only
+    globs /dev for new or vanished nodes and reads sysfs for the ones that changed, woken by udev
+    when pyudev is installed and otherwise every poll_interval seconds. Elsewhere the full
+    pyserial enumeration runs every rescan_interval seconds off the caller's thread.
+    Subscribers are called as callback(event, PortInfo) with event "added" or "removed", from
+    the watcher thread for every port that appears or disappears after the first scan.
+    """
+
+    def __init__(self, poll_interval=1.0, rescan_interval=5.0):
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.known = {}  # device -> PortInfo
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.scanned = threading.Event()
+        self.nodes = None  # Device nodes seen by the last Linux scan, present or not
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return self
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.watch, name="port-registry", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def subscribe(self, callback):
+        """Register callback(event, port_info); returns a function that unsubscribes it."""
+        with self.lock:
+            self.subscribers.append(callback)
+
+        def unsubscribe():
+            with self.lock:
+                if callback in self.subscribers:
+                    self.subscribers.remove(callback)
+        return unsubscribe
+
+    def ports(self, wait=True):
+        """The cached ports sorted by device name; waits for the first scan unless wait is False."""
+        if wait and not self.scanned.is_set():
+            if self.thread is None:
+                self.refresh()
+            else:
+                self.scanned.wait()
+        with self.lock:
+            return [self.known[device] for device in sorted(self.known)]
+
+    def find(self, device=None, serial_number=None):
+        """Look a port up by device name or USB serial number."""
+        for port in self.ports():
+            if (device and port.device == device) or (serial_number and port.serial_number == serial_number):
+                return port
+        return None
+
+    def refresh(self):
+        """Re-read the whole port list now and fire events for anything that changed."""
+        current = {info.device: PortInfo(info) for info in serial.tools.list_ports.comports()}
+        self.apply(current)
+
+    def apply(self, current):
+        with self.lock:
+            added = [current[device] for device in current if device not in self.known]
+            removed = [self.known[device] for device in self.known if device not in current]
+            self.known = current
+            # The first scan just fills the cache; events are for changes after it
+            subscribers = list(self.subscribers) if self.scanned.is_set() else []
+        self.scanned.set()
+        for event, changed in (("removed", removed), ("added", added)):
+            for port in changed:
+                for callback in subscribers:
+                    try:
+                        callback(event, port)
+                    except Exception:
+                        pass  # A broken subscriber must not stop the watcher
+
+    def watch(self):
+        if not sys.platform.startswith("linux"):
+            while not self.stop_event.is_set():
+                self.refresh()
+                self.stop_event.wait(self.rescan_interval)
+            return
+        self.rescan_linux()
+        monitor = None
+        if pyudev is not None:
+            try:
+                monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+                monitor.filter_by("tty")
+                monitor.start()
+            except Exception:
+                monitor = None  # No netlink access (containers, sandboxes): poll instead
+        while not self.stop_event.is_set():
+            if monitor is not None:
+                if monitor.poll(timeout=self.poll_interval) is None:
+                    continue
+                # Drain the rest of a burst so one adapter with several ports triggers one scan
+                while monitor.poll(timeout=0) is not None:
+                    pass
+            else:
+                self.stop_event.wait(self.poll_interval)
+            self.rescan_linux()
+
+    def rescan_linux(self):
+        """Incremental scan: only device nodes that appeared since the last scan are looked up in sysfs."""
+        from serial.tools.list_ports_linux import SysFS
+        devices = set()
+        for pattern in _LINUX_PATTERNS:
+            devices.update(glob.glob(pattern))
+        if devices == self.nodes:
+            return
+        self.nodes = devices
+        with self.lock:
+            known = dict(self.known)
+        current = {}
+        for device in devices:
+            if device in known:
+                current[device] = known[device]
+                continue
+            try:
+                info = SysFS(device)
+            except (OSError, ValueError):
+                continue
+            if info.subsystem == "platform":
+                continue  # Built-in ports that are not actually present, as pyserial hides them
+            current[device] = PortInfo(info)
+        self.apply(current)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_registry():
+    """The process-wide registry, started on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PortRegistry().start()
+        return _shared
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Priority lanes, pacing and queue metrics in front of one SerialEngine.
+
+A Pacer holds a device to its real limits: a token bucket allows rate commands per second in
+bursts of up to burst, and min_gap keeps a quiet time between the starts of two writes. The
+engine asks it before every command it writes, so transact(), transact_many() and scripts are
+all paced, and the reply timings leave the pacing delay out.
+
+A CommandScheduler owns a dispatcher thread that sends jobs from three lanes, interactive above
+batch above background polling. A job that arrives in a higher lane than the one being sent
+stops it after the command being written; replies already awaited are collected, the new job
+runs, and the interrupted one resumes where it stopped, so a single command typed during a
+long pipelined batch goes out within one reply instead of after the whole batch.
+"""
+import threading
+import time
+from collections import deque
+
+from serial_stats import LatencyHistogram
+
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+LANES = ("interactive", "batch", "background")
+
+
+class Pacer:
+    """Token bucket plus a minimum gap between writes, for one device; thread-safe.
+
+    rate is commands per second (None for no limit); min_gap is in seconds.
+    """
+
+    def __init__(self, rate=None, burst=1, min_gap=0.0, clock=time.monotonic):
+        self.rate = float(rate) if rate else None
+        self.burst = max(1, int(burst))
+        self.min_gap = float(min_gap or 0)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self.last_write = None
+        self.blocked_since = None  # When the command now waiting was first held back
+        self.commands = 0
+        self.delayed = 0  # Commands that had to wait
+        self.delay = 0.0  # Seconds they waited in total
+
+    @classmethod
+    def from_dict(cls, data):
+        """The pacer a command file's "pacing" value asks for: {"rate": 50, "burst": 4, "min_gap_ms": 5}."""
+        if not data:
+            return None
+        return cls(data.get("rate"), data.get("burst", 1), data.get("min_gap_ms", 0) / 1000)
+
+    def reserve(self):
+        """0 if a command may be written now (and count it as written), otherwise seconds to wait."""
+        with self.lock:
+            now = self.clock()
+            wait = 0.0
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                if self.tokens < 1:
+                    wait = (1 - self.tokens) / self.rate
+            self.updated = now
+            if self.min_gap and self.last_write is not None:
+                wait = max(wait, self.last_write + self.min_gap - now)
+            if wait > 0:
+                if self.blocked_since is None:
+                    self.blocked_since = now
+                return wait
+            if self.rate:
+                self.tokens -= 1
+            self.last_write = now
+            self.commands += 1
+            if self.blocked_since is not None:
+                self.delayed += 1
+                self.delay += now - self.blocked_since
+                self.blocked_since = None
+            return 0.0
+
+    def wait(self):
+        """Block until a command may be written."""
+        while True:
+            delay = self.reserve()
+            if not delay:
+                return
+            time.sleep(delay)
+
+    def __str__(self):
+        limits = []
+        if self.rate:
+            limits.append(f"{self.rate:g}/s burst {self.burst}")
+        if self.min_gap:
+            limits.append(f"gap {self.min_gap * 1000:g} ms")
+        return ", ".join(limits) or "no limit"
+
+    def describe(self):
+        with self.lock:
+            return (f"Pacing ({self}): {self.delayed} of {self.commands} commands held back, "
+                    f"{self.delay:.3f} s in total")
+
+
+class Job:
+    """Commands submitted to a CommandScheduler; wait() returns their Replies in order."""
+
+    def __init__(self, requests, lane, window, tag_pattern, on_reply, cancel_event):
+        self.requests = requests
+        self.lane = lane
+        self.window = window
+        self.tag_pattern = tag_pattern
+        self.on_reply = on_reply
+        self.cancel_event = cancel_event
+        self.results = [None] * len(requests)
+        self.next = 0  # First request not yet sent
+        self.error = None
+        self.submitted = time.perf_counter_ns()
+        self.started = None
+        self.done = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def wait(self, timeout=None):
+        """The Replies, None for commands never sent; re-raises what the engine raised."""
+        if not self.done.wait(timeout):
+            raise TimeoutError("scheduled commands still running")
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+class _Stop:
+    """Looks like the threading.Event transact_many() takes: set once the job is cancelled or preempted."""
+
+    def __init__(self, scheduler, job):
+        self.scheduler = scheduler
+        self.job = job
+
+    def is_set(self):
+        return self.job.cancelled or self.scheduler.preempted(self.job.lane)
+
+
+class CommandScheduler:
+    """Sends jobs for one SerialEngine from priority lanes on a dispatcher thread, with optional pacing."""
+
+    def __init__(self, engine, pacer=None, on_job_done=None):
+        self.engine = engine
+        engine.pacer = pacer
+        self.on_job_done = on_job_done  # Called with each finished Job, on the dispatcher thread
+        self.condition = threading.Condition()
+        self.lanes = [deque() for _ in LANES]
+        self.depths = [0] * len(LANES)  # Commands queued per lane, not yet sent
+        self.peaks = [0] * len(LANES)
+        self.sent = [0] * len(LANES)
+        self.waits = [LatencyHistogram() for _ in LANES]  # Submit to start of sending, per job
+        self.preemptions = 0
+        self.running = None
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name=f"serial-scheduler-{engine.port}", daemon=True)
+        self.thread.start()
+
+    @property
+    def pacer(self):
+        return self.engine.pacer
+
+    @pacer.setter
+    def pacer(self, pacer):
+        self.engine.pacer = pacer
+
+    def submit(self, requests, lane=BATCH, window=1, tag_pattern=None, on_reply=None, cancel_event=None):
+        """Queue (payload, framing) requests in a lane; returns the Job at once.
+
+        on_reply(index, reply) is called on the dispatcher thread, as in transact_many().
+        """
+        job = Job(list(requests), lane, window, tag_pattern, on_reply, cancel_event)
+        with self.condition:
+            if self.stopped:
+                raise RuntimeError("scheduler is stopped")
+            self.lanes[lane].append(job)
+            self.depths[lane] += len(job.requests)
+            self.peaks[lane] = max(self.peaks[lane], self.depths[lane])
+            self.condition.notify_all()
+        return job
+
+    def transact(self, payload, framing=None, lane=INTERACTIVE):
+        return self.submit([(payload, framing)], lane).wait()[0]
+
+    def transact_many(self, requests, window=1, tag_pattern=None, on_reply=None, cancel_event=None, lane=BATCH):
+        return self.submit(requests, lane, window, tag_pattern, on_reply, cancel_event).wait()
+
+    def preempted(self, lane):
+        """Whether a job is waiting in a lane above lane."""
+        return any(self.lanes[higher] for higher in range(lane))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and not any(self.lanes):
+                    self.condition.wait()
+                if self.stopped:
+                    break
+                job = next(lane.popleft() for lane in self.lanes if lane)
+                self.running = job
+            self.run_slice(job)
+            with self.condition:
+                self.running = None
+                finished = job.done.is_set()
+                if not finished:
+                    self.preemptions += 1
+                    self.lanes[job.lane].appendleft(job)  # Resumes before anything queued after it
+        self.drain()
+
+    def run_slice(self, job):
+        """Send job until it finishes, fails, is cancelled or a higher lane needs the port."""
+        start = job.next
+        remaining = len(job.requests) - start
+        if job.started is None and not job.cancelled:
+            job.started = time.perf_counter_ns()
+            with self.condition:
+                self.waits[job.lane].record(job.started - job.submitted)
+
+        def on_reply(index, reply):
+            job.results[start + index] = reply
+            if job.on_reply:
+                job.on_reply(start + index, reply)
+        try:
+            if job.cancelled:
+                results = []
+            else:
+                results = self.engine.transact_many(job.requests[start:], job.window, job.tag_pattern,
+                                                    on_reply=on_reply, cancel_event=_Stop(self, job))
+            sent = next((index for index, reply in enumerate(results) if reply is None), len(results))
+        except Exception as e:
+            job.error = e
+            sent = remaining
+        job.next = start + sent
+        with self.condition:
+            self.depths[job.lane] -= sent
+            self.sent[job.lane] += sent
+            if job.next < len(job.requests) and not job.cancelled and job.error is None:
+                return
+            self.depths[job.lane] -= len(job.requests) - job.next
+        self.finish(job)
+
+    def finish(self, job):
+        job.done.set()
+        if self.on_job_done:
+            try:
+                self.on_job_done(job)
+            except Exception:
+                pass
+
+    def drain(self):
+        """Finish every queued job unsent once the scheduler stops."""
+        with self.condition:
+            jobs = [job for lane in self.lanes for job in lane]
+            for lane in self.lanes:
+                lane.clear()
+            self.depths = [0] * len(LANES)
+        for job in jobs:
+            self.finish(job)
+
+    def stop(self):
+        """Stop after the job being sent; queued jobs finish with no replies."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+
+    def queue_depths(self):
+        """{lane name: commands waiting}."""
+        with self.condition:
+            return dict(zip(LANES, self.depths))
+
+    def describe(self):
+        with self.condition:
+            lanes = [f"{name} {depth} queued (peak {peak}, {sent} sent, wait p50 {waits.percentile(0.5) / 1e6:.1f} "
+                     f"/ max {waits.max / 1e6:.1f} ms)"
+                     for name, depth, peak, sent, waits in zip(LANES, self.depths, self.peaks, self.sent, self.waits)
+                     if peak or sent]
+            text = f"Queues: {'; '.join(lanes) or 'idle'}; {self.preemptions} preemptions"
+        pacer = self.pacer
+        return text + (f"\n{pacer.describe()}" if pacer else "")
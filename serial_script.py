@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Command scripts: send/expect/wait/loop/retry/set compiled once into a plan of ready-to-send steps.
+
+    # Lines that are not a keyword are sent as they are, so existing text command files still work
+    AT\\r\\n
+    set id = 7
+    retry 3
+        send AT+NAME?\\r\\n
+        expect \\+NAME:(?P<name>\\w+)
+    end
+    loop 100
+        send AT+READ=${id}\\r\\n
+        expect ^OK
+        wait 50
+    end
+
+Keywords: send <command>, expect <regex> (checked against the previous reply; named groups
+become variables), wait <ms>, set <name> = <value>, loop <n> ... end, retry <n> ... end (runs
+the block again while an expect inside it fails). ${name} is replaced in sends and sets.
+"""
+import json
+import re
+import time
+
+from serial_cache import ResponseCache
+from serial_framing import FramingRules
+from serial_payload import Command, parse_commands, parse_payload
+from serial_scheduler import Pacer
+
+_VARIABLE = re.compile(r"\$\{([A-Za-z_]\w*)\}")
+_SET = re.compile(r"^([A-Za-z_]\w*)\s*=\s*(.*)$")
+KEYWORDS = ("send", "expect", "wait", "set", "loop", "retry", "end")
+
+
+class ScriptError(ValueError):
+    """A script that cannot be compiled; the message names the line."""
+
+
+class ExpectFailed(Exception):
+    def __init__(self, step, reply):
+        super().__init__(f"line {step.line}: expected /{step.pattern.pattern.decode(errors='replace')}/, "
+                         f"got {reply.data[:80]!r}{' (timed out)' if reply.timed_out else ''}")
+        self.step = step
+        self.reply = reply
+
+
+class Template:
+    """Text with ${name} references, split once into literal bytes and variable names."""
+    __slots__ = ("text", "parts")
+
+    def __init__(self, text, literal):
+        self.text = text
+        self.parts = []
+        position = 0
+        for match in _VARIABLE.finditer(text):
+            self.parts.append(literal(text[position:match.start()]))
+            self.parts.append(match.group(1))  # str marks a variable, bytes a literal
+            position = match.end()
+        self.parts.append(literal(text[position:]))
+
+    def render(self, variables):
+        try:
+            return b"".join(part if isinstance(part, bytes) else variables[part].encode() for part in self.parts)
+        except KeyError as e:
+            raise ScriptError(f"variable {e.args[0]!r} is not set") from None
+
+    def render_text(self, variables):
+        return _VARIABLE.sub(lambda match: variables.get(match.group(1), match.group(0)), self.text)
+
+
+class Send:
+    __slots__ = ("line", "command", "template", "framing")
+
+    def __init__(self, line, text, framing, command=None):
+        self.line = line
+        self.framing = framing
+        if command is not None:
+            self.command = command
+            self.template = None
+        elif _VARIABLE.search(text):
+            if text.strip().lower().startswith(("hex:", "echo ", "0x", "\\0x")):
+                raise ScriptError(f"line {line}: ${{...}} variables only work in text commands")
+            self.template = Template(text, parse_payload)
+            self.command = None
+        else:
+            self.command = Command(text)
+            self.template = None
+
+    def resolve(self, variables):
+        if self.command is not None:
+            return self.command
+        return Command.from_payload(self.template.render_text(variables), self.template.render(variables))
+
+
+class Expect:
+    __slots__ = ("line", "pattern")
+
+    def __init__(self, line, pattern):
+        self.line = line
+        self.pattern = pattern
+
+
+class Wait:
+    __slots__ = ("line", "seconds")
+
+    def __init__(self, line, seconds):
+        self.line = line
+        self.seconds = seconds
+
+
+class Set:
+    __slots__ = ("line", "name", "template")
+
+    def __init__(self, line, name, template):
+        self.line = line
+        self.name = name
+        self.template = template
+
+
+class Block:
+    """loop (retry=False) or retry (retry=True) around a list of steps."""
+    __slots__ = ("line", "count", "retry", "steps")
+
+    def __init__(self, line, count, retry):
+        self.line = line
+        self.count = count
+        self.retry = retry
+        self.steps = []
+
+
+class Script:
+    """A compiled plan plus the framing rules it was loaded with, and the file's response cache and pacing if it asks for them."""
+
+    def __init__(self, steps, framing_rules=None, response_cache=None, pacer=None):
+        self.steps = steps
+        self.framing_rules = framing_rules or FramingRules()
+        self.response_cache = response_cache
+        self.pacer = pacer
+
+    @property
+    def flat(self):
+        """True when the script only sends constant commands, so it can be pipelined like a plain list."""
+        return all(isinstance(step, Send) and step.command is not None for step in self.steps)
+
+    @property
+    def commands(self):
+        """The top-level commands in order, for listing and for flat scripts.
+
+        A command with ${...} variables has no bytes until the script runs, so its payload is None.
+        """
+        return [step.command if step.command is not None else Command.from_payload(step.template.text, None)
+                for step in self.steps if isinstance(step, Send)]
+
+
+def compile_script(lines, framing_rules=None):
+    """Parse and validate script lines into a Script; raises ScriptError with the offending line."""
+    framing_rules = framing_rules or FramingRules()
+    root = Block(0, 1, False)
+    stack = [root]
+    for number, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line or line.startswith(("#", "//")):
+            continue
+        keyword, _, rest = line.partition(" ")
+        keyword = keyword.lower()
+        rest = rest.strip()
+        block = stack[-1]
+        try:
+            if keyword not in KEYWORDS:
+                block.steps.append(Send(number, line, framing_rules.get(line)))
+            elif keyword == "send":
+                if not rest:
+                    raise ScriptError("send needs a command")
+                block.steps.append(Send(number, rest, framing_rules.get(rest)))
+            elif keyword == "expect":
+                block.steps.append(Expect(number, re.compile(rest.encode())))
+            elif keyword == "wait":
+                block.steps.append(Wait(number, float(rest) / 1000))
+            elif keyword == "set":
+                match = _SET.match(rest)
+                if not match:
+                    raise ScriptError("expected set <name> = <value>")
+                block.steps.append(Set(number, match.group(1), Template(match.group(2), lambda text: text.encode())))
+            elif keyword in ("loop", "retry"):
+                count = int(rest)
+                if count < 1:
+                    raise ScriptError(f"{keyword} count must be at least 1")
+                nested = Block(number, count, keyword == "retry")
+                block.steps.append(nested)
+                stack.append(nested)
+            else:  # end
+                if len(stack) == 1:
+                    raise ScriptError("end without loop or retry")
+                stack.pop()
+        except ScriptError as e:
+            message = str(e)
+            raise ScriptError(message if message.startswith("line ") else f"line {number}: {message}") from None
+        except (ValueError, re.error) as e:
+            raise ScriptError(f"line {number} ({line!r}): {e}") from None
+    if len(stack) > 1:
+        raise ScriptError(f"line {stack[-1].line}: {'retry' if stack[-1].retry else 'loop'} has no end")
+    return Script(root.steps, framing_rules)
+
+
+def load_script(file_path, framing=None):
+    """Load a .json file ({"commands": [...]} or {"script": [...] / "..."}, with optional "framing", "cache" and "pacing") or a text script.
+
+    framing is a framing dict (e.g. {"timeout_ms": 200}) laid over the file's default framing.
+    """
+    def rules(section):
+        section = dict(section or {})
+        if framing:
+            section["default"] = {**section.get("default", {}), **framing}
+        return FramingRules.from_dict(section)
+
+    with open(file_path, "r") as file:
+        if file_path.lower().endswith(".json"):
+            data = json.load(file)
+            framing_rules = rules(data.get("framing"))
+            if "script" in data:
+                script = data["script"]
+                script = compile_script(script.splitlines() if isinstance(script, str) else script, framing_rules)
+            else:
+                # Plain command lists are sent verbatim, even a command that looks like a keyword or has ${...}
+                commands = parse_commands(data.get("commands", []))
+                script = Script([Send(number, command.text, framing_rules.get(command.text), command)
+                                 for number, command in enumerate(commands, 1)], framing_rules)
+            script.response_cache = ResponseCache.from_dict(data.get("cache"))
+            script.pacer = Pacer.from_dict(data.get("pacing"))
+            return script
+        return compile_script(file.read().splitlines(), rules(None))
+
+
+class ScriptResult:
+    __slots__ = ("ok", "error", "variables", "sent")
+
+    def __init__(self):
+        self.ok = True
+        self.error = None
+        self.variables = {}
+        self.sent = 0
+
+
+class ScriptRunner:
+    """Executes a compiled Script on an open SerialEngine.
+
+    on_reply(command, reply) is called after every send. cancel_event stops the run between
+    steps. A failed expect ends the innermost retry attempt, or the whole run outside a retry.
+    """
+
+    def __init__(self, engine, script, on_reply=None, cancel_event=None, variables=None):
+        self.engine = engine
+        self.script = script
+        self.on_reply = on_reply
+        self.cancel_event = cancel_event
+        self.variables = dict(variables or {})
+        self.last_reply = None
+        self.sent = 0
+
+    def run(self):
+        result = ScriptResult()
+        try:
+            self.run_steps(self.script.steps)
+        except (ExpectFailed, ScriptError) as e:
+            result.ok = False
+            result.error = str(e)
+        result.variables = self.variables
+        result.sent = self.sent
+        return result
+
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def run_steps(self, steps):
+        for step in steps:
+            if self.cancelled():
+                return
+            kind = type(step)
+            if kind is Send:
+                command = step.resolve(self.variables)
+                self.last_reply = self.engine.transact(command.payload, step.framing)
+                self.sent += 1
+                if self.on_reply:
+                    self.on_reply(command, self.last_reply)
+            elif kind is Expect:
+                reply = self.last_reply
+                match = step.pattern.search(reply.data) if reply is not None else None
+                if match is None:
+                    raise ExpectFailed(step, reply or _NO_REPLY)
+                for name, value in match.groupdict().items():
+                    if value is not None:
+                        self.variables[name] = value.decode(errors="backslashreplace")
+            elif kind is Wait:
+                if self.cancel_event is not None:
+                    self.cancel_event.wait(step.seconds)
+                else:
+                    time.sleep(step.seconds)
+            elif kind is Set:
+                self.variables[step.name] = step.template.render(self.variables).decode()
+            elif step.retry:
+                for attempt in range(step.count):
+                    try:
+                        self.run_steps(step.steps)
+                        break
+                    except ExpectFailed:
+                        if attempt == step.count - 1 or self.cancelled():
+                            raise
+            else:
+                for _ in range(step.count):
+                    if self.cancelled():
+                        return
+                    self.run_steps(step.steps)
+
+
+class _NoReply:
+    data = b""
+    timed_out = False
+
+
+_NO_REPLY = _NoReply()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""Share one serial port with several TCP clients, as raw TCP and/or RFC 2217.
+
+Every byte the device sends goes to every client. Writes from clients are queued per client
+and a single writer takes one chunk from each waiting client in turn, so one client streaming
+a large file cannot starve another's short command. Clients connect with pyserial URLs:
+
+    python sercom.py serve --port /dev/ttyUSB0 --baud 115200 --raw-port 7000 --rfc2217-port 7001
+    python sercom.py run --port socket://rig-3:7000 "AT\\r\\n"
+    python sercom.py cli      (then: setport rfc2217://rig-3:7001)
+"""
+import socket
+import threading
+from collections import deque
+
+import serial
+import serial.rfc2217
+
+from serial_engine import SerialEngine
+
+WRITE_CHUNK = 1024  # Bytes a client may write before the next waiting client gets a turn
+CLIENT_BUFFER = 4 * 1024 * 1024  # Unsent device data a client may fall behind by before it is dropped
+
+
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", None)  # Not on Windows, which always uses the send thread
+_MODEM_LINES = ("cts", "dsr", "ri", "cd")
+_CONTROL_LINES = ("dtr", "rts", "break_condition")
+
+
+class ModemLineTolerantPort:
+    """The shared serial object as PortManager sees it. Ports without modem lines (ptys, some USB
+    adapters, URL handlers) report them as off and ignore DTR/RTS/break changes, so RFC 2217
+    clients still get their acknowledgements instead of timing out."""
+
+    def __init__(self, port):
+        object.__setattr__(self, "port", port)
+
+    def __getattr__(self, name):
+        try:
+            return getattr(self.port, name)
+        except (OSError, serial.SerialException):
+            if name in _MODEM_LINES:
+                return False
+            raise
+
+    def __setattr__(self, name, value):
+        try:
+            setattr(self.port, name, value)
+        except (OSError, serial.SerialException):
+            if name not in _CONTROL_LINES:
+                raise
+
+
+class ShareClient:
+    """One TCP connection. Device data goes straight out with a non-blocking send when nothing is
+    queued; whatever the socket cannot take is queued for the client's own thread, so a slow
+    client only ever delays itself."""
+
+    def __init__(self, server, connection, address, rfc2217=False):
+        self.server = server
+        self.connection = connection
+        self.address = address
+        self.name = f"{address[0]}:{address[1]}" + (" (rfc2217)" if rfc2217 else "")
+        self.outgoing = deque()
+        self.outgoing_bytes = 0
+        self.outgoing_ready = threading.Condition()
+        self.write_queue = deque()  # Chunks waiting for the serial writer
+        self.sending = False
+        self.closed = False
+        self.manager = serial.rfc2217.PortManager(ModemLineTolerantPort(server.engine.serial_connection), self) if rfc2217 else None
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def start(self):
+        threading.Thread(target=self.receive_loop, name=f"share-recv-{self.name}", daemon=True).start()
+        threading.Thread(target=self.send_loop, name=f"share-send-{self.name}", daemon=True).start()
+
+    def write(self, data):
+        """Called by PortManager for Telnet/RFC 2217 replies; they go out ahead of nothing else."""
+        self.enqueue(data)
+
+    def deliver(self, data):
+        """Device data for this client; called from the engine's reader thread."""
+        if self.manager is not None:
+            data = b"".join(self.manager.escape(data))
+        self.enqueue(data)
+
+    def enqueue(self, data):
+        overflow = False
+        with self.outgoing_ready:
+            if self.closed:
+                return
+            direct = _MSG_DONTWAIT is not None and not self.sending and not self.outgoing
+            if direct:
+                self.sending = True
+            elif self.outgoing_bytes + len(data) > CLIENT_BUFFER:
+                overflow = True
+            else:
+                self.outgoing.append(data)
+                self.outgoing_bytes += len(data)
+                self.outgoing_ready.notify()
+        if direct:
+            # Skips the hand-off to the send thread, which is most of the latency the server adds
+            try:
+                sent = self.connection.send(data, _MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self.close()
+                return
+            with self.outgoing_ready:
+                self.sending = False
+                if sent < len(data):
+                    self.outgoing.appendleft(data[sent:])  # Ahead of anything queued meanwhile
+                    self.outgoing_bytes += len(data) - sent
+                if self.outgoing:
+                    self.outgoing_ready.notify()
+        if overflow:
+            self.server.report(f"{self.name} fell {CLIENT_BUFFER} bytes behind; disconnecting it")
+            self.close()
+
+    def send_loop(self):
+        while True:
+            with self.outgoing_ready:
+                while (not self.outgoing or self.sending) and not self.closed:
+                    self.outgoing_ready.wait()
+                if self.closed:
+                    return
+                data = b"".join(self.outgoing) if len(self.outgoing) > 1 else self.outgoing[0]
+                self.outgoing.clear()
+                self.outgoing_bytes = 0
+                self.sending = True
+            try:
+                self.connection.sendall(data)
+            except OSError:
+                self.close()
+                return
+            with self.outgoing_ready:
+                self.sending = False
+
+    def receive_loop(self):
+        while not self.closed:
+            try:
+                data = self.connection.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            if self.manager is not None:
+                # Strips Telnet negotiation and applies baud rate or line changes the client asks for
+                try:
+                    data = b"".join(self.manager.filter(data))
+                except (OSError, serial.SerialException) as e:
+                    self.server.report(f"{self.name}: port setting rejected: {e}")
+                    continue
+            if data:
+                self.server.queue_write(self, data)
+        self.close()
+
+    def close(self):
+        with self.outgoing_ready:
+            if self.closed:
+                return
+            self.closed = True
+            self.outgoing_ready.notify()
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+        self.server.remove(self)
+
+
+class SerialShareServer:
+    """Owns the physical port through a SerialEngine and serves it on raw_port and/or rfc2217_port.
+
+    on_event(message) is called for connects, disconnects and errors.
+    """
+
+    def __init__(self, port, baud_rate=9600, host="127.0.0.1", raw_port=7000, rfc2217_port=None, on_event=None):
+        self.engine = SerialEngine(port, baud_rate)
+        self.host = host
+        self.raw_port = raw_port
+        self.rfc2217_port = rfc2217_port
+        self.on_event = on_event
+        self.clients = []
+        self.clients_lock = threading.Lock()
+        self.listeners = []
+        self.writes_pending = threading.Condition()
+        self.write_order = deque()  # Clients with queued writes, in turn order
+        self.writing = False
+        self.running = False
+        self.bytes_from_device = 0
+        self.bytes_to_device = 0
+
+    def start(self):
+        self.engine.subscribe(self.broadcast, self.device_error)
+        self.engine.open()
+        self.running = True
+        try:
+            for tcp_port, rfc2217 in ((self.raw_port, False), (self.rfc2217_port, True)):
+                if tcp_port is None:
+                    continue
+                listener = socket.create_server((self.host, tcp_port))
+                self.listeners.append(listener)
+                threading.Thread(target=self.accept_loop, args=(listener, rfc2217), daemon=True,
+                                 name=f"share-accept-{tcp_port}").start()
+        except Exception:
+            self.stop()
+            raise
+        threading.Thread(target=self.write_loop, name="share-writer", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        for listener in self.listeners:
+            listener.close()
+        self.listeners = []
+        with self.clients_lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+        with self.writes_pending:
+            self.writes_pending.notify_all()
+        self.engine.close()
+
+    @property
+    def addresses(self):
+        return [listener.getsockname()[:2] for listener in self.listeners]
+
+    def report(self, message):
+        if self.on_event:
+            self.on_event(message)
+
+    def accept_loop(self, listener, rfc2217):
+        while self.running:
+            try:
+                connection, address = listener.accept()
+            except OSError:
+                return  # Listener closed by stop()
+            try:
+                client = ShareClient(self, connection, address, rfc2217)
+            except Exception as e:
+                connection.close()
+                self.report(f"Rejected {address[0]}:{address[1]}: {e}")
+                continue
+            with self.clients_lock:
+                self.clients.append(client)
+                count = len(self.clients)
+            client.start()
+            self.report(f"{client.name} connected ({count} clients)")
+
+    def remove(self, client):
+        with self.clients_lock:
+            if client not in self.clients:
+                return
+            self.clients.remove(client)
+            count = len(self.clients)
+        with self.writes_pending:
+            client.write_queue.clear()
+        self.report(f"{client.name} disconnected ({count} clients)")
+
+    def broadcast(self, data):
+        self.bytes_from_device += len(data)
+        with self.clients_lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.deliver(data)
+
+    def device_error(self, error):
+        self.report(f"Serial error: {error}")
+
+    def queue_write(self, client, data):
+        """Called from a client's receive thread. When the port is idle the first chunk is written
+        right here; everything else waits for its turn in write_loop."""
+        with self.writes_pending:
+            direct = not self.writing and not self.write_order
+            if direct:
+                self.writing = True
+                first, data = data[:WRITE_CHUNK], data[WRITE_CHUNK:]
+            if data:
+                if not client.write_queue:
+                    self.write_order.append(client)
+                for start in range(0, len(data), WRITE_CHUNK):
+                    client.write_queue.append(data[start:start + WRITE_CHUNK])
+        if direct:
+            self.write_chunk(first)
+        with self.writes_pending:
+            if direct:
+                self.writing = False
+            if self.write_order:
+                self.writes_pending.notify()
+
+    def write_chunk(self, chunk):
+        try:
+            self.engine.write(chunk)
+            self.bytes_to_device += len(chunk)
+        except Exception as e:
+            self.report(f"Write failed: {e}")
+
+    def write_loop(self):
+        """Round-robin over clients with pending writes, one chunk per client per turn."""
+        while True:
+            with self.writes_pending:
+                while self.running and (self.writing or not self.write_order):
+                    self.writes_pending.wait()
+                if not self.running:
+                    return
+                client = self.write_order.popleft()
+                if not client.write_queue:
+                    continue  # Disconnected while waiting for its turn
+                chunk = client.write_queue.popleft()
+                if client.write_queue:
+                    self.write_order.append(client)
+                self.writing = True
+            self.write_chunk(chunk)
+            with self.writes_pending:
+                self.writing = False
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from serial_engine import SerialEngine
+from serial_framing import FramingRules
+
+
+class PortResult:
+    """Outcome of running a command list on one port."""
+    __slots__ = ("port", "replies", "error", "elapsed")
+
+    def __init__(self, port):
+        self.port = port
+        self.replies = []  # (command, Reply) in command order
+        self.error = None
+        self.elapsed = 0.0
+
+    @property
+    def timeouts(self):
+        return sum(1 for command, reply in self.replies if reply.timed_out)
+
+    @property
+    def ok(self):
+        return self.error is None and self.timeouts == 0
+
+
+class MultiPortSession:
+    """Opens several ports and runs the same command list against all of them concurrently.
+
+    Each port gets its own SerialEngine; asyncio gathers the per-port runs so the total
+    wall time is that of the slowest board rather than the sum over all boards.
+    """
+
+    def __init__(self, ports, baud_rate=9600, framing_rules=None, window=1, tag_pattern=None, line_format="8N1"):
+        self.ports = list(ports)
+        self.baud_rate = baud_rate
+        self.line_format = line_format
+        self.framing_rules = framing_rules or FramingRules()
+        self.window = window
+        self.tag_pattern = tag_pattern
+
+    async def run(self, commands, on_reply=None):
+        """Run parsed Commands on every port and return one PortResult per port.
+
+        on_reply(port, command, reply) is called from the worker threads as replies arrive.
+        """
+        loop = asyncio.get_running_loop()
+        # The engines block in the OS while waiting for replies, so every port needs its own worker
+        with ThreadPoolExecutor(max_workers=max(1, len(self.ports)), thread_name_prefix="serial-session") as executor:
+            runs = [loop.run_in_executor(executor, self.run_port, port, commands, on_reply) for port in self.ports]
+            return await asyncio.gather(*runs)
+
+    def run_port(self, port, commands, on_reply=None):
+        result = PortResult(port)
+        start = time.monotonic()
+        engine = SerialEngine(port, self.baud_rate, line_format=self.line_format)
+        try:
+            engine.open()
+            requests = [(command.payload, self.framing_rules.get(command.text)) for command in commands]
+
+            def collect(index, reply):
+                result.replies.append((commands[index], reply))
+                if on_reply:
+                    on_reply(port, commands[index], reply)
+            engine.transact_many(requests, self.window, self.tag_pattern, on_reply=collect)
+        except Exception as e:
+            result.error = str(e)
+        finally:
+            engine.close()
+            result.elapsed = time.monotonic() - start
+        return result
+
+
+def run_on_ports(ports, commands, baud_rate=9600, framing_rules=None, window=1, tag_pattern=None, on_reply=None,
+                 line_format="8N1"):
+    """Blocking wrapper around MultiPortSession.run for callers without an event loop."""
+    session = MultiPortSession(ports, baud_rate, framing_rules, window, tag_pattern, line_format)
+    return asyncio.run(session.run(commands, on_reply))
+
+
+def summarize(results, wall_time):
+    """Aggregate per-port results into a dict suitable for printing or logging."""
+    return {
+        "ports": len(results),
+        "ports_ok": sum(1 for r in results if r.ok),
+        "ports_failed": [r.port for r in results if not r.ok],
+        "commands": sum(len(r.replies) for r in results),
+        "timeouts": sum(r.timeouts for r in results),
+        "wall_time": wall_time,
+        "slowest_port_time": max((r.elapsed for r in results), default=0.0),
+        "summed_port_time": sum(r.elapsed for r in results),
+    }
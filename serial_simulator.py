@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Virtual serial devices on pseudo-terminals (Linux/macOS), answering commands from a rules file.
+
+    python sercom.py simulate --rules sim_rules.json --count 16 --link-dir /tmp/sim
+    python sercom.py run --port /tmp/sim/ttySIM0 --script serial_commands.json
+
+A rules file is JSON:
+
+    {
+        "faults": {"latency_ms": 5, "jitter_ms": 2, "partial": 0.1, "garbage": 0.01, "disconnect": 0},
+        "rules": [
+            {"match": "AT", "reply": "OK\\r\\n"},
+            {"regex": "AT\\\\+NAME\\\\?", "reply": "+NAME:sim${device}\\r\\nOK\\r\\n"},
+            {"regex": "AT\\\\+BAUD(\\\\d)", "reply": "OK${1}\\r\\n", "latency_ms": 50}
+        ],
+        "default_reply": "ERROR\\r\\n",
+        "command_gap_ms": 20
+    }
+
+A command is everything up to CR or LF, or whatever arrived before the line went quiet for
+command_gap_ms (devices such as the HC-06 take AT commands with no line ending). The first rule whose match (exact text) or regex (full
+match) fits the command answers it; ${1}... are regex groups and ${device} the device number.
+A rule's own fault settings override "faults". A plain command file ({"commands": [...]}, like
+serial_commands.json) also works: every listed command is answered with OK, anything else
+with ERROR.
+
+Faults: latency_ms plus up to jitter_ms before each reply; partial, the chance a reply is
+written in several pieces chunk_gap_ms apart; garbage, the chance of up to garbage_bytes random
+bytes before a reply; disconnect, the chance the device vanishes instead of answering and comes
+back as a new pty reconnect_ms later (the link is moved to the new one). Each device answers its
+commands in order. All devices share one asyncio event loop, so hundreds fit in one process.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+
+from serial_payload import parse_payload
+
+_REFERENCE = re.compile(r"\$\{(\w+)\}")
+_LINE_END = re.compile(rb"[\r\n]")
+
+DEFAULT_FAULTS = {
+    "latency_ms": 0.0,
+    "jitter_ms": 0.0,
+    "partial": 0.0,
+    "chunk_gap_ms": 1.0,
+    "garbage": 0.0,
+    "garbage_bytes": 8,
+    "disconnect": 0.0,
+    "reconnect_ms": 1000.0,
+}
+
+
+class SimulatorRule:
+    __slots__ = ("text", "pattern", "reply", "faults")
+
+    def __init__(self, data, faults):
+        self.text = data.get("match")
+        self.pattern = re.compile(data["regex"].encode()) if data.get("regex") else None
+        if self.text is None and self.pattern is None:
+            raise ValueError(f"rule {data!r} needs 'match' or 'regex'")
+        self.reply = data.get("reply", "")
+        self.faults = {**faults, **{key: data[key] for key in DEFAULT_FAULTS if key in data}}
+
+    def matches(self, command):
+        """Returns the regex groups (an empty tuple for an exact match) or None."""
+        if self.pattern is not None:
+            match = self.pattern.fullmatch(command)
+            return None if match is None else match.groups()
+        return () if command.decode(errors="replace") == self.text else None
+
+
+class SimulatorRules:
+    """The parsed rules file shared by every simulated device."""
+
+    def __init__(self, rules, default_reply="ERROR\r\n", faults=None, command_gap=0.02):
+        self.faults = {**DEFAULT_FAULTS, **(faults or {})}
+        self.rules = [SimulatorRule(rule, self.faults) for rule in rules]
+        self.default_reply = default_reply
+        self.command_gap = command_gap
+
+    @classmethod
+    def from_dict(cls, data):
+        if "rules" in data or "commands" not in data:
+            rules = data.get("rules", [])
+        else:
+            rules = [{"match": command, "reply": "OK\r\n"} for command in data["commands"]]
+        return cls(rules, data.get("default_reply", "ERROR\r\n"), data.get("faults"),
+                   data.get("command_gap_ms", 20) / 1000)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, "r") as file:
+            return cls.from_dict(json.load(file))
+
+    def answer(self, command, device):
+        """The reply bytes and fault settings for one command."""
+        for rule in self.rules:
+            groups = rule.matches(command)
+            if groups is not None:
+                values = {"device": str(device)}
+                values.update((str(number), (group or b"").decode(errors="replace"))
+                              for number, group in enumerate(groups, 1))
+                text = _REFERENCE.sub(lambda match: values.get(match.group(1), match.group(0)), rule.reply)
+                return parse_payload(text), rule.faults
+        return parse_payload(self.default_reply), self.faults
+
+
+class SimulatedDevice:
+    """One pty answering commands according to rules; link is an optional stable symlink to it."""
+
+    def __init__(self, rules, number=0, link=None, seed=None):
+        self.rules = rules
+        self.number = number
+        self.link = link
+        self.random = random.Random(seed)
+        self.master = self.slave = None
+        self.port = None
+        self.pending = bytearray()
+        self.commands = None
+        self.gap_timer = None  # Ends a command that has no line ending once the line goes quiet
+        self.answered = 0
+        self.disconnects = 0
+        self.on_event = None
+
+    def open(self):
+        """Create the pty (and link) and start reading; called from the event loop."""
+        import tty
+        if self.commands is None:
+            self.commands = asyncio.Queue()
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)  # Held open so the master never sees a hang-up between clients
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        if self.link:
+            temporary = f"{self.link}.new"
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+            os.symlink(self.port, temporary)
+            os.replace(temporary, self.link)  # Atomic, so a client never finds the link missing
+        asyncio.get_running_loop().add_reader(self.master, self.on_readable)
+
+    def close(self):
+        if self.master is None:
+            return
+        if self.gap_timer is not None:
+            self.gap_timer.cancel()
+            self.gap_timer = None
+        asyncio.get_running_loop().remove_reader(self.master)
+        asyncio.get_running_loop().remove_writer(self.master)
+        os.close(self.master)
+        os.close(self.slave)
+        self.master = self.slave = None
+
+    def on_readable(self):
+        try:
+            data = os.read(self.master, 65536)
+        except OSError:  # Includes EAGAIN after a spurious wake-up
+            return
+        self.pending += data
+        while True:
+            match = _LINE_END.search(self.pending)
+            if match is None:
+                break
+            command = bytes(self.pending[:match.start()])
+            del self.pending[:match.end()]
+            if command:
+                self.commands.put_nowait(command)
+        if self.gap_timer is not None:
+            self.gap_timer.cancel()
+            self.gap_timer = None
+        if self.pending and self.rules.command_gap:
+            self.gap_timer = asyncio.get_running_loop().call_later(self.rules.command_gap, self.end_command)
+
+    def end_command(self):
+        self.gap_timer = None
+        if self.pending:
+            self.commands.put_nowait(bytes(self.pending))
+            self.pending.clear()
+
+    async def write(self, data):
+        view = memoryview(data)
+        loop = asyncio.get_running_loop()
+        while view:
+            try:
+                view = view[os.write(self.master, view):]
+            except BlockingIOError:
+                # The client is not reading; wait for room instead of buffering without limit
+                writable = loop.create_future()
+                loop.add_writer(self.master, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(self.master)
+
+    async def run(self):
+        """Answer commands until cancelled; open() must have been called."""
+        try:
+            while True:
+                command = await self.commands.get()
+                reply, faults = self.rules.answer(command, self.number)
+                delay = faults["latency_ms"] + self.random.uniform(0, faults["jitter_ms"])
+                if delay:
+                    await asyncio.sleep(delay / 1000)
+                if faults["disconnect"] and self.random.random() < faults["disconnect"]:
+                    await self.reconnect(faults["reconnect_ms"] / 1000)
+                    continue
+                if faults["garbage"] and self.random.random() < faults["garbage"]:
+                    count = self.random.randint(1, max(1, int(faults["garbage_bytes"])))
+                    await self.write(bytes(self.random.getrandbits(8) for _ in range(count)))
+                if faults["partial"] and len(reply) > 1 and self.random.random() < faults["partial"]:
+                    cuts = sorted(self.random.sample(range(1, len(reply)), min(len(reply) - 1, self.random.randint(1, 3))))
+                    for start, end in zip([0] + cuts, cuts + [len(reply)]):
+                        await self.write(reply[start:end])
+                        if end < len(reply):
+                            await asyncio.sleep(faults["chunk_gap_ms"] / 1000)
+                else:
+                    await self.write(reply)
+                self.answered += 1
+        finally:
+            self.close()
+
+    async def reconnect(self, delay):
+        old_port = self.port
+        self.close()
+        self.disconnects += 1
+        self.pending.clear()
+        while not self.commands.empty():
+            self.commands.get_nowait()
+        if self.on_event:
+            self.on_event(f"device {self.number}: disconnected from {old_port}")
+        await asyncio.sleep(delay)
+        self.open()
+        if self.on_event:
+            self.on_event(f"device {self.number}: back on {self.port}" + (f" ({self.link})" if self.link else ""))
+
+
+class DeviceSimulator:
+    """Runs count SimulatedDevices on one event loop; links go in link_dir as ttySIM0, ttySIM1, ..."""
+
+    def __init__(self, rules, count=1, link_dir=None, seed=None, on_event=None):
+        if link_dir:
+            os.makedirs(link_dir, exist_ok=True)
+        self.devices = [SimulatedDevice(rules, number, os.path.join(link_dir, f"ttySIM{number}") if link_dir else None,
+                                        None if seed is None else seed + number)
+                        for number in range(count)]
+        for device in self.devices:
+            device.on_event = on_event
+        self.tasks = []
+
+    async def start(self):
+        _raise_open_file_limit(4 * len(self.devices) + 64)  # Two fds per pty, plus clients in the same process
+        try:
+            for device in self.devices:
+                device.open()
+        except OSError:
+            for device in self.devices:
+                device.close()
+            raise
+        self.tasks = [asyncio.create_task(device.run()) for device in self.devices]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for device in self.devices:
+            if device.link and os.path.islink(device.link):
+                os.remove(device.link)
+
+    async def run(self, until=None):
+        """Run until the until future completes (forever if None)."""
+        await self.start()
+        try:
+            await (until if until is not None else asyncio.Event().wait())
+        finally:
+            await self.stop()
+
+    @property
+    def ports(self):
+        return [device.link or device.port for device in self.devices]
+
+    def totals(self):
+        return (sum(device.answered for device in self.devices),
+                sum(device.disconnects for device in self.devices))
+
+
+def _raise_open_file_limit(needed):
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (needed if hard == resource.RLIM_INFINITY else min(needed, hard), hard))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import threading
+from array import array
+
+# Values below 2**SUB_BITS nanoseconds get one bucket each; above that every power of two is split
+# into 2**SUB_BITS buckets, so a recorded value is off by at most 1/64 (about 1.6%).
+SUB_BITS = 6
+SUB_COUNT = 1 << SUB_BITS
+MAX_EXPONENT = 44  # 2**44 ns is almost five hours; longer values land in the last bucket
+
+
+def _bucket(value):
+    if value < SUB_COUNT:
+        return value
+    exponent = min(value.bit_length() - SUB_BITS - 1, MAX_EXPONENT)
+    return SUB_COUNT + (exponent << SUB_BITS) + min((value >> exponent) - SUB_COUNT, SUB_COUNT - 1)
+
+
+def _bucket_value(index):
+    """Upper edge of a bucket, so percentiles never understate a latency."""
+    if index < SUB_COUNT:
+        return index
+    exponent, offset = divmod(index - SUB_COUNT, SUB_COUNT)
+    return ((SUB_COUNT + offset + 1) << exponent) - 1
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear histogram of nanosecond durations, in the style of HdrHistogram.
+
+    Recording is O(1) and memory stays constant however many samples come in, so it can run for
+    the whole session. Percentiles are accurate to the bucket width of about 1.6%.
+    """
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * (SUB_COUNT * (MAX_EXPONENT + 2))))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        value = max(0, int(value))
+        self.counts[_bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """Value at or below which fraction (0..1) of the samples fall; 0 when empty."""
+        if not self.count:
+            return 0
+        rank = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                if seen >= rank:
+                    return min(_bucket_value(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class CommandStats:
+    """Phase histograms for one command: write complete, first reply byte and reply complete."""
+    __slots__ = ("write", "first_byte", "total", "timeouts")
+
+    def __init__(self):
+        self.write = LatencyHistogram()
+        self.first_byte = LatencyHistogram()
+        self.total = LatencyHistogram()
+        self.timeouts = 0
+
+
+class LatencyStats:
+    """Per-command latency statistics for a session, fed with every Reply as it completes.
+
+    Timed-out replies are only counted: their duration is the framing timeout, not a latency.
+    record() may be called from the worker threads while the frontends read the table.
+    """
+
+    def __init__(self):
+        self.commands = {}  # (port or None, command text) -> CommandStats
+        self.lock = threading.Lock()
+
+    def record(self, command, reply, port=None):
+        with self.lock:
+            stats = self.commands.get((port, command))
+            if stats is None:
+                stats = self.commands[(port, command)] = CommandStats()
+            if reply.timed_out:
+                stats.timeouts += 1
+                return
+            if reply.cached:
+                return  # Answered without a round trip; its zero timings would only skew the percentiles
+            stats.write.record(reply.write_ns)
+            if reply.first_byte_ns is not None:
+                stats.first_byte.record(reply.first_byte_ns)
+            stats.total.record(reply.total_ns)
+
+    def reset(self):
+        with self.lock:
+            self.commands.clear()
+
+    def rows(self):
+        """One dict per command with count, timeouts and millisecond percentiles."""
+        rows = []
+        with self.lock:
+            for (port, command), stats in self.commands.items():
+                total = stats.total
+                rows.append({
+                    "port": port,
+                    "command": command,
+                    "count": total.count,
+                    "timeouts": stats.timeouts,
+                    "write_p50": stats.write.percentile(0.50) / 1e6,
+                    "first_byte_p50": stats.first_byte.percentile(0.50) / 1e6,
+                    "p50": total.percentile(0.50) / 1e6,
+                    "p90": total.percentile(0.90) / 1e6,
+                    "p99": total.percentile(0.99) / 1e6,
+                    "max": total.max / 1e6,
+                })
+        return rows
+
+    def format_table(self):
+        return format_rows(self.rows())
+
+
+def percentile(sorted_values, fraction):
+    """Exact percentile (nearest rank) of an already sorted list; 0.0 when it is empty."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def format_rows(rows):
+    """The stats table for rows shaped like LatencyStats.rows()."""
+    if not rows:
+        return "No replies recorded yet."
+    show_port = any(row["port"] for row in rows)
+    labels = [f"{row['port'] or '-'} {row['command']}" if show_port else row["command"] for row in rows]
+    width = min(40, max(len("Command"), *(len(label) for label in labels)))
+    lines = [f"{'Command':<{width}} {'count':>6} {'t/o':>4} {'write':>8} {'1st byte':>8} "
+             f"{'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}   (ms)"]
+    for label, row in zip(labels, rows):
+        if len(label) > width:
+            label = label[:width - 1] + "…"
+        lines.append(f"{label:<{width}} {row['count']:>6} {row['timeouts']:>4} {row['write_p50']:>8.3f} "
+                     f"{row['first_byte_p50']:>8.3f} {row['p50']:>8.3f} {row['p90']:>8.3f} "
+                     f"{row['p99']:>8.3f} {row['max']:>8.3f}")
+    return "\n".join(lines)
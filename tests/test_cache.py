@@ -0,0 +1,98 @@
+import pytest
+
+from serial_cache import ResponseCache
+from serial_engine import Reply
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fetch(cache, payload, data=b"OK\r\n", port="COM1"):
+    """One command through the cache as SerialEngine does it; returns the Reply and whether it was cached."""
+    cached, token = cache.before_send(port, payload)
+    if cached is not None:
+        return cached, True
+    reply = Reply(data, False, 1000)
+    cache.store(port, payload, reply, token)
+    return reply, False
+
+
+@pytest.mark.parametrize("payload, ttl", [
+    (b"AT+CSQ?\r", 30.0),
+    (b"AT+VERSION\r\n", 300.0),
+    (b"ATI\r", 300.0),
+    (b"ATI3\r", 300.0),
+    (b"AT\r", 0.0),
+    (b"AT+RESET\r", None),
+    (b"ATZ\r", None),
+    (b"AT+NAME=BOOK\r", None),
+])
+def test_default_rules(payload, ttl):
+    assert ResponseCache().ttl(payload) == ttl
+
+
+def test_query_is_reused_until_it_expires():
+    clock = Clock()
+    cache = ResponseCache({"AT\\+VERSION": 10}, clock=clock)
+    assert not fetch(cache, b"AT+VERSION\r", b"1.0\r\nOK\r\n")[1]
+    reply, cached = fetch(cache, b"AT+VERSION\r")
+    assert cached and reply.data == b"1.0\r\nOK\r\n" and reply.cached
+    clock.now = 11
+    assert not fetch(cache, b"AT+VERSION\r")[1]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_non_query_empties_only_its_port():
+    cache = ResponseCache({"AT\\+VERSION": 10})
+    fetch(cache, b"AT+VERSION", port="COM1")
+    fetch(cache, b"AT+VERSION", port="COM2")
+    fetch(cache, b"AT+RESET", port="COM1")
+    assert not fetch(cache, b"AT+VERSION", port="COM1")[1]
+    assert fetch(cache, b"AT+VERSION", port="COM2")[1]
+    assert cache.invalidations == 1
+
+
+def test_zero_ttl_read_is_never_cached_and_does_not_invalidate():
+    cache = ResponseCache()
+    fetch(cache, b"ATI\r")
+    for _ in range(3):
+        assert not fetch(cache, b"AT\r")[1]
+    assert fetch(cache, b"ATI\r")[1]
+    assert cache.invalidations == 0
+
+
+def test_reply_fetched_across_an_invalidation_is_dropped():
+    cache = ResponseCache({"AT\\+VERSION": 10})
+    _, token = cache.before_send("COM1", b"AT+VERSION")
+    cache.before_send("COM1", b"AT+RESET")  # Sent by another thread while the query was in flight
+    cache.store("COM1", b"AT+VERSION", Reply(b"old\r\n", False, 1000), token)
+    assert not fetch(cache, b"AT+VERSION")[1]
+
+
+def test_timed_out_reply_is_not_kept():
+    cache = ResponseCache({"AT\\+VERSION": 10})
+    _, token = cache.before_send("COM1", b"AT+VERSION")
+    cache.store("COM1", b"AT+VERSION", Reply(b"", True, 1000), token)
+    assert not fetch(cache, b"AT+VERSION")[1]
+
+
+def test_clear_forgets_entries_and_in_flight_queries():
+    cache = ResponseCache({"AT\\+VERSION": 10})
+    fetch(cache, b"AT+VERSION")
+    _, token = cache.before_send("COM1", b"AT+VERSION")
+    cache.clear()
+    cache.store("COM1", b"AT+VERSION", Reply(b"old\r\n", False, 1000), token)
+    assert not fetch(cache, b"AT+VERSION")[1]
+    assert cache.hits == 0
+
+
+def test_from_dict():
+    assert ResponseCache.from_dict(None) is None
+    assert ResponseCache.from_dict(False) is None
+    assert ResponseCache.from_dict(True).ttl(b"AT+VERSION") == 300.0
+    assert ResponseCache.from_dict({"X": 5}).ttl(b"AT+VERSION") is None
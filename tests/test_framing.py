@@ -0,0 +1,50 @@
+from serial_framing import DEFAULT_FRAMING, Framing, FramingRules
+
+
+def test_default_framing_waits_for_ok_line():
+    assert DEFAULT_FRAMING.find_end(b"+NAME:BOOK\r\n") is None
+    assert DEFAULT_FRAMING.find_end(b"+NAME:BOOK\r\nOK\r\n") == 16
+
+
+def test_default_framing_ignores_data_line_ending_in_ok():
+    # +NAME:BOOK ends in "OK" but is data, not the final result line
+    assert DEFAULT_FRAMING.find_end(b"+NAME:BOOK\r\n+VER:1\r\n") is None
+
+
+def test_default_framing_ends_at_error_line():
+    assert DEFAULT_FRAMING.find_end(b"ERROR: 5\r\nlate") == 10
+    assert DEFAULT_FRAMING.find_end(b"OK\n") == 3
+
+
+def test_terminator_straddling_chunks_is_found_on_rescan():
+    framing = Framing(terminators=["\r\n"])
+    assert framing.find_end(b"abc\r") is None
+    assert framing.find_end(b"abc\r\n", scanned=4) == 5
+
+
+def test_first_of_several_end_conditions_wins():
+    framing = Framing(terminators=[">"], byte_count=4)
+    assert framing.find_end(b"ab>cd") == 3
+    assert framing.find_end(b"abcdef") == 4
+
+
+def test_from_dict_inherits_unset_keys():
+    base = Framing(terminators=["OK"], idle_gap=0.05, timeout=1.0)
+    framing = Framing.from_dict({"timeout_ms": 3000}, base)
+    assert framing.terminators == (b"OK",)
+    assert framing.idle_gap == 0.05
+    assert framing.timeout == 3.0
+
+
+def test_from_dict_end_condition_replaces_inherited_ones():
+    framing = Framing.from_dict({"bytes": 8}, Framing(terminators=["OK"]))
+    assert framing.terminators == ()
+    assert framing.byte_count == 8
+
+
+def test_rules_fall_back_to_default():
+    rules = FramingRules.from_dict({"default": {"until": ">"}, "AT+RESET": {"timeout_ms": 3000}})
+    assert rules.get("AT").terminators == (b">",)
+    reset = rules.get("AT+RESET")
+    assert reset.terminators == (b">",)
+    assert reset.timeout == 3.0
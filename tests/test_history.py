@@ -0,0 +1,62 @@
+from serial_engine import Reply
+from serial_history import SessionHistory
+from serial_payload import Command
+
+
+def test_reply_round_trips_to_the_log_entry():
+    history = SessionHistory()
+    history.record_reply(Command("AT\\r"), Reply(b"OK\r\n", False, 2_000_000, 1000, 500_000), port="COM1")
+    [entry] = history
+    assert entry["port"] == "COM1"
+    assert entry["command"] == "AT\\r"
+    assert entry["response"] == "OK\r\n"
+    assert entry["time"] == 0.002
+    assert entry["first_byte_time"] == 0.0005
+    assert "timed_out" not in entry
+
+
+def test_flags_and_missing_first_byte():
+    history = SessionHistory()
+    history.record_reply(Command("AT"), Reply(b"", True, 1_000_000_000))
+    history.record_reply(Command("AT"), Reply(b"OK", False, 0, cached=True))
+    timed_out, cached = history
+    assert timed_out["timed_out"] and "first_byte_time" not in timed_out
+    assert cached["cached"]
+
+
+def test_events_and_messages_keep_their_fields():
+    history = SessionHistory()
+    history.record_event("Multi-port sendall", summary={"COM1": 3})
+    history.record_message("Received: +RING")
+    event, message = history
+    assert event["event"] == "Multi-port sendall" and event["summary"] == {"COM1": 3}
+    assert message["message"] == "Received: +RING"
+
+
+def test_search_anchors_apply_per_row():
+    history = SessionHistory()
+    history.record_message("first OK")
+    history.record_message("OK second")
+    history.record_reply(Command("AT+VERSION"), Reply(b"1.0\r\nOK\r\n", False, 1000))
+    assert history.search("^OK") == [1]
+    assert history.search("OK$") == [0]
+    assert history.search("first OK.OK") == []  # Never matches across rows
+
+
+def test_search_covers_commands_and_event_fields():
+    history = SessionHistory()
+    history.record_reply(Command("AT+VERSION"), Reply(b"1.0", False, 1000))
+    history.record_event("Port added: COM7", vid=0x1234)
+    history.record_message("unrelated")
+    assert history.search("VERSION") == [0]
+    assert history.search(b"4660") == [1]
+    assert history.search("COM7|unrelated", limit=1) == [1]
+
+
+def test_export_matches_iteration(tmp_path):
+    history = SessionHistory()
+    history.record_reply(Command("AT"), Reply(b"OK", False, 1000))
+    history.record_message("done")
+    path = tmp_path / "session.jsonl"
+    history.export(str(path))
+    assert path.read_text().splitlines() == [line.rstrip("\n") for line in history.iter_lines()]
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+from serial_logquery import LogIndex, LogQuery, open_index, parse_bound
+
+ENTRIES = [
+    {"timestamp": "2025-02-21 01:59:00.000", "event": "Connected to COM1"},
+    {"timestamp": "2025-02-21 02:00:00.000", "command": "AT+VERSION", "response": "1.0\r\nOK\r\n", "time": 0.010},
+    {"timestamp": "2025-02-21 02:30:00.000", "event": "Multi-port sendall",
+     "summary": {"COM1": {"sent": 2, "note": "braces } { in a string"}}},
+    {"timestamp": "2025-02-21 02:45:00.000", "command": "AT+VERSION", "response": "", "time": 1.0, "timed_out": True},
+    {"timestamp": "2025-02-21 03:30:00.000", "command": "AT+NAME?", "response": "ERROR 5\r\n", "time": 0.020},
+]
+
+
+@pytest.fixture(params=["log.json", "log.jsonl"])
+def log_path(request, tmp_path):
+    path = tmp_path / request.param
+    if request.param.endswith(".jsonl"):
+        path.write_text("".join(json.dumps(entry) + "\n" for entry in ENTRIES))
+    else:
+        path.write_text(json.dumps(ENTRIES, indent=4))
+    return str(path)
+
+
+def test_every_entry_is_indexed_once_including_nested_objects(log_path):
+    index = LogIndex.build(log_path)
+    assert len(index) == len(ENTRIES)
+    assert list(LogQuery(log_path).entries(range(len(index)))) == ENTRIES
+
+
+def test_posting_lists(log_path):
+    index = LogIndex.build(log_path)
+    assert list(index.events) == [0, 2]
+    assert list(index.errors) == [3, 4]
+    assert index.commands == ["AT+VERSION", "AT+NAME?"]
+    assert list(index.by_command[0]) == [1, 3]
+
+
+def test_filters(log_path):
+    query = LogQuery(log_path)
+    assert list(query.matches(commands=["AT+VERSION"])) == [1, 3]
+    assert list(query.matches(commands=["AT+MISSING"])) == []
+    assert list(query.matches(command_regex="NAME")) == [4]
+    assert list(query.matches(errors=True, commands=["AT+VERSION"])) == [3]
+    assert list(query.matches(events=True)) == [0, 2]
+    assert list(query.matches(since="02:00", until="03:00")) == [1, 2, 3]
+    assert list(query.matches(since="2025-02-21 02:30", until="2025-02-21 03:00")) == [2, 3]
+
+
+def test_time_of_day_range_wraps_past_midnight(log_path):
+    assert list(LogQuery(log_path).matches(since="23:00", until="02:10")) == [0, 1]
+
+
+def test_parse_bound():
+    assert parse_bound("23:00") == ("time_of_day", 23 * 3600)
+    assert parse_bound("2025-02-21 02:00")[0] == "absolute"
+    with pytest.raises(ValueError):
+        parse_bound("soon")
+
+
+def test_latency_rows_leave_timeouts_out(log_path):
+    rows = {row["command"]: row for row in LogQuery(log_path).latency_rows()}
+    assert (rows["AT+VERSION"]["count"], rows["AT+VERSION"]["timeouts"]) == (1, 1)
+    assert rows["AT+VERSION"]["p50"] == pytest.approx(10.0)
+    assert rows["AT+NAME?"]["max"] == pytest.approx(20.0)
+
+
+def test_saved_index_is_reused_until_the_log_changes(log_path):
+    open_index(log_path)
+    loaded = LogIndex.load(log_path + ".idx", log_path)
+    assert loaded is not None
+    assert list(loaded.errors) == [3, 4] and loaded.commands == ["AT+VERSION", "AT+NAME?"]
+    with open(log_path, "a") as file:
+        file.write("\n")
+    os.utime(log_path, ns=(0, 0))
+    assert LogIndex.load(log_path + ".idx", log_path) is None
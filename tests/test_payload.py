@@ -0,0 +1,39 @@
+import pytest
+
+from serial_payload import Command, format_bytes, parse_commands, parse_payload
+
+
+@pytest.mark.parametrize("text, payload", [
+    ("AT", b"AT"),
+    ("AT+NAME?\\r\\n", b"AT+NAME?\r\n"),
+    ("hex: 00 84 0A", b"\x00\x84\x0a"),
+    ("hex:00840A", b"\x00\x84\x0a"),
+    ("0x00\\0x84\\0x00", b"\x00\x84\x00"),
+    ('echo -en "\\x01\\x02"', b"\x01\x02"),
+    ('echo -e "AT\\r"', b"AT\r"),
+    ("A\\0x7fB", b"A\x7fB"),
+    ("quote \\\" and \\\\", b'quote " and \\'),
+])
+def test_parse_payload(text, payload):
+    assert parse_payload(text) == payload
+
+
+def test_unknown_escape_is_kept():
+    assert parse_payload("a\\qb") == b"a\\qb"
+
+
+def test_bad_hex_names_the_line():
+    with pytest.raises(ValueError, match="command 2"):
+        parse_commands(["AT", "hex: 0G"])
+
+
+def test_from_payload_keeps_given_bytes():
+    command = Command.from_payload("AT+READ=${id}", None)
+    assert command.text == "AT+READ=${id}"
+    assert command.payload is None
+
+
+def test_format_bytes_escapes_control_bytes():
+    assert format_bytes(b"OK\r\n") == "OK"
+    assert format_bytes(b"A\x01B") == "A\\x01B"
+    assert format_bytes(b"\x00\xff", hex_view=True) == "00 FF"
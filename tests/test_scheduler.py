@@ -0,0 +1,189 @@
+import threading
+
+import pytest
+
+from serial_engine import Reply
+from serial_scheduler import BACKGROUND, BATCH, INTERACTIVE, CommandScheduler, Pacer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeEngine:
+    """transact_many() as SerialEngine runs it with window=1: stops before a command once cancel_event is set.
+
+    on_send(payload) is called as each command goes out, so a test can act mid-batch.
+    """
+
+    def __init__(self, on_send=None):
+        self.port = "fake"
+        self.pacer = None
+        self.on_send = on_send
+        self.sent = []
+
+    def transact_many(self, requests, window=1, tag_pattern=None, on_reply=None, cancel_event=None):
+        results = [None] * len(requests)
+        for index, (payload, framing) in enumerate(requests):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            self.sent.append(payload)
+            if self.on_send:
+                self.on_send(payload)
+            results[index] = Reply(payload, False, 1000)
+            if on_reply:
+                on_reply(index, results[index])
+        return results
+
+
+def requests(*payloads):
+    return [(payload, None) for payload in payloads]
+
+
+@pytest.fixture
+def scheduler():
+    schedulers = []
+
+    def make(engine, pacer=None):
+        schedulers.append(CommandScheduler(engine, pacer))
+        return schedulers[-1]
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def test_pacer_allows_a_burst_then_spaces_commands():
+    clock = Clock()
+    pacer = Pacer(rate=10, burst=2, clock=clock)
+    assert pacer.reserve() == 0
+    assert pacer.reserve() == 0
+    assert pacer.reserve() == pytest.approx(0.1)
+    clock.now = 0.1
+    assert pacer.reserve() == 0
+    assert (pacer.commands, pacer.delayed) == (3, 1)
+    assert pacer.delay == pytest.approx(0.1)
+
+
+def test_pacer_min_gap():
+    clock = Clock()
+    pacer = Pacer(min_gap=0.005, clock=clock)
+    assert pacer.reserve() == 0
+    clock.now = 0.002
+    assert pacer.reserve() == pytest.approx(0.003)
+    clock.now = 0.005
+    assert pacer.reserve() == 0
+
+
+def test_pacer_from_dict():
+    assert Pacer.from_dict(None) is None
+    pacer = Pacer.from_dict({"rate": 50, "burst": 4, "min_gap_ms": 5})
+    assert str(pacer) == "50/s burst 4, gap 5 ms"
+
+
+def test_replies_come_back_in_order(scheduler):
+    engine = FakeEngine()
+    replies = scheduler(engine).submit(requests(b"A", b"B", b"C")).wait(2)
+    assert [reply.data for reply in replies] == [b"A", b"B", b"C"]
+
+
+def test_interactive_command_overtakes_running_batch(scheduler):
+    started = threading.Event()
+    release = threading.Event()
+
+    def on_send(payload):
+        if payload == b"B0":
+            started.set()
+            release.wait(2)
+    engine = FakeEngine(on_send)
+    commands = scheduler(engine)
+    batch = commands.submit(requests(b"B0", b"B1", b"B2"), BATCH)
+    assert started.wait(2)
+    interactive = commands.submit(requests(b"INT"), INTERACTIVE)
+    release.set()
+    assert interactive.wait(2)[0].data == b"INT"
+    assert [reply.data for reply in batch.wait(2)] == [b"B0", b"B1", b"B2"]
+    assert engine.sent == [b"B0", b"INT", b"B1", b"B2"]
+    assert commands.preemptions == 1
+    assert commands.queue_depths() == {"interactive": 0, "batch": 0, "background": 0}
+
+
+def test_lower_lane_waits_for_higher_ones(scheduler):
+    started = threading.Event()
+    release = threading.Event()
+    engine = FakeEngine(lambda payload: payload == b"FIRST" and (started.set() or release.wait(2)))
+    commands = scheduler(engine)
+    first = commands.submit(requests(b"FIRST"), INTERACTIVE)
+    assert started.wait(2)
+    background = commands.submit(requests(b"POLL"), BACKGROUND)
+    batch = commands.submit(requests(b"BATCH"), BATCH)
+    release.set()
+    for job in (first, background, batch):
+        job.wait(2)
+    assert engine.sent == [b"FIRST", b"BATCH", b"POLL"]
+
+
+def test_cancel_stops_a_running_job(scheduler):
+    cancel = threading.Event()
+    engine = FakeEngine(lambda payload: payload == b"B1" and cancel.set())
+    replies = scheduler(engine).submit(requests(b"B0", b"B1", b"B2", b"B3"), cancel_event=cancel).wait(2)
+    assert [reply and reply.data for reply in replies] == [b"B0", b"B1", None, None]
+
+
+def test_cancelled_job_is_never_sent(scheduler):
+    cancel = threading.Event()
+    cancel.set()
+    engine = FakeEngine()
+    commands = scheduler(engine)
+    job = commands.submit(requests(b"A", b"B"), cancel_event=cancel)
+    assert job.wait(2) == [None, None]
+    assert engine.sent == []
+    assert commands.queue_depths()["batch"] == 0
+
+
+def test_cancel_of_one_job_leaves_the_next_alone(scheduler):
+    cancel = threading.Event()
+    engine = FakeEngine(lambda payload: payload == b"A0" and cancel.set())
+    commands = scheduler(engine)
+    commands.submit(requests(b"A0", b"A1"), cancel_event=cancel).wait(2)
+    assert [reply.data for reply in commands.submit(requests(b"B0", b"B1"), cancel_event=threading.Event()).wait(2)] \
+        == [b"B0", b"B1"]
+
+
+def test_engine_error_finishes_the_job(scheduler):
+    class Broken(FakeEngine):
+        def transact_many(self, *args, **kwargs):
+            raise OSError("port gone")
+    job = scheduler(Broken()).submit(requests(b"A"))
+    with pytest.raises(OSError, match="port gone"):
+        job.wait(2)
+
+
+def test_stop_finishes_queued_jobs_unsent(scheduler):
+    started = threading.Event()
+    release = threading.Event()
+    engine = FakeEngine(lambda payload: started.set() or release.wait(2))
+    commands = scheduler(engine)
+    running = commands.submit(requests(b"A"))
+    assert started.wait(2)
+    queued = commands.submit(requests(b"B"))
+    stopper = threading.Thread(target=commands.stop)
+    stopper.start()
+    release.set()
+    stopper.join(2)
+    assert running.wait(2)[0].data == b"A"
+    assert queued.wait(2) == [None]
+    with pytest.raises(RuntimeError):
+        commands.submit(requests(b"C"))
+
+
+def test_gui_cancel_while_idle_does_not_reach_the_next_send():
+    pytest.importorskip("PyQt6")
+    from serial_command_sender import SerialWorker
+    worker = SerialWorker()
+    worker.cancel()
+    assert not worker.busy
+    assert not worker.cancel_event.is_set()
@@ -0,0 +1,95 @@
+import pytest
+
+from serial_engine import Reply
+from serial_framing import FramingRules
+from serial_payload import Command
+from serial_script import Block, ScriptError, ScriptRunner, Send, compile_script
+
+
+class ScriptedEngine:
+    """Answers each payload from a dict of replies, recording what was sent."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.sent = []
+
+    def transact(self, payload, framing=None):
+        self.sent.append(payload)
+        return Reply(self.replies.get(payload, b"OK\r\n"), False, 1000)
+
+
+def test_plain_lines_compile_to_flat_sends():
+    script = compile_script(["AT\\r", "# comment", "", "send AT+VERSION\\r"])
+    assert script.flat
+    assert [command.payload for command in script.commands] == [b"AT\r", b"AT+VERSION\r"]
+
+
+def test_blocks_nest():
+    script = compile_script(["loop 2", "retry 3", "send AT", "expect OK", "end", "wait 10", "end"])
+    assert not script.flat
+    loop = script.steps[0]
+    assert isinstance(loop, Block) and loop.count == 2 and not loop.retry
+    assert loop.steps[0].retry and loop.steps[0].count == 3
+
+
+@pytest.mark.parametrize("lines, message", [
+    (["AT", "end"], "line 2: end without loop or retry"),
+    (["loop 3", "AT"], "line 1: loop has no end"),
+    (["retry 0", "end"], "line 1: retry count must be at least 1"),
+    (["set nope"], "line 1: expected set"),
+    (["send"], "line 1: send needs a command"),
+    (["expect ("], "line 1"),
+    (["send hex: ${id}"], "variables only work in text commands"),
+])
+def test_errors_name_the_line(lines, message):
+    with pytest.raises(ScriptError, match=message.replace("(", "\\(")):
+        compile_script(lines)
+
+
+def test_variable_commands_have_no_payload_until_run():
+    script = compile_script(["set id = 7", "send AT+READ=${id}\\r"])
+    assert not script.flat
+    assert script.commands[0].text == "AT+READ=${id}\\r"
+    assert script.commands[0].payload is None
+
+
+def test_framing_rules_apply_per_command():
+    rules = FramingRules.from_dict({"AT+RESET": {"timeout_ms": 3000}})
+    script = compile_script(["AT", "AT+RESET"], rules)
+    assert [step.framing.timeout for step in script.steps] == [1.0, 3.0]
+
+
+def test_runner_captures_and_substitutes_variables():
+    engine = ScriptedEngine({b"AT+NAME?\r": b"+NAME:BOOK\r\nOK\r\n"})
+    script = compile_script(["send AT+NAME?\\r", "expect \\+NAME:(?P<name>\\w+)", "send AT+GREET=${name}\\r"])
+    result = ScriptRunner(engine, script).run()
+    assert result.ok, result.error
+    assert result.variables == {"name": "BOOK"}
+    assert engine.sent == [b"AT+NAME?\r", b"AT+GREET=BOOK\r"]
+
+
+def test_retry_reruns_block_until_expect_passes():
+    answers = iter([b"BUSY\r\n", b"BUSY\r\n", b"OK\r\n"])
+
+    class Flaky(ScriptedEngine):
+        def transact(self, payload, framing=None):
+            self.sent.append(payload)
+            return Reply(next(answers), False, 1000)
+    engine = Flaky({})
+    result = ScriptRunner(engine, compile_script(["retry 3", "AT", "expect ^OK", "end"])).run()
+    assert result.ok
+    assert result.sent == 3
+
+
+def test_failed_expect_outside_retry_stops_the_run():
+    engine = ScriptedEngine({b"AT": b"ERROR\r\n"})
+    result = ScriptRunner(engine, compile_script(["AT", "expect ^OK", "AT+NEXT"])).run()
+    assert not result.ok
+    assert result.error.startswith("line 2: expected /^OK/")
+    assert engine.sent == [b"AT"]
+
+
+def test_loaded_command_list_is_sent_verbatim():
+    # A plain command list never treats its entries as keywords or templates
+    step = Send(1, "loop ${x}", None, Command("loop ${x}"))
+    assert step.resolve({}).payload == b"loop ${x}"
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from serial_engine import Reply
+from serial_stats import LatencyHistogram, LatencyStats, format_rows, percentile
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) == 0
+    assert histogram.mean() == 0.0
+
+
+def test_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for value in range(1, 11):
+        histogram.record(value)
+    assert histogram.percentile(0.5) == 5
+    assert histogram.percentile(1.0) == 10
+    assert histogram.min == 1
+
+
+@pytest.mark.parametrize("fraction", [0.5, 0.9, 0.99])
+def test_percentiles_within_bucket_width_and_never_low(fraction):
+    rng = random.Random(5)
+    values = sorted(int(rng.lognormvariate(14, 1.5)) for _ in range(5000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    exact = values[max(1, int(fraction * len(values) + 0.5)) - 1]
+    estimate = histogram.percentile(fraction)
+    assert exact <= estimate <= exact * (1 + 1 / 64)
+
+
+def test_percentile_is_capped_at_max():
+    histogram = LatencyHistogram()
+    histogram.record(1_000_003)
+    assert histogram.percentile(0.99) == 1_000_003
+
+
+def test_huge_values_land_in_last_bucket():
+    histogram = LatencyHistogram()
+    histogram.record(1 << 60)
+    assert histogram.counts[-1] == 1
+    assert histogram.max == 1 << 60
+
+
+def test_exact_percentile():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([1, 2, 3, 4], 0.5) == 3
+    assert percentile([1, 2, 3, 4], 1.0) == 4
+
+
+def test_timeouts_are_counted_and_cached_replies_skipped():
+    stats = LatencyStats()
+    stats.record("AT", Reply(b"OK", False, 2_000_000, 100_000, 1_000_000))
+    stats.record("AT", Reply(b"", True, 1_000_000_000))
+    stats.record("AT", Reply(b"OK", False, 0, cached=True))
+    [row] = stats.rows()
+    assert (row["count"], row["timeouts"]) == (1, 1)
+    assert row["p50"] == pytest.approx(2.0, rel=0.02)
+
+
+def test_format_rows_labels_rows_without_a_port():
+    stats = LatencyStats()
+    stats.record("AT", Reply(b"OK", False, 1000))
+    stats.record("AT", Reply(b"OK", False, 1000), port="COM3")
+    lines = format_rows(stats.rows()).splitlines()
+    assert lines[1].startswith("- AT ")
+    assert lines[2].startswith("COM3 AT ")
+    assert "None" not in lines[1]
+
+
+def test_format_rows_without_ports_shows_commands_only():
+    stats = LatencyStats()
+    stats.record("AT", Reply(b"OK", False, 1000))
+    assert format_rows(stats.rows()).splitlines()[1].startswith("AT ")
+    assert format_rows([]) == "No replies recorded yet."
@@ -1,18 +1,30 @@
 #!/usr/bin/env python3
 import sys
 import json
-import serial
-import serial.tools.list_ports
 import datetime
 import time
-import threading
+from collections import deque
 
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
 from textual.widgets import Button, Input, Static, ListView, ListItem, Log
 from textual.screen import Screen
 
+from serial_autobaud import detect, line_options
+from serial_cache import ResponseCache
+from serial_engine import SerialEngine
+from serial_framing import FramingRules
+from serial_history import SessionHistory
+from serial_log_sink import JsonlLogSink
+from serial_payload import Command, format_bytes, parse_commands
+from serial_ports import shared_registry
+from serial_scheduler import BATCH, INTERACTIVE, CommandScheduler, Pacer
+from serial_stats import LatencyStats
+
 class SerialCommandSenderApp(App):
+    INCOMING_LIMIT = 10000  # Messages buffered between ticks before the oldest are dropped
+    DRAIN_INTERVAL = 0.05  # Seconds between batched writes to the log widget
+
     CSS = """
     Screen {
         layout: vertical;
@@ -31,6 +43,12 @@ class SerialCommandSenderApp(App):
         height: 20;
         margin: 1;
     }
+    #stats {
+        border: solid $accent;
+        margin: 1;
+        height: auto;
+        display: none;
+    }
     #output {
         border: solid gray;
         margin: 1;
@@ -40,20 +58,35 @@ class SerialCommandSenderApp(App):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.serial_connection = None
+        self.engine = None
+        self.scheduler = None  # Sends commands from priority lanes; Send Selected overtakes Send All
+        self.probing = False  # An autobaud probe is running on a worker thread
         self.commands = []
-        self.log_data = []
+        self.framing_rules = FramingRules()
+        self.response_cache = None  # Set from a command file's "cache" key; survives reconnects
+        self.pacer = None  # Set from a command file's "pacing" key; survives reconnects
+        self.history = SessionHistory(JsonlLogSink(prefix="tui"))  # Kept in memory, and streamed to logs/
         self.echo_enabled = False
-        self.serial_thread = None
+        self.hex_view = False
+        # Filled by the engine's reader thread and drained in batches on the app side;
+        # deque appends and pops are atomic, so no lock is needed between the two.
+        self.incoming = deque(maxlen=self.INCOMING_LIMIT)
+        self.replies = deque()  # (Command, Reply) from the scheduler's thread; never dropped
+        self.dropped_messages = 0
+        self.reported_drops = 0
+        self.stats = LatencyStats()
+        self.port_registry = shared_registry()  # Cached port list, kept current in the background
+        self.unsubscribe_ports = None
 
     def compose(self) -> ComposeResult:
         yield Static("Serial Command Sender", id="header")
         with Horizontal(id="controls"):
             yield Button("List COM Ports", id="list_ports")
             yield Input(placeholder="COM Port", id="port_input")
-            yield Input(placeholder="Baud Rate", id="baud_input")
+            yield Input(placeholder="Baud Rate (e.g. 115200, 9600 7E1 or auto)", id="baud_input")
             yield Button("Connect", id="connect")
             yield Button("Toggle Echo", id="echo")
+            yield Button("Hex View", id="hex_view")
             yield Button("Load JSON", id="load_json")
             yield Button("Load Text", id="load_text")
             yield Button("Save Log", id="save_log")
@@ -64,10 +97,21 @@ class SerialCommandSenderApp(App):
             yield Button("Send Selected", id="send_selected")
             yield Button("Send All", id="send_all")
             yield Button("Clear Selection", id="clear_selection")
-        yield Log(id="output")
+            yield Button("Stats", id="stats_toggle")
+        yield Static(id="stats", markup=False)
+        yield Log(id="output", max_lines=self.INCOMING_LIMIT)
 
     def on_mount(self) -> None:
         self.query_one("#baud_input", Input).value = "9600"
+        self.set_interval(self.DRAIN_INTERVAL, self.drain_incoming)
+        self.set_interval(1.0, self.refresh_stats)
+        self.unsubscribe_ports = self.port_registry.subscribe(self.on_port_event)
+
+    def on_unmount(self) -> None:
+        if self.unsubscribe_ports:
+            self.unsubscribe_ports()
+        self.close_engine()
+        self.history.close()
 
     def get_log_widget(self) -> Log:
         return self.query_one(Log)
@@ -75,65 +119,137 @@ class SerialCommandSenderApp(App):
     def log_message(self, message: str) -> None:
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_message = f"[{timestamp}] {message}"
-        self.log_data.append({"timestamp": timestamp, "message": message})
-        self.get_log_widget().write(log_message)
+        self.history.record_message(message)
+        self.get_log_widget().write_lines([log_message])
+
+    def queue_message(self, message: str) -> None:
+        """Thread-safe log_message for the reader thread; the text is captured now and shown on the next tick."""
+        if len(self.incoming) == self.incoming.maxlen:
+            self.dropped_messages += 1
+        now = time.time_ns()
+        self.incoming.append((now, datetime.datetime.fromtimestamp(now / 1e9).strftime("%Y-%m-%d %H:%M:%S"), message))
+
+    def drain_incoming(self) -> None:
+        while self.replies:
+            self.show_reply(*self.replies.popleft())
+        lines = []
+        while self.incoming:
+            time_ns, timestamp, message = self.incoming.popleft()
+            self.history.record_message(message, time_ns)
+            lines.append(f"[{timestamp}] {message}")
+        dropped = self.dropped_messages - self.reported_drops
+        if dropped:
+            self.reported_drops += dropped
+            lines.append(f"⚠ {dropped} received messages dropped (display could not keep up; {self.dropped_messages} total)")
+        if lines:
+            self.get_log_widget().write_lines(lines)
 
     def action_list_ports(self) -> None:
-        ports = list(serial.tools.list_ports.comports())
+        ports = self.port_registry.ports()
         port_input = self.query_one("#port_input", Input)
         if not ports:
             self.log_message("No COM ports found.")
             port_input.value = ""
         else:
-            ports_str = ", ".join([p.device for p in ports])
+            ports_str = ", ".join(str(p) for p in ports)
             port = ports[0].device
             port_input.value = port
             self.log_message(f"Found ports: {ports_str}. Setting port to {port}.")
 
     def action_connect(self) -> None:
         btn = self.query_one("#connect", Button)
-        if self.serial_connection and self.serial_connection.is_open:
-            self.serial_connection.close()
-            self.serial_connection = None
+        if self.engine and self.engine.is_open:
+            self.close_engine()
             self.log_message("Disconnected.")
             btn.label = "Connect"
         else:
             port = self.query_one("#port_input", Input).value.strip()
-            try:
-                baud_rate = int(self.query_one("#baud_input", Input).value.strip())
-            except ValueError:
-                self.log_message("Invalid baud rate.")
-                return
+            text = self.query_one("#baud_input", Input).value.strip()
             if not port:
                 self.log_message("No COM port set.")
                 return
             try:
-                self.serial_connection = serial.Serial(port, baud_rate, timeout=1)
-                self.log_message(f"Connected to {port} at {baud_rate} baud.")
-                btn.label = "Disconnect"
-                self.serial_thread = threading.Thread(target=self.serial_read_loop, daemon=True)
-                self.serial_thread.start()
-            except Exception as e:
-                self.log_message(f"Error connecting: {e}")
+                # "115200", "115200 7E1", or "auto" to probe for both
+                baud_text, _, line_format = text.partition(" ")
+                line_format = line_format.strip().upper() or "8N1"
+                line_options(line_format)
+                baud_rate = 0 if baud_text.lower() == "auto" else int(baud_text)
+            except ValueError:
+                self.log_message("Invalid baud rate or format.")
+                return
+            if self.probing:
+                self.log_message("Still probing for the baud rate.")
+            elif baud_rate:
+                self.open_engine(port, baud_rate, line_format)
+            else:
+                # Probing waits on every candidate rate in turn, so it runs off the event loop
+                self.probing = True
+                self.log_message(f"Probing {port} for its baud rate and format...")
+                self.run_worker(lambda: self.probe_port(port), thread=True, group="autobaud")
+
+    def probe_port(self, port: str) -> None:
+        # Runs on a worker thread
+        try:
+            result = detect(port)
+        except Exception as e:
+            result = e
+        self.call_from_thread(self.finish_probe, port, result)
+
+    def finish_probe(self, port: str, result) -> None:
+        self.probing = False
+        if isinstance(result, Exception):
+            self.log_message(f"Error probing {port}: {result}")
+            return
+        self.log_message(result.describe())
+        if result.found:
+            self.open_engine(port, result.best.baud_rate, result.best.line_format)
+
+    def open_engine(self, port: str, baud_rate: int, line_format: str) -> None:
+        try:
+            self.engine = SerialEngine(port, baud_rate, line_format=line_format)
+            self.engine.subscribe(self.on_serial_data, self.on_serial_error, include_responses=False)
+            self.engine.echo = self.echo_enabled
+            self.engine.response_cache = self.response_cache
+            self.engine.pacer = self.pacer
+            self.engine.open()
+            self.scheduler = CommandScheduler(self.engine, self.pacer, on_job_done=self.on_job_done)
+            self.log_message(f"Connected to {port} at {baud_rate} baud {line_format}.")
+            self.query_one("#connect", Button).label = "Disconnect"
+        except Exception as e:
+            self.engine = None
+            self.log_message(f"Error connecting: {e}")
+
+    def close_engine(self) -> None:
+        if self.engine:
+            self.engine.close()
+        if self.scheduler:
+            self.scheduler.stop()  # Commands still queued are dropped unsent
+        self.engine = self.scheduler = None
 
     def action_toggle_echo(self) -> None:
         self.echo_enabled = not self.echo_enabled
+        if self.engine:
+            self.engine.echo = self.echo_enabled
         status = "ON" if self.echo_enabled else "OFF"
         self.log_message(f"Echo mode: {status}")
 
-    def serial_read_loop(self) -> None:
-        while self.serial_connection and self.serial_connection.is_open:
-            try:
-                if self.serial_connection.in_waiting > 0:
-                    data = self.serial_connection.read(self.serial_connection.in_waiting).decode(errors='ignore').strip()
-                    if data:
-                        self.call_from_thread(lambda: self.log_message(f"Received: {data}"))
-                        if self.echo_enabled:
-                            self.serial_connection.write((data + "\r\n").encode())
-                            self.call_from_thread(lambda: self.log_message(f"Echoed: {data}"))
-            except Exception as e:
-                self.call_from_thread(lambda: self.log_message(f"Error reading serial data: {e}"))
-            time.sleep(0.1)
+    def action_toggle_hex_view(self) -> None:
+        self.hex_view = not self.hex_view
+        status = "ON" if self.hex_view else "OFF"
+        self.log_message(f"Hex view: {status}")
+
+    def on_serial_data(self, data: bytes) -> None:
+        # Runs on the engine's reader thread
+        # With echo on, the engine has already written these bytes back verbatim
+        echoed = " (echoed)" if self.echo_enabled else ""
+        self.queue_message(f"Received{echoed}: {format_bytes(data, self.hex_view)}")
+
+    def on_port_event(self, event: str, port) -> None:
+        # Runs on the port registry's thread
+        self.queue_message(f"Port {event}: {port}")
+
+    def on_serial_error(self, e: Exception) -> None:
+        self.queue_message(f"Error reading serial data: {e}")
 
     def action_load_json(self) -> None:
         self.push_screen(FileInputScreen("json"))
@@ -149,59 +265,89 @@ class SerialCommandSenderApp(App):
         if list_view.index is None:
             self.log_message("No command selected.")
             return
-        item = list_view.get_child_at_index(list_view.index)
+        item = list_view.highlighted_child
         if item:
-            command = item._label if hasattr(item, "_label") else item.renderable.plain
-            self.send_command(command)
+            self.send_commands([item._command], INTERACTIVE)
 
     def action_send_all(self) -> None:
         list_view = self.query_one("#commands", ListView)
-        for child in list_view.children:
-            if isinstance(child, ListItem):
-                command = child._label if hasattr(child, "_label") else child.renderable.plain
-                self.send_command(command)
+        self.send_commands([child._command for child in list_view.children if isinstance(child, ListItem)])
 
     def action_clear_selection(self) -> None:
         self.query_one("#commands", ListView).index = None
 
-    def send_command(self, command: str) -> None:
-        if not (self.serial_connection and self.serial_connection.is_open):
+    def action_toggle_stats(self) -> None:
+        panel = self.query_one("#stats", Static)
+        panel.display = not panel.display
+        self.refresh_stats()
+
+    def refresh_stats(self) -> None:
+        panel = self.query_one("#stats", Static)
+        if panel.display:
+            pacing = self.scheduler or self.pacer  # The scheduler's lines include the pacer's
+            status = [item.describe() for item in (self.response_cache, pacing) if item]
+            panel.update(self.stats.format_table() + "".join(f"\n\n{line}" for line in status))
+
+    def send_command(self, command: Command) -> None:
+        self.send_commands([command], INTERACTIVE)
+
+    def send_commands(self, commands: list, lane: int = BATCH) -> None:
+        """Queue commands on the scheduler, off the event loop; replies are shown on the next tick."""
+        if not (self.engine and self.engine.is_open and self.scheduler):
             self.log_message("Not connected.")
             return
-        try:
-            start_time = time.time()
-            self.serial_connection.write(command.encode())
-            time.sleep(0.1)
-            response = ""
-            if self.serial_connection.in_waiting > 0:
-                response = self.serial_connection.read(self.serial_connection.in_waiting).decode(errors='ignore').strip()
-            elapsed_time = time.time() - start_time
-            self.log_message(f"> {command} (Took {elapsed_time:.3f} sec)\nResponse: {response}")
-        except Exception as e:
-            self.log_message(f"Error sending command: {e}")
+        if not commands:
+            return
+        requests = [(command.payload, self.framing_rules.get(command.text)) for command in commands]
+        self.scheduler.submit(requests, lane,
+                              on_reply=lambda index, reply: self.replies.append((commands[index], reply)))
+
+    def on_job_done(self, job) -> None:
+        # Runs on the scheduler's thread
+        if job.error is not None:
+            self.queue_message(f"Error sending command: {job.error}")
+
+    def show_reply(self, command: Command, reply) -> None:
+        self.stats.record(command.text, reply)
+        response = format_bytes(reply.data, self.hex_view)
+        status = " [timed out]" if reply.timed_out else " [cached]" if reply.cached else ""
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.get_log_widget().write_lines(
+            [f"[{timestamp}] > {command.text} (Took {reply.elapsed:.3f} sec){status}\nResponse: {response}"])
+        self.history.record_reply(command, reply)
 
     def load_commands_from_file(self, file_path: str, file_type: str) -> None:
         try:
             with open(file_path, "r") as file:
                 if file_type == "json":
                     data = json.load(file)
-                    self.commands = data.get("commands", [])
+                    self.commands = parse_commands(data.get("commands", []))
+                    self.framing_rules = FramingRules.from_dict(data.get("framing"))
+                    if "cache" in data:
+                        self.response_cache = ResponseCache.from_dict(data["cache"])
+                        if self.engine:
+                            self.engine.response_cache = self.response_cache
+                        self.log_message(f"Response cache {'on' if self.response_cache else 'off'}.")
+                    if "pacing" in data:
+                        self.pacer = Pacer.from_dict(data["pacing"])
+                        if self.scheduler:
+                            self.scheduler.pacer = self.pacer
+                        self.log_message(f"Pacing: {self.pacer or 'off'}.")
                 else:
-                    self.commands = [line.strip() for line in file.readlines() if line.strip() and not line.strip().startswith(('#', '//'))]
+                    self.commands = parse_commands([line.strip() for line in file.readlines() if line.strip() and not line.strip().startswith(('#', '//'))])
             self.log_message(f"Loaded {len(self.commands)} commands from {file_path}")
             list_view = self.query_one("#commands", ListView)
             list_view.clear()
             for cmd in self.commands:
-                item = ListItem(Static(cmd))
-                item._label = cmd
+                item = ListItem(Static(cmd.text))
+                item._command = cmd
                 list_view.append(item)
         except Exception as e:
             self.log_message(f"Error loading {file_type} file: {e}")
 
     def save_log_to_file(self, file_path: str) -> None:
         try:
-            with open(file_path, "w") as file:
-                json.dump(self.log_data, file, indent=4)
+            self.history.export(file_path)
             self.log_message(f"Log saved to {file_path}")
         except Exception as e:
             self.log_message(f"Error saving log: {e}")
@@ -214,6 +360,8 @@ class SerialCommandSenderApp(App):
             self.action_connect()
         elif button_id == "echo":
             self.action_toggle_echo()
+        elif button_id == "hex_view":
+            self.action_toggle_hex_view()
         elif button_id == "load_json":
             self.action_load_json()
         elif button_id == "load_text":
@@ -226,6 +374,8 @@ class SerialCommandSenderApp(App):
             self.action_send_all()
         elif button_id == "clear_selection":
             self.action_clear_selection()
+        elif button_id == "stats_toggle":
+            self.action_toggle_stats()
         elif button_id == "exit":
             self.exit()
 
@@ -252,5 +402,9 @@ class FileInputScreen(Screen):
         elif event.button.id == "cancel":
             self.app.pop_screen()
 
-if __name__ == "__main__":
+def main():
     SerialCommandSenderApp().run()
+    return 0
+
+if __name__ == "__main__":
+    main()